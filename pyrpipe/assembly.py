@@ -8,6 +8,7 @@ Created on Mon Nov 25 15:21:01 2019
 
 from pyrpipe import pyrpipe_utils as pu
 from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
 import os
 
 class Assembly:
@@ -49,6 +50,8 @@ class Stringtie(Assembly):
         self.valid_args_list=['-G','--version','--conservative','--rf','--fr','-o','-l',
                             '-f','-L','-m','-a','-j','-t','-c','-s','-v','-g','-M',
                             '-p','-A','-B','-b','-e','-x','-u','-h','--merge','-F','-T','-i']
+        #argument to set threads
+        self.threads_args=['-p']
         
         #keep the passed arguments
         self.passed_args_dict=kwargs
@@ -199,6 +202,9 @@ class Stringtie(Assembly):
             
         #override existing arguments
         merged_args_dict={**self.passed_args_dict,**kwargs}
+        
+        #get threads from the shared core budget
+        merged_args_dict,job_id=pr.resourceManagerObject.acquire(self.program_name,merged_args_dict,self.threads_args,objectid=objectid)
        
         stie_cmd=['stringtie']
         #add options
@@ -206,7 +212,10 @@ class Stringtie(Assembly):
         
                 
         #start ececution
-        status=pe.execute_command(stie_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(stie_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("stringtie failed")
         
@@ -415,7 +424,8 @@ class Trinity(Assembly):
                               '--bflyGCThreads','--bflyCPU','--bflyCalculateCPU','--bfly_jar','--quality_trimming_params','--normalize_max_read_cov',
                               '--normalize_by_read_set','--genome_guided_max_intron','--genome_guided_min_coverage','--genome_guided_min_reads_per_partition',
                               '--grid_conf','--grid_node_CPU','--grid_node_max_memory']
-
+        #argument to set threads
+        self.threads_args=['--CPU']
         
         #keep the passed arguments
         self.passed_args_dict=kwargs
@@ -513,6 +523,9 @@ class Trinity(Assembly):
             
         #override existing arguments
         merged_args_dict={**self.passed_args_dict,**kwargs}
+        
+        #get threads from the shared core budget
+        merged_args_dict,job_id=pr.resourceManagerObject.acquire(self.program_name,merged_args_dict,self.threads_args,objectid=objectid)
        
         trinity_cmd=['Trinity']
         #add options
@@ -520,7 +533,10 @@ class Trinity(Assembly):
         
         
         #start ececution
-        status=pe.execute_command(trinity_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(trinity_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("trinity failed")
         #return status
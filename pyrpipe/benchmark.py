@@ -7,15 +7,53 @@ Created on Sat Dec 21 16:58:13 2019
 """
 
 from pyrpipe import pyrpipe_utils as pu
-import datetime as dt
-import json
+from pyrpipe.logtools import LogIndex
 import seaborn as sns
 import pandas as pd
-import copy 
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+import heapq
+import math
+import json
+import gzip
 
 import os
 
+
+def mann_whitney_u(x,y):
+    """Two-sided Mann-Whitney U test using the normal approximation with tie and continuity correction.
+    
+    Parameters
+    ----------
+    x: list
+        first sample
+    y: list
+        second sample
+    
+    :return: A tuple with the U statistic of x and the p-value
+    :rtype: tuple
+    """
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    n1=len(x)
+    n2=len(y)
+    if n1<1 or n2<1:
+        return None,1.0
+    values=np.concatenate([x,y])
+    ranks=pd.Series(values).rank().values
+    u=ranks[:n1].sum()-n1*(n1+1)/2
+    mean=n1*n2/2
+    n=n1+n2
+    _,counts=np.unique(values,return_counts=True)
+    tie_term=(counts**3-counts).sum()/(n*(n-1)) if n>1 else 0
+    sigma=math.sqrt(n1*n2/12*((n+1)-tie_term))
+    if sigma==0:
+        return float(u),1.0
+    z=(abs(u-mean)-0.5)/sigma
+    return float(u),min(1.0,math.erfc(max(z,0)/math.sqrt(2)))
+
+
 class Benchmark:
     """Class to generate benchmark reports from pyrpipe logs.
     Parameters
@@ -26,10 +64,12 @@ class Benchmark:
         path to the ENV log file
     out_dir: string
         path to the output directory
+    objectids: list
+        objectids to benchmark. Their commands are read using a sidecar index of the log (see logtools.LogIndex). Default: all
         
         
     """
-    def __init__(self,log_file,env_log,out_dir=""):
+    def __init__(self,log_file,env_log,out_dir="",objectids=None):
         
         
         if not pu.check_files_exist(log_file,env_log):
@@ -38,8 +78,7 @@ class Benchmark:
             out_dir=os.getcwd()
         self.log_file=log_file
         self.env_log=env_log
-        self.runtimes_by_prog={}
-        self.runtimes_by_object={}
+        self.objectids=objectids
         #init
         pu.print_blue("parsing log...")
         self.parse_logs()
@@ -59,108 +98,708 @@ class Benchmark:
         -------
         float
         """
-        try:
-            runtime= dt.datetime.strptime(timestring,"%H:%M:%S")
-            delta_time = dt.timedelta(days=0,hours=runtime.hour, minutes=runtime.minute, seconds=runtime.second)
-            return delta_time.seconds
-        except ValueError:
-            #try days format
-            temp=timestring.split(",")
-            days=int(temp[0].split(" ")[0].strip())
-            rest=temp[1].strip()
-            #hours=int(days)*24
-            runtime= dt.datetime.strptime(rest,"%H:%M:%S")
-            #one day less
-            #lastruntime=lastruntime+dt.timedelta(days=days-1)
-            delta_time = dt.timedelta(days=days,hours=runtime.hour, minutes=runtime.minute, seconds=runtime.second)
-            return delta_time.seconds+(86400*days)
+        return pu.parse_runtime(timestring)
+    
+    def parse_runtimes(self,runtimes):
+        """
+        Convert a list of runtimes to seconds. Runtimes are numbers in new logs and strings e.g. 1 day, 1:02:03 in older logs.
+        Returns
+        -------
+        pandas.Series
+        """
+        runtimes=pd.Series(runtimes,dtype=object)
+        seconds=pd.to_numeric(runtimes,errors='coerce')
+        old_format=seconds.isna()
+        if old_format.any():
+            seconds[old_format]=pd.to_timedelta(runtimes[old_format].astype(str)).dt.total_seconds()
+        return seconds.astype(float)
         
     def parse_logs(self):
-        """Parse the input logs.
-        For each command create a dict with runtimes as list and program name as key
-        For each object id in input log create a dict.
-        The followind dicts are created:
+        """Parse the input logs in a single pass.
+        Commands are streamed from the log file into columns and stored in the dataframe self.log_data with the columns
+        program, objectid, runtime (seconds), exitcode, starttime, cmd, cputime (seconds), maxrss (bytes), inputsize (bytes) and reads.
+        Runtimes are converted to seconds for all the commands at once.
         
-        runtimes_by_prog contains runtimes for each program. program is the key and the runtimes are in a list in order as they apprear in the log file.
-        
-        runtimes_by_object is nested a dict containing runtimes for each object by each program. e.g. {'ob1':{'prog1':[1,2,3],'prog2':[1,2,3]}, 'ob2':{'prog1':[12,22,13],'prog2':[1,2,3]} }
+        Successful commands are kept in the long-format table self.runtime_table (objectid, program, runtime, cputime, maxrss, inputsize, reads),
+        which is reused by all the summaries and plots. runtimes_by_prog and runtimes_by_object are derived from it.
         """
-        
-        
-        
-        with open(self.log_file) as f:
-            data=f.read().splitlines()
+        columns={'program':[],'objectid':[],'runtime':[],'exitcode':[],'starttime':[],'cmd':[],'cputime':[],'maxrss':[],'inputsize':[],'reads':[]}
         num_commands=0
-
+        for thisDict in self.read_records():
+            num_commands+=1
+            try:
+                programname=thisDict['commandname']
+            except KeyError:
+                #for older logs
+                programname=thisDict['cmd'].split(" ")[0]
+            columns['program'].append(programname)
+            columns['objectid'].append(thisDict.get('objectid','SRR'+str(num_commands%50)))
+            columns['runtime'].append(thisDict['runtime'])
+            columns['exitcode'].append(thisDict['exitcode'])
+            columns['starttime'].append(thisDict.get('starttime',""))
+            columns['cmd'].append(thisDict['cmd'])
+            #resources are not saved in older logs
+            columns['cputime'].append(thisDict.get('cputime'))
+            columns['maxrss'].append(thisDict.get('maxrss'))
+            columns['inputsize'].append(thisDict.get('inputsize'))
+            columns['reads'].append(thisDict.get('reads'))
+        
+        data=pd.DataFrame(columns)
+        #categories in order of appearance
+        for col in ['program','objectid']:
+            data[col]=pd.Categorical(data[col],categories=pd.unique(data[col]))
+        data['runtime']=self.parse_runtimes(columns['runtime'])
+        data['exitcode']=pd.to_numeric(data['exitcode'],errors='coerce').fillna(-1).astype(int)
+        for col in ['cputime','maxrss','inputsize','reads']:
+            data[col]=pd.to_numeric(data[col],errors='coerce').astype(float)
+        self.log_data=data
+        #long-format runtimes of successful commands
+        self.runtime_table=data.loc[data['exitcode']==0,['objectid','program','runtime','cputime','maxrss','inputsize','reads']].reset_index(drop=True)
+        #built when needed
+        self.timeline=None
+        
+    def read_records(self):
+        """Generator to read the commands in the log. If objectids are set, only their commands are read using the log index.
+        """
+        if self.objectids:
+            return LogIndex(self.log_file).read_records(objectids=self.objectids)
+        return pu.read_log_records(self.log_file)
+        
+    def get_successful_commands(self):
+        """Returns the long-format runtime table of commands with exitcode 0
+        """
+        return self.runtime_table
     
-        for l in data:
-            if not l.startswith("#"):
-                thisDict=json.loads(l)
-                num_commands+=1
-                #ignore failed commands
-                if int(thisDict['exitcode'])!=0:
-                    continue
-                             
-                #store runtimes by programname
-                try:
-                    programname=thisDict['commandname']
-                except KeyError:
-                    #for older logs
-                    programname=thisDict['cmd'].split(" ")[0]
-                runtime=self.parse_runtime(thisDict['runtime'])
-                #add to dict
-                if programname in self.runtimes_by_prog:
-                    self.runtimes_by_prog[programname].append(runtime)
-                else:
-                    self.runtimes_by_prog[programname]=[runtime]
-                    
-                #store runtimes by object id
-                try:
-                    objectid=thisDict['objectid']
-                except KeyError:
-                    objectid='SRR'+str(num_commands%50)
-                
-                if objectid in self.runtimes_by_object:
-                    #if the object is used with same program extend the list
-                    if programname in self.runtimes_by_object[objectid]:
-                        self.runtimes_by_object[objectid][programname].append(runtime)
-                    else:
-                        self.runtimes_by_object[objectid][programname]=[runtime]
-                else:
-                    self.runtimes_by_object[objectid]={programname:[runtime]}
-                
-        #print(self.runtimes_by_prog)
-        #print(self.runtimes_by_object)
+    @property
+    def runtimes_by_prog(self):
+        """dict containing runtimes for each program. program is the key and the runtimes are in a list in order as they apprear in the log file.
+        """
+        data=self.get_successful_commands()
+        return {k:list(v) for k,v in data.groupby('program',observed=True)['runtime']}
+    
+    @property
+    def runtimes_by_object(self):
+        """nested dict containing runtimes for each object by each program. e.g. {'ob1':{'prog1':[1,2,3],'prog2':[1,2,3]}, 'ob2':{'prog1':[12,22,13],'prog2':[1,2,3]} }
+        """
+        result={}
+        data=self.get_successful_commands()
+        for (objectid,programname),v in data.groupby(['objectid','program'],observed=True)['runtime']:
+            result.setdefault(objectid,{})[programname]=list(v)
+        return result
                                    
     def get_time_perobject(self,func="sum"):
         """Returns a dataframe containing total execution time for each object in a pyrpipe log.
         An object is identified by the objectid e.g. SRR accession.
         """
-        result=pd.DataFrame()
-        for k in self.runtimes_by_object:
-            
-            v=copy.deepcopy(self.runtimes_by_object[k]) #don't change the self.runtimes_by_object
-            
-            totaltime=0
-            for prog in v:
-                runtimes=v[prog]                
-                if func == "mean":
-                    valtoput=sum(runtimes)/len(runtimes)
-                    totaltime+=valtoput
-                    v[prog]=[valtoput]
-                else:                    
-                    valtoput=sum(runtimes)
-                    totaltime+=valtoput
-                    v[prog]=[valtoput]
-                    
-            #add current id
-            v['id']=k
-            v['total']=totaltime
-            
-            result=result.append(pd.DataFrame.from_dict(v),sort=False)
-            
+        data=self.get_successful_commands()
+        result=data.groupby(['objectid','program'],observed=True)['runtime'].agg(func).unstack('program')
+        result.columns=list(result.columns)
+        result['id']=list(result.index)
+        result['total']=result.drop(columns='id').sum(axis=1)
+        return result.reset_index(drop=True)
+        
+    def parse_starttimes(self,starttimes):
+        """
+        Convert start times to datetime in UTC without timezone. Each value is parsed on its own, so logs mixing ISO-8601 timestamps
+        and the yy-mm-dd HH:MM:SS format of older logs (in local time) are supported. Missing or invalid values are NaT.
+        Returns
+        -------
+        pandas.Series
+        """
+        times=[]
+        for t in starttimes:
+            try:
+                times.append(pu.parse_timestamp_utc(t).replace(tzinfo=None))
+            except (TypeError,ValueError):
+                times.append(pd.NaT)
+        return pd.Series(pd.to_datetime(times),index=getattr(starttimes,'index',None))
+    
+    def parse_threads(self,cmd):
+        """
+        Get the number of threads used by a command from its thread argument e.g. -p 8, --runThreadN 8, -@ 8, threads=8.
+        Returns 1 if no thread argument is found.
+        Returns
+        -------
+        int
+        """
+        return pu.get_cmd_threads(cmd)
+    
+    def get_total_cores(self):
+        """
+        Number of logical cores saved in the ENV log
+        Returns
+        -------
+        int
+        """
+        sys_info,programs=pu.parse_env_log(self.env_log)
+        try:
+            return int(sys_info['cpu'].split(" ")[0])
+        except (KeyError,ValueError):
+            return None
+    
+    def get_timeline(self):
+        """Returns a dataframe with start and end of each command in seconds from the start of the first command.
+        Columns are objectid, program, start, end, runtime, threads, exitcode, cmd, cputime and maxrss, sorted by start.
+        """
+        if self.timeline is None:
+            data=self.log_data
+            starttimes=self.parse_starttimes(data['starttime'])
+            start=(starttimes-starttimes.min()).dt.total_seconds()
+            timeline=pd.DataFrame({'objectid':data['objectid'],
+                                   'program':data['program'],
+                                   'start':start,
+                                   'end':start+data['runtime'],
+                                   'runtime':data['runtime'],
+                                   'threads':[self.parse_threads(c) for c in data['cmd']],
+                                   'exitcode':data['exitcode'],
+                                   'cmd':data['cmd'],
+                                   'cputime':data['cputime'],
+                                   'maxrss':data['maxrss']})
+            self.timeline=timeline.sort_values('start',kind='stable').reset_index(drop=True)
+        return self.timeline
+    
+    def get_concurrency(self):
+        """Returns a dataframe with the number of running commands and threads in use after each start or end of a command.
+        Columns are time, commands and threads.
+        """
+        timeline=self.get_timeline()
+        times=np.concatenate([timeline['start'].values,timeline['end'].values])
+        commands=np.concatenate([np.ones(timeline.shape[0]),-np.ones(timeline.shape[0])])
+        threads=np.concatenate([timeline['threads'].values,-timeline['threads'].values])
+        #ends before starts at the same time
+        order=np.lexsort((commands,times))
+        return pd.DataFrame({'time':times[order],'commands':np.cumsum(commands[order]),'threads':np.cumsum(threads[order])})
+    
+    def get_critical_paths(self):
+        """Returns a dataframe with the critical path of each object.
+        Commands of an object run one after the other, hence the critical path of an object spans from the start of its first
+        command to the end of its last command. Time in the span when none of its commands were running is reported as wait.
+        The critical stage is the program with the largest runtime on the path.
+        """
+        timeline=self.get_timeline()
+        grouped=timeline.groupby('objectid',observed=True)
+        result=pd.DataFrame({'start':grouped['start'].min(),
+                             'end':grouped['end'].max(),
+                             'busy':grouped['runtime'].sum(),
+                             'commands':grouped.size()})
+        result['span']=result['end']-result['start']
+        result['wait']=(result['span']-result['busy']).clip(lower=0)
+        stage_time=timeline.groupby(['objectid','program'],observed=True)['runtime'].sum().reset_index()
+        stage_time=stage_time.sort_values('runtime',ascending=False,kind='stable').drop_duplicates('objectid').set_index('objectid')
+        result['critical_stage']=stage_time['program'].astype(str)
+        result['critical_stage_time']=stage_time['runtime']
+        result.index=result.index.astype(str)
+        result.index.name='objectid'
+        return result.reset_index().sort_values('span',ascending=False).reset_index(drop=True)
+    
+    def get_parallel_efficiency(self,total_cores=None):
+        """Returns a dict summarizing the parallel execution of the pipeline:
+        makespan (wall time from the first start to the last end), busy time (sum of runtimes), average and maximum number of
+        concurrent commands, average threads in use and the core utilization.
+        
+        Parameters
+        ----------
+        total_cores: int
+            number of cores available. Default: cores saved in the ENV log
+        """
+        if total_cores is None:
+            total_cores=self.get_total_cores()
+        timeline=self.get_timeline()
+        concurrency=self.get_concurrency()
+        makespan=timeline['end'].max()-timeline['start'].min() if timeline.shape[0]>0 else 0
+        busy=timeline['runtime'].sum()
+        core_seconds=(timeline['runtime']*timeline['threads']).sum()
+        result={'makespan':float(makespan),
+                'busy_time':float(busy),
+                'core_seconds':float(core_seconds),
+                'average_concurrency':float(busy/makespan) if makespan>0 else 0,
+                'max_concurrency':int(concurrency['commands'].max()) if concurrency.shape[0]>0 else 0,
+                'average_threads':float(core_seconds/makespan) if makespan>0 else 0,
+                'total_cores':total_cores,
+                'core_utilization':None}
+        if total_cores and makespan>0:
+            result['core_utilization']=float(core_seconds/(makespan*total_cores))
+        critical=self.get_critical_paths()
+        if critical.shape[0]>0:
+            result['critical_object']=critical['objectid'].iloc[0]
+            result['critical_object_span']=float(critical['span'].iloc[0])
         return result
+    
+    def get_gating_stages(self):
+        """Returns a dataframe describing how much each program gates the overall throughput.
+        For each program: number of commands, busy time, core seconds, average threads, share of the critical paths
+        (its time on the objects' critical paths divided by the total span of the paths, so the shares and the waiting time add up to 1),
+        share of the path of the object with the longest span, occupancy (fraction of the makespan during which the
+        program was running) and the average number of commands running alongside it. Programs with a large critical path
+        share and occupancy but low concurrency limit the throughput. Rows are sorted by critical path share.
+        """
+        timeline=self.get_timeline()
+        if timeline.shape[0]<1:
+            return pd.DataFrame()
+        makespan=timeline['end'].max()-timeline['start'].min()
+        concurrency=self.get_concurrency()
+        rows=[]
+        for program,df in timeline.groupby('program',observed=True):
+            starts=df['start'].values
+            ends=df['end'].values
+            #union of the intervals when this program was running
+            order=np.argsort(starts,kind='stable')
+            starts=starts[order]
+            ends=np.maximum.accumulate(ends[order])
+            new_block=np.concatenate([[True],starts[1:]>ends[:-1]])
+            block_ids=np.cumsum(new_block)-1
+            block_starts=starts[new_block]
+            block_ends=np.zeros(len(block_starts))
+            np.maximum.at(block_ends,block_ids,ends)
+            occupied=(block_ends-block_starts).sum()
+            #time-weighted number of commands running while the program runs
+            running=self.get_time_weighted_mean(concurrency,block_starts,block_ends)
+            rows.append({'program':str(program),
+                         'commands':df.shape[0],
+                         'busy_time':df['runtime'].sum(),
+                         'core_seconds':(df['runtime']*df['threads']).sum(),
+                         'average_threads':df['threads'].mean(),
+                         'occupancy':occupied/makespan if makespan>0 else 0,
+                         'concurrency_when_running':running})
+        result=pd.DataFrame(rows)
+        #commands of an object run one after the other, so all of them are on its critical path
+        critical=self.get_critical_paths()
+        total_span=critical['span'].sum()
+        path_time=timeline.groupby('program',observed=True)['runtime'].sum()
+        path_time.index=path_time.index.astype(str)
+        result['critical_path_share']=result['program'].map(path_time).fillna(0)/total_span if total_span>0 else 0
+        #share of the path of the object with the longest span
+        critical_object=timeline[timeline['objectid'].astype(str)==critical['objectid'].iloc[0]]
+        object_time=critical_object.groupby('program',observed=True)['runtime'].sum()
+        object_time.index=object_time.index.astype(str)
+        result['critical_object_share']=(result['program'].map(object_time).fillna(0)/max(critical_object['runtime'].sum(),1e-9))
+        return result.sort_values('critical_path_share',ascending=False).reset_index(drop=True)
+    
+    def get_time_weighted_mean(self,concurrency,block_starts,block_ends):
+        """Returns the time-weighted mean number of running commands within the given time intervals
+        """
+        times=concurrency['time'].values
+        commands=concurrency['commands'].values
+        if len(times)<2:
+            return 0
+        durations=np.diff(times)
+        values=commands[:-1]
+        #overlap of each concurrency step with the intervals
+        step_start=times[:-1]
+        step_end=times[1:]
+        total=0
+        weight=0
+        for s,e in zip(block_starts,block_ends):
+            lo=np.searchsorted(step_end,s,side='right')
+            hi=np.searchsorted(step_start,e,side='left')
+            if hi<=lo:
+                continue
+            overlap=np.minimum(step_end[lo:hi],e)-np.maximum(step_start[lo:hi],s)
+            overlap=np.clip(overlap,0,None)
+            total+=(overlap*values[lo:hi]).sum()
+            weight+=overlap.sum()
+        if weight==0:
+            return 0
+        return total/weight
+    
+    def write_efficiency_report(self,total_cores=None):
+        """Write the parallel efficiency summary, critical paths and gating stages as CSV files to the out_dir.
+        
+        :return: dict with the parallel efficiency summary
+        :rtype: dict
+        """
+        summary=self.get_parallel_efficiency(total_cores)
+        pd.DataFrame([summary]).to_csv(os.path.join(self.benchmark_dir,'parallel_efficiency.csv'),index=False)
+        self.get_critical_paths().to_csv(os.path.join(self.benchmark_dir,'critical_paths.csv'),index=False)
+        self.get_gating_stages().to_csv(os.path.join(self.benchmark_dir,'gating_stages.csv'),index=False)
+        return summary
+    
+    def assign_slots(self,timeline):
+        """Assign each command to a worker slot. A command takes the free slot with the lowest number, so the number of
+        slots equals the maximum number of concurrent commands.
+        
+        :return: slot of each command in the order of timeline
+        :rtype: numpy.ndarray
+        """
+        slots=np.zeros(timeline.shape[0],dtype=int)
+        free=[]
+        busy=[]
+        num_slots=0
+        for i,(start,end) in enumerate(zip(timeline['start'].values,timeline['end'].values)):
+            #release slots of finished commands
+            while busy and busy[0][0]<=start:
+                heapq.heappush(free,heapq.heappop(busy)[1])
+            if free:
+                slot=heapq.heappop(free)
+            else:
+                slot=num_slots
+                num_slots+=1
+            slots[i]=slot
+            heapq.heappush(busy,(end,slot))
+        return slots
+    
+    def get_timeline_bars(self,lanes="objectid",max_lanes=100,time_bins=1000):
+        """Returns the bars to draw a timeline chart.
+        Commands are placed in lanes, one per objectid or per worker slot. To keep large runs renderable, lanes are grouped
+        when there are more than max_lanes and the time axis is divided in time_bins bins: bars are rounded to the bins and
+        consecutive bars of the same program in a lane are merged.
+        
+        Parameters
+        ----------
+        lanes: str
+            objectid or slot
+        max_lanes: int
+            maximum number of lanes
+        time_bins: int
+            resolution of the time axis
+        
+        :return: dataframe with the columns lane, label, program, start and end
+        :rtype: pandas.DataFrame
+        """
+        timeline=self.get_timeline()
+        if timeline.shape[0]<1:
+            return pd.DataFrame(columns=['lane','label','program','start','end'])
+        if lanes=="slot":
+            lane=self.assign_slots(timeline)
+            labels=np.array(["slot "+str(x) for x in range(lane.max()+1)])
+        elif lanes=="objectid":
+            #objects in order of their first command
+            objectids=pd.unique(timeline['objectid'].astype(str))
+            lane=pd.Categorical(timeline['objectid'].astype(str),categories=objectids).codes
+            labels=objectids
+        else:
+            raise ValueError("lanes must be objectid or slot")
+        
+        num_lanes=len(labels)
+        if num_lanes>max_lanes:
+            #group neighbouring lanes
+            group_size=int(np.ceil(num_lanes/max_lanes))
+            lane=lane//group_size
+            labels=np.array([labels[i]+" .. "+labels[min(i+group_size,num_lanes)-1] for i in range(0,num_lanes,group_size)])
+        
+        makespan=max(timeline['end'].max(),1e-9)
+        resolution=makespan/time_bins
+        bars=pd.DataFrame({'lane':lane,
+                           'program':timeline['program'].astype(str),
+                           'start':np.floor(timeline['start'].values/resolution)*resolution,
+                           'end':np.ceil(timeline['end'].values/resolution)*resolution})
+        #merge overlapping or touching bars of a program in a lane
+        bars=bars.sort_values(['lane','program','start'],kind='stable').reset_index(drop=True)
+        same_group=(bars['lane'].values[1:]==bars['lane'].values[:-1])&(bars['program'].values[1:]==bars['program'].values[:-1])
+        group_id=np.cumsum(np.concatenate([[True],~same_group]))
+        previous_end=bars.groupby(group_id)['end'].cummax().shift(1).values
+        new_bar=np.concatenate([[True],~same_group|(bars['start'].values[1:]>previous_end[1:])])
+        bars['bar']=np.cumsum(new_bar)
+        merged=bars.groupby('bar').agg(lane=('lane','first'),program=('program','first'),start=('start','min'),end=('end','max')).reset_index(drop=True)
+        merged['label']=labels[merged['lane'].values]
+        return merged[['lane','label','program','start','end']]
+    
+    def plot_timeline(self,lanes="objectid",max_lanes=100,time_bins=1000):
+        """Plot a Gantt chart of the pipeline execution showing when each program ran.
+        The chart is saved to out_dir as timeline_<lanes>.png together with the bars as CSV.
+        
+        Parameters
+        ----------
+        lanes: str
+            one lane per objectid or per worker slot (slot)
+        max_lanes: int
+            maximum number of lanes. Neighbouring lanes are grouped for larger runs.
+        time_bins: int
+            resolution of the time axis. Bars shorter than makespan/time_bins are merged with their neighbours.
+        """
+        bars=self.get_timeline_bars(lanes=lanes,max_lanes=max_lanes,time_bins=time_bins)
+        num_lanes=int(bars['lane'].max())+1 if bars.shape[0]>0 else 1
+        
+        sns.set_context('poster')
+        f, ax = plt.subplots(figsize=(20, max(4,num_lanes*0.4)))
+        current_palette = sns.color_palette("colorblind",len(pd.unique(bars['program'])))
+        #one collection per program keeps drawing fast
+        for i,(program,df) in enumerate(bars.groupby('program',sort=False)):
+            boxes=[[(s,l),(e,l),(e,l+0.8),(s,l+0.8)] for l,s,e in zip(df['lane'],df['start'],df['end'])]
+            ax.add_collection(PolyCollection(boxes,facecolors=current_palette[i],edgecolors='none',label=program))
+        ax.set_xlim(0,max(bars['end'].max() if bars.shape[0]>0 else 1,1e-9))
+        
+        lane_labels=bars.drop_duplicates('lane').sort_values('lane')
+        if num_lanes<=50:
+            ax.set_yticks(lane_labels['lane']+0.4)
+            ax.set_yticklabels(lane_labels['label'])
+        ax.set_ylim(-0.2,num_lanes)
+        ax.invert_yaxis()
+        ax.set(xlabel='time (sec.)')
+        ax.xaxis.grid(True)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc=2, borderaxespad=0.)
+        sns.despine(left = True)
+        f.suptitle('Timeline of the pipeline', fontsize=26)
+        
+        #save plot
+        plotfile=os.path.join(self.benchmark_dir,'timeline_'+lanes+'.png')
+        plt.savefig(plotfile,bbox_inches='tight')
+        plt.clf()
         
+        #write data to out_dir
+        outfile=os.path.join(self.benchmark_dir,'timeline_'+lanes+'.csv')
+        bars.to_csv(outfile, index=False)
+    
+    def write_trace(self,out_file=None,lanes="objectid",samples_file=None):
+        """Export the run in the Chrome Trace Event format, which can be opened in Perfetto (ui.perfetto.dev) or chrome://tracing.
+        Each command is a span on the track of its objectid or worker slot. Sub-commands of piped commands run at the same time,
+        so each stage is a span on its own child track, next to the track of the command.
+        Counter tracks show the threads, CPU cores (cputime/runtime) and memory (maxrss) of the running commands.
+        Events are written one at a time, so the trace is not held in memory. Output ending with .gz is compressed.
+        
+        Parameters
+        ----------
+        out_file: str
+            path to the trace. Default: out_dir/benchmark_reports/trace.json
+        lanes: str
+            one track per objectid or per worker slot (slot)
+        samples_file: str
+            csv with resource samples e.g. from a system monitor. Column time has timestamps; each other numeric column is a counter track.
+        
+        :return: path to the trace
+        :rtype: str
+        """
+        if out_file is None:
+            out_file=os.path.join(self.benchmark_dir,'trace.json')
+        timeline=self.get_timeline()
+        if lanes=="slot":
+            lane_ids=self.assign_slots(timeline)
+            lane_names=["worker "+str(i) for i in range(int(lane_ids.max())+1 if len(lane_ids)>0 else 0)]
+        else:
+            lane_ids=timeline['objectid'].cat.codes.values
+            lane_names=[str(o) for o in timeline['objectid'].cat.categories]
+        #tracks of a lane are the command track and one child track per stage of the longest pipe
+        pipes=int(timeline['cmd'].str.count(r" \| ").max()) if len(timeline)>0 else 0
+        lane_width=pipes+2 if pipes>0 else 1
+        stage_tracks=set()
+        
+        with (gzip.open(out_file,"wt") if out_file.endswith(".gz") else open(out_file,"w")) as f:
+            f.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+            f.write(json.dumps({'name':'process_name','ph':'M','pid':1,'args':{'name':'pyrpipe '+pu.get_file_basename(self.log_file)}}))
+            for i,name in enumerate(lane_names):
+                f.write(',\n'+json.dumps({'name':'thread_name','ph':'M','pid':1,'tid':i*lane_width+1,'args':{'name':name}}))
+            #commands and piped sub-commands
+            for row,lane in zip(timeline.itertuples(index=False),lane_ids):
+                ts=row.start*1e6
+                dur=row.runtime*1e6
+                tid=int(lane)*lane_width+1
+                event={'name':row.program,'cat':row.program,'ph':'X','ts':ts,'dur':dur,'pid':1,'tid':tid,
+                       'args':{'objectid':str(row.objectid),'cmd':row.cmd,'exitcode':int(row.exitcode),'threads':int(row.threads)}}
+                if not np.isnan(row.cputime):
+                    event['args']['cputime']=row.cputime
+                if not np.isnan(row.maxrss):
+                    event['args']['maxrss']=row.maxrss
+                if row.exitcode!=0:
+                    event['cname']='bad'
+                f.write(',\n'+json.dumps(event))
+                subcommands=[c.strip() for c in row.cmd.split(" | ")]
+                if len(subcommands)>1:
+                    #stages of a pipe run at the same time, each on its own track
+                    for k,c in enumerate(subcommands,start=1):
+                        if (tid+k) not in stage_tracks:
+                            stage_tracks.add(tid+k)
+                            f.write(',\n'+json.dumps({'name':'thread_name','ph':'M','pid':1,'tid':tid+k,'args':{'name':"{} stage {}".format(lane_names[int(lane)],k)}}))
+                        f.write(',\n'+json.dumps({'name':c.split(" ")[0],'cat':row.program,'ph':'X','ts':ts,'dur':dur,'pid':1,'tid':tid+k,'args':{'cmd':c,'stage':k}}))
+            #counters
+            for counter in self.get_resource_counters().itertuples(index=False):
+                ts=counter.time*1e6
+                f.write(',\n'+json.dumps({'name':'threads','ph':'C','ts':ts,'pid':1,'args':{'threads':counter.threads}}))
+                f.write(',\n'+json.dumps({'name':'cpu','ph':'C','ts':ts,'pid':1,'args':{'cores':counter.cpu}}))
+                f.write(',\n'+json.dumps({'name':'memory','ph':'C','ts':ts,'pid':1,'args':{'maxrss':counter.maxrss}}))
+            if samples_file:
+                samples=pd.read_csv(samples_file)
+                starttimes=self.parse_starttimes(self.log_data['starttime'])
+                times=(self.parse_starttimes(samples['time'].astype(str))-starttimes.min()).dt.total_seconds()*1e6
+                for col in samples.select_dtypes('number').columns:
+                    for ts,value in zip(times,samples[col]):
+                        if not np.isnan(value):
+                            f.write(',\n'+json.dumps({'name':col,'ph':'C','ts':ts,'pid':1,'args':{col:float(value)}}))
+            f.write('\n]}\n')
+        return out_file
+    
+    def get_resource_counters(self):
+        """Returns a dataframe with the threads, CPU cores and memory of the running commands after each start or end of a command.
+        CPU cores of a command are its cputime/runtime and its memory is maxrss; commands without them count as 0.
+        Columns are time, threads, cpu and maxrss.
+        """
+        timeline=self.get_timeline()
+        runtime=timeline['runtime'].values
+        cpu=np.nan_to_num(np.divide(timeline['cputime'].values,runtime,out=np.full(len(runtime),np.nan),where=runtime>0))
+        maxrss=np.nan_to_num(timeline['maxrss'].values)
+        times=np.concatenate([timeline['start'].values,timeline['end'].values])
+        is_start=np.concatenate([np.ones(timeline.shape[0]),np.zeros(timeline.shape[0])])
+        sign=is_start*2-1
+        #ends before starts at the same time
+        order=np.lexsort((is_start,times))
+        counters=pd.DataFrame({'time':times[order],
+                               'threads':np.cumsum((np.concatenate([timeline['threads'].values]*2)*sign)[order]),
+                               'cpu':np.cumsum((np.concatenate([cpu,cpu])*sign)[order]).round(3),
+                               'maxrss':np.cumsum((np.concatenate([maxrss,maxrss])*sign)[order])})
+        #last value at each time
+        return counters.drop_duplicates('time',keep='last').reset_index(drop=True)
+    
+    def get_program_statistics(self):
+        """Returns a dataframe with runtime statistics of each program: number of commands, total, mean, p50, p90, p99, max,
+        standard deviation and coefficient of variation (std/mean).
+        """
+        grouped=self.get_successful_commands().groupby('program',observed=True)['runtime']
+        result=grouped.agg(commands='count',total='sum',mean='mean',std='std',max='max')
+        quantiles=grouped.quantile([0.5,0.9,0.99]).unstack()
+        quantiles.columns=['p50','p90','p99']
+        result=result.join(quantiles)
+        result['cv']=(result['std']/result['mean']).where(result['mean']>0)
+        result.index=result.index.astype(str)
+        result.index.name='program'
+        return result.reset_index()[['program','commands','total','mean','p50','p90','p99','max','std','cv']]
+    
+    def get_input_sizes(self):
+        """Returns the input size in bytes of each successful command.
+        The size saved in the log is used; for older logs it is estimated from the input files in the command which still exist.
+        """
+        data=self.get_successful_commands()
+        sizes=data['inputsize'].copy()
+        missing=sizes.isna()
+        if missing.any():
+            cmds=self.log_data.loc[self.log_data['exitcode']==0,'cmd'].values
+            sizes[missing]=[pu.get_cmd_input_size(c) for c in cmds[missing.values]]
+        return sizes
+    
+    def get_outliers(self,factor=3.0,min_commands=5):
+        """Returns the objects whose runtime per input gigabyte is far above the typical value of the program.
+        For each program the median and the median absolute deviation (MAD) of runtime per GB are computed and a command is an
+        outlier if its robust z-score, (value-median)/(1.4826*MAD), is larger than factor.
+        
+        Parameters
+        ----------
+        factor: float
+            robust z-score above which a command is an outlier
+        min_commands: int
+            programs with fewer commands with a known input size are skipped
+        
+        :return: dataframe with objectid, program, runtime, inputsize, runtime_per_gb, program_median, ratio to median and robust_z
+        :rtype: pandas.DataFrame
+        """
+        data=self.get_successful_commands()[['objectid','program','runtime']].copy()
+        data['inputsize']=self.get_input_sizes().values
+        data=data[data['inputsize']>0]
+        data['runtime_per_gb']=data['runtime']/(data['inputsize']/1e9)
+        grouped=data.groupby('program',observed=True)['runtime_per_gb']
+        data['program_median']=grouped.transform('median')
+        data['mad']=(data['runtime_per_gb']-data['program_median']).abs().groupby(data['program'],observed=True).transform('median')
+        data['commands']=grouped.transform('count')
+        data['ratio']=data['runtime_per_gb']/data['program_median']
+        #avoid division by zero when most values are identical
+        scale=(1.4826*data['mad']).where(data['mad']>0,data['program_median']*0.01+1e-9)
+        data['robust_z']=(data['runtime_per_gb']-data['program_median'])/scale
+        outliers=data[(data['commands']>=min_commands)&(data['robust_z']>factor)]
+        outliers=outliers.sort_values('robust_z',ascending=False)
+        outliers=outliers.assign(objectid=outliers['objectid'].astype(str),program=outliers['program'].astype(str))
+        return outliers[['objectid','program','runtime','inputsize','runtime_per_gb','program_median','ratio','robust_z']].reset_index(drop=True)
+    
+    def get_throughput(self):
+        """Returns a dataframe with the throughput of each program, so that runtimes of small and large inputs can be compared.
+        Columns are program, commands, reads, inputsize (bytes), runtime, core_seconds, reads_per_second, mb_per_second,
+        reads_per_second_per_thread and mb_per_second_per_thread.
+        Rates are computed from the commands where the number of reads or the input size is known.
+        """
+        data=self.get_successful_commands()[['program','runtime','reads']].copy()
+        data['inputsize']=self.get_input_sizes().values
+        cmds=self.log_data.loc[self.log_data['exitcode']==0,'cmd']
+        data['core_seconds']=data['runtime']*np.array([self.parse_threads(c) for c in cmds])
+        has_reads=data['reads'].notna()
+        has_size=data['inputsize']>0
+        
+        grouped=data.groupby('program',observed=True)
+        result=pd.DataFrame({'commands':grouped['runtime'].count(),
+                             'reads':grouped['reads'].sum(min_count=1),
+                             'inputsize':grouped['inputsize'].sum(),
+                             'runtime':grouped['runtime'].sum(),
+                             'core_seconds':grouped['core_seconds'].sum()})
+        reads_time=data[has_reads].groupby('program',observed=True)[['runtime','core_seconds']].sum()
+        size_time=data[has_size].groupby('program',observed=True)[['runtime','core_seconds']].sum()
+        size_sum=data[has_size].groupby('program',observed=True)['inputsize'].sum()/1e6
+        result['reads_per_second']=result['reads']/reads_time['runtime']
+        result['mb_per_second']=size_sum/size_time['runtime']
+        result['reads_per_second_per_thread']=result['reads']/reads_time['core_seconds']
+        result['mb_per_second_per_thread']=size_sum/size_time['core_seconds']
+        result=result.replace([np.inf,-np.inf],np.nan)
+        result.index=result.index.astype(str)
+        result.index.name='program'
+        return result.reset_index()
+    
+    def write_statistics_report(self,factor=3.0):
+        """Write the per-program statistics, throughput and the outliers as CSV files to the out_dir.
+        """
+        self.get_program_statistics().to_csv(os.path.join(self.benchmark_dir,'program_statistics.csv'),index=False)
+        self.get_throughput().to_csv(os.path.join(self.benchmark_dir,'throughput.csv'),index=False)
+        self.get_outliers(factor=factor).to_csv(os.path.join(self.benchmark_dir,'outliers.csv'),index=False)
+    
+    def compare(self,other,threshold=0.1,alpha=0.05,min_samples=3):
+        """Compare the runtimes and peak memory of each program with another run e.g. after upgrading a tool or changing its
+        arguments. self is the baseline and other is the new run.
+        
+        For each program the median, p90 and relative change of the median are reported. Runtimes and memory of the two runs are
+        compared with a two-sided Mann-Whitney U test. Commands of objects present in both runs are paired and the median of
+        the per-object runtime ratios is reported as well. A program is flagged as a regression if the median runtime or
+        memory increased by more than threshold and the change is significant (p<alpha). Programs with fewer than min_samples
+        commands in a run are flagged on the relative change alone.
+        
+        Parameters
+        ----------
+        other: Benchmark
+            benchmark of the new run
+        threshold: float
+            relative increase considered a regression e.g. 0.1 for 10%
+        alpha: float
+            significance level
+        min_samples: int
+            minimum commands per run to use the significance test
+        
+        :return: dataframe with one row per program
+        :rtype: pandas.DataFrame
+        """
+        base_data=self.get_successful_commands()
+        new_data=other.get_successful_commands()
+        programs=list(pd.unique(pd.concat([base_data['program'].astype(str),new_data['program'].astype(str)])))
+        base_groups={str(k):v for k,v in base_data.groupby('program',observed=True)}
+        new_groups={str(k):v for k,v in new_data.groupby('program',observed=True)}
+        rows=[]
+        for program in programs:
+            row={'program':program}
+            base=base_groups.get(program)
+            new=new_groups.get(program)
+            row['base_commands']=0 if base is None else base.shape[0]
+            row['new_commands']=0 if new is None else new.shape[0]
+            if base is None or new is None:
+                row['regression']=False
+                rows.append(row)
+                continue
+            use_test=min(base.shape[0],new.shape[0])>=min_samples
+            flags=[]
+            for col in ['runtime','maxrss']:
+                b=base[col].dropna().values
+                n=new[col].dropna().values
+                if len(b)<1 or len(n)<1:
+                    continue
+                row['base_median_'+col]=np.median(b)
+                row['new_median_'+col]=np.median(n)
+                row['base_p90_'+col]=np.percentile(b,90)
+                row['new_p90_'+col]=np.percentile(n,90)
+                row['delta_'+col]=(np.median(n)-np.median(b))/np.median(b) if np.median(b)>0 else np.nan
+                u,p=mann_whitney_u(b,n)
+                row['pvalue_'+col]=p
+                significant=p<alpha if use_test else True
+                flags.append(bool(row['delta_'+col]>threshold and significant))
+            #objects present in both runs
+            paired=base.drop_duplicates('objectid').merge(new.drop_duplicates('objectid'),on='objectid',suffixes=('_base','_new'))
+            paired=paired[(paired['objectid'].astype(str)!='NA')&(paired['runtime_base']>0)]
+            row['paired_objects']=paired.shape[0]
+            if paired.shape[0]>0:
+                row['paired_runtime_ratio']=float(np.median(paired['runtime_new']/paired['runtime_base']))
+            row['regression']=any(flags)
+            rows.append(row)
+        return pd.DataFrame(rows)
+    
     def plot_time_perobject(self):
         """Function to plot charts summarizing runtimes for each object in the pipeline.
         The charts are save to the out_dir path.
@@ -220,36 +859,35 @@ class Benchmark:
     def get_time_perprogram(self):
         """Returns a dataframe with program execution times.
         """
-        result=pd.DataFrame()
-        for k in self.runtimes_by_prog:
-            v=self.runtimes_by_prog[k]
-            total=sum(v)
-            mean=sum(v)/len(v)
-            row={'program':k,'total':[total],'average':[mean]}
-            #add row to dataframe
-            result=result.append(pd.DataFrame.from_dict(row),sort=False)
+        data=self.get_successful_commands()
+        result=data.groupby('program',observed=True)['runtime'].agg(total='sum',average='mean').reset_index()
+        result['program']=result['program'].astype(str)
         return result
     
     def get_programtime_boxdata(self):
-        """Return dataframe to make box plot of program times
+        """Return dataframe to make box plot of program times.
+        The dataframe has the columns data (runtime) and name (program) with one row per command.
         """
-        box_data=pd.DataFrame({ key:pd.Series(value) for key, value in self.runtimes_by_prog.items() })
-        #return box_data
-        
-        
-        ndf=pd.DataFrame(columns=['data','name'])
-        for i in range(box_data.shape[1]):
-            to_append=list(box_data.iloc[:,i])
-            col_name=box_data.columns[i]
-            col_list=[col_name for x in to_append]
-            for j in range(len(to_append)):
-                ndf=ndf.append({'data':to_append[j],'name':col_list[j]},ignore_index=True )
-        
-        return ndf
+        box_data=self.runtime_table[['runtime','program']].rename(columns={'runtime':'data','program':'name'})
+        box_data['name']=box_data['name'].astype(str)
+        return box_data
+    
+    def get_programtime_widedata(self):
+        """Return dataframe with one column of runtimes for each program
+        """
+        data=self.runtime_table
+        wide=data.assign(row=data.groupby('program',observed=True).cumcount()).pivot(index='row',columns='program',values='runtime')
+        wide.columns=[str(x) for x in wide.columns]
+        return wide.reset_index(drop=True)
         
         
-    def plot_time_perprogram(self):
+    def plot_time_perprogram(self,max_points=500):
         """Function to plot charts to summarize runtimes of each program
+        
+        Parameters
+        ----------
+        max_points: int
+            maximum number of observations per program drawn as points over the boxplots. Boxplots use all the observations.
         """
         data=self.get_time_perprogram()
         sns.set_context('poster')
@@ -279,7 +917,7 @@ class Benchmark:
         sns.set_color_codes('bright')
         sns.set_context('poster')
         box_data=self.get_programtime_boxdata()
-        numprog=len(self.runtimes_by_prog.keys())
+        numprog=data.shape[0]
         #sns.set(style="ticks")
         # Initialize the figure with a logarithmic x axis
         f, ax = plt.subplots(figsize=(20, numprog*2))
@@ -287,8 +925,9 @@ class Benchmark:
         
         #sns.boxplot( data=box_data,orient="h")
         sns.boxplot(x="data", y="name", data=box_data)
-        # Add in points to show each observation
-        sns.swarmplot(x="data", y="name", data=box_data,size=5, color=".3", linewidth=0)
+        # Add in points to show observations; sample large programs as swarm placement is quadratic
+        point_data=box_data.sample(frac=1,random_state=1).groupby('name').head(max_points)
+        sns.swarmplot(x="data", y="name", data=point_data,size=5, color=".3", linewidth=0)
         
         ax.xaxis.grid(True)
         ax.set(ylabel="")
@@ -322,7 +961,7 @@ class Benchmark:
         outfile=os.path.join(self.benchmark_dir,'time_per_program.csv')
         data.to_csv(outfile, index=False)
         #save boxplot data
-        box_data=pd.DataFrame({ key:pd.Series(value) for key, value in self.runtimes_by_prog.items() })
+        box_data=self.get_programtime_widedata()
         outfile=os.path.join(self.benchmark_dir,'program_box_data.csv')
         box_data.to_csv(outfile, index=False)
         
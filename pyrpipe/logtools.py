@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 11:05:43 2026
+
+@author: usingh
+
+Classes to read pyrpipe logs incrementally
+"""
+
+import os
+import json
+import mmap
+import heapq
+import hashlib
+import gzip
+import tempfile
+from datetime import datetime, timedelta
+from html import escape
+from pyrpipe import pyrpipe_utils as pu
+
+
+class LogFollower():
+    """
+    Class to follow a pyrpipe log which is being written, like tail -f.
+    Each call to read_new() returns only the lines written since the previous call.
+    The log is read in chunks and at most max_bytes are read per call, so a large backlog is read over several calls.
+    Incomplete lines at the end of the file are kept until they are complete.
+
+    Parameters
+    ----------
+    log_file: str
+        path to the pyrpipe log
+    max_bytes: int
+        maximum bytes to read per call to read_new()
+    chunk_size: int
+        bytes to read at a time
+
+    Attributes
+    ----------
+    offset: int
+        position in the file up to which bytes were read
+    partial: bytearray
+        incomplete last line read so far
+    at_end: bool
+        True if the last call to read_new() reached the end of the file
+    """
+    def __init__(self,log_file,max_bytes=64*1024*1024,chunk_size=1024*1024):
+        self.log_file=log_file
+        self.max_bytes=max_bytes
+        self.chunk_size=chunk_size
+        self.offset=0
+        self.partial=bytearray()
+        self.at_end=False
+
+    def read_new(self):
+        """Returns the new complete lines in the log, reading at most max_bytes.
+        If the file became smaller than the offset, it was replaced and is read from the start.
+
+        :return: list of lines
+        :rtype: list
+        """
+        self.at_end=False
+        if not pu.check_files_exist(self.log_file):
+            self.at_end=True
+            return []
+        if os.path.getsize(self.log_file)<self.offset:
+            self.offset=0
+            self.partial=bytearray()
+        lines=[]
+        bytes_read=0
+        with open(self.log_file,'rb') as f:
+            f.seek(self.offset)
+            while bytes_read<self.max_bytes:
+                chunk=f.read(min(self.chunk_size,self.max_bytes-bytes_read))
+                if not chunk:
+                    self.at_end=True
+                    break
+                bytes_read+=len(chunk)
+                self.offset+=len(chunk)
+                #keep the incomplete last line for the next chunk
+                end=chunk.rfind(b"\n")+1
+                if not end:
+                    self.partial+=chunk
+                    continue
+                data=bytes(self.partial)+chunk[:end]
+                self.partial=bytearray(chunk[end:])
+                lines.extend(l for l in data.decode("utf-8").split("\n") if l.strip())
+        return lines
+
+
+class RunMonitor():
+    """
+    Class to keep aggregates of a pyrpipe log which are updated with each new line, without reading old records again.
+    Aggregates are the number of commands, failures and runtimes of each program, and the commands in progress
+    (logged with #RUNNING lines and not finished yet).
+
+    Attributes
+    ----------
+    programs: dict
+        program name is the key and a dict with commands, failed, total_runtime and max_runtime is the value
+    running: dict
+        commands in progress. (cmd, starttime) is the key and the #RUNNING record is the value
+    num_commands: int
+        number of finished commands
+    num_failed: int
+        number of failed commands
+    first_start: str
+        start time of the first command
+    last_end: str
+        end time of the last finished command
+    """
+    def __init__(self):
+        self.programs={}
+        self.running={}
+        self.num_commands=0
+        self.num_failed=0
+        self.first_start=None
+        self.last_end=None
+
+    def update(self,lines):
+        """Update aggregates with new lines of the log
+
+        Parameters
+        ----------
+        lines: list
+            lines from LogFollower.read_new()
+
+        :return: number of finished commands added
+        :rtype: int
+        """
+        added=0
+        for line in lines:
+            if line.startswith("#RUNNING "):
+                record=json.loads(line[len("#RUNNING "):])
+                self.running[(record['cmd'],record['starttime'])]=record
+                if self.first_start is None:
+                    self.first_start=record['starttime']
+                continue
+            if line.startswith("#"):
+                continue
+            self.add_record(json.loads(line))
+            added+=1
+        return added
+
+    def add_record(self,record):
+        """Add a finished command
+        """
+        self.running.pop((record['cmd'],record.get('starttime')),None)
+        program=record.get('commandname',record['cmd'].split(" ")[0])
+        runtime=pu.parse_runtime(record['runtime'])
+        if program not in self.programs:
+            self.programs[program]={'commands':0,'failed':0,'total_runtime':0.0,'max_runtime':0.0}
+        stats=self.programs[program]
+        stats['commands']+=1
+        stats['total_runtime']+=runtime
+        stats['max_runtime']=max(stats['max_runtime'],runtime)
+        self.num_commands+=1
+        if int(record['exitcode'])!=0:
+            stats['failed']+=1
+            self.num_failed+=1
+        if self.first_start is None:
+            self.first_start=record.get('starttime')
+        self.last_end=record.get('endtime',self.last_end)
+
+    def get_running(self,now=None):
+        """Returns the commands in progress with the time they have been running, longest first.
+
+        :return: list of dicts with cmd, objectid, commandname, starttime and elapsed seconds
+        :rtype: list
+        """
+        if now is None:
+            now=datetime.now().astimezone()
+        result=[]
+        for record in self.running.values():
+            try:
+                elapsed=(now-pu.parse_timestamp(record['starttime'])).total_seconds()
+            except (TypeError,ValueError):
+                elapsed=None
+            result.append({**record,'elapsed':elapsed})
+        return sorted(result,key=lambda r: -(r['elapsed'] or 0))
+
+    def get_program_rows(self):
+        """Returns a list of rows (program, commands, failed, total, mean and max runtime)
+        """
+        rows=[]
+        for program,v in self.programs.items():
+            rows.append((program,v['commands'],v['failed'],v['total_runtime'],v['total_runtime']/v['commands'],v['max_runtime']))
+        return rows
+
+    def to_text(self,max_running=20):
+        """Returns a summary to print in the terminal
+        """
+        lines=["Commands: {}  Failed: {}  Running: {}  First start: {}  Last end: {}".format(self.num_commands,self.num_failed,len(self.running),self.first_start,self.last_end),""]
+        lines.append("{:<25} {:>9} {:>7} {:>14} {:>12} {:>12}".format("program","commands","failed","total","mean","max"))
+        for program,commands,failed,total,mean,maxtime in self.get_program_rows():
+            lines.append("{:<25} {:>9} {:>7} {:>14} {:>12} {:>12}".format(program[:25],commands,failed,format_seconds(total),format_seconds(mean),format_seconds(maxtime)))
+        running=self.get_running()
+        if running:
+            lines.append("")
+            lines.append("Running:")
+            for r in running[:max_running]:
+                lines.append("  {:<12} {:<15} {}".format(format_seconds(r['elapsed']),str(r['objectid'])[:15],r['cmd'][:80]))
+            if len(running)>max_running:
+                lines.append("  ... {} more".format(len(running)-max_running))
+        return "\n".join(lines)
+
+    def to_html(self,refresh=0):
+        """Returns the summary as an html page.
+
+        Parameters
+        ----------
+        refresh: int
+            seconds after which the browser reloads the page. 0 to disable.
+        """
+        html=['<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n<title>pyrpipe progress</title>']
+        if refresh>0:
+            html.append('<meta http-equiv="refresh" content="{}">'.format(int(refresh)))
+        html.append('</head>\n<body>\n<h2><em>pyrpipe</em> progress</h2>')
+        html.append('<p>Updated: {}</p>'.format(escape(datetime.now().astimezone().isoformat(timespec='seconds'))))
+        html.append('<p>Commands: {} &nbsp; Failed: {} &nbsp; Running: {} &nbsp; First start: {} &nbsp; Last end: {}</p>'.format(
+                    self.num_commands,self.num_failed,len(self.running),escape(str(self.first_start)),escape(str(self.last_end))))
+        html.append('<table border="1">\n<tr><th>program</th><th>commands</th><th>failed</th><th>total</th><th>mean</th><th>max</th></tr>')
+        for program,commands,failed,total,mean,maxtime in self.get_program_rows():
+            html.append('<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+                        escape(program),commands,failed,format_seconds(total),format_seconds(mean),format_seconds(maxtime)))
+        html.append('</table>')
+        html.append('<h3>Running</h3>\n<table border="1">\n<tr><th>elapsed</th><th>objectid</th><th>command</th></tr>')
+        for r in self.get_running():
+            html.append('<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>'.format(format_seconds(r['elapsed']),escape(str(r['objectid'])),escape(r['cmd'])))
+        html.append('</table>\n</body>\n</html>\n')
+        return "\n".join(html)
+
+
+class LogIndex():
+    """
+    Class to index a pyrpipe log for random access.
+    The index is a tab separated sidecar file (<log>.idx) with the byte offset, length, exitcode, objectid and
+    commandname of each command. It is built once and extended with the commands added to the log since the last update.
+    The first line of the index saves the identity of the log (device, inode and a hash of its first bytes); the index is
+    rebuilt if the log was replaced.
+    Records are read from the log through a memory map, seeking directly to the commands needed.
+
+    Parameters
+    ----------
+    log_file: str
+        path to the pyrpipe log. Compressed logs can not be indexed.
+    index_file: str
+        path to the index. Default: <log_file>.idx
+
+    Attributes
+    ----------
+    rows: list
+        list of (offset, length, exitcode, objectid, commandname) tuples
+    """
+    def __init__(self,log_file,index_file=None):
+        if log_file.endswith(".gz"):
+            raise Exception("ERROR: Compressed logs can not be indexed: {}".format(log_file))
+        if index_file is None:
+            index_file=log_file+".idx"
+        self.log_file=log_file
+        self.index_file=index_file
+        self.rows=None
+        self.by_objectid=None
+
+    def get_indexed_size(self):
+        """Returns the position in the log up to which commands are indexed
+        """
+        if not pu.check_files_exist(self.index_file):
+            return 0
+        with open(self.index_file,'rb') as f:
+            f.seek(0,os.SEEK_END)
+            f.seek(max(0,f.tell()-65536))
+            lines=f.read().splitlines()
+        if not lines or lines[-1].startswith(b"#"):
+            return 0
+        fields=lines[-1].split(b"\t")
+        return int(fields[0])+int(fields[1])
+
+    def get_log_identity(self,head_length=None):
+        """Returns the identity of the log: device, inode, number of bytes hashed and sha256 of the first bytes.
+
+        Parameters
+        ----------
+        head_length: int
+            number of bytes to hash. Default: first 4096 bytes or the whole log if smaller.
+        """
+        stat=os.stat(self.log_file)
+        if head_length is None:
+            head_length=min(4096,stat.st_size)
+        with open(self.log_file,'rb') as f:
+            head=f.read(head_length)
+        return [str(stat.st_dev),str(stat.st_ino),str(head_length),hashlib.sha256(head).hexdigest()]
+
+    def is_valid(self):
+        """Check if the index belongs to the log: the identity saved in the index matches the log, the log is not smaller
+        than the indexed size and the last indexed command ends with a newline at the indexed size.
+
+        :return: True if the index can be extended
+        :rtype: bool
+        """
+        if not pu.check_files_exist(self.index_file):
+            return False
+        with open(self.index_file) as f:
+            identity=f.readline().rstrip("\n").split("\t")
+        if len(identity)!=5 or identity[0]!="#identity":
+            return False
+        try:
+            if identity[1:]!=self.get_log_identity(int(identity[3])):
+                return False
+        except (OSError,ValueError):
+            return False
+        position=self.get_indexed_size()
+        if os.path.getsize(self.log_file)<position:
+            return False
+        if position>0:
+            with open(self.log_file,'rb') as f:
+                f.seek(position-1)
+                if f.read(1)!=b"\n":
+                    return False
+        return True
+
+    def update(self):
+        """Add the commands written to the log since the last update to the index.
+        The index is rebuilt if it does not belong to the log e.g. the log was replaced (see is_valid()).
+
+        :return: number of commands added
+        :rtype: int
+        """
+        if self.is_valid():
+            position=self.get_indexed_size()
+        else:
+            with open(self.index_file,'w') as out:
+                out.write("\t".join(["#identity"]+self.get_log_identity())+"\n")
+                out.write("#offset\tlength\texitcode\tobjectid\tcommandname\n")
+            position=0
+        added=0
+        offset=position
+        with open(self.log_file,'rb') as f, open(self.index_file,'a') as out:
+            f.seek(position)
+            for line in f:
+                #incomplete line being written
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip() and not line.startswith(b"#"):
+                    record=json.loads(line)
+                    out.write("{}\t{}\t{}\t{}\t{}\n".format(offset,len(line),record.get('exitcode',-1),
+                                                          clean_field(record.get('objectid','NA')),
+                                                          clean_field(record.get('commandname',record['cmd'].split(" ")[0]))))
+                    added+=1
+                offset+=len(line)
+        self.rows=None
+        self.by_objectid=None
+        return added
+
+    def load(self):
+        """Update the index and read it
+
+        :return: rows of the index
+        :rtype: list
+        """
+        self.update()
+        rows=[]
+        with open(self.index_file) as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                offset,length,exitcode,objectid,commandname=line.rstrip("\n").split("\t")
+                try:
+                    exitcode=int(exitcode)
+                except ValueError:
+                    exitcode=-1
+                rows.append((int(offset),int(length),exitcode,objectid,commandname))
+        self.rows=rows
+        return rows
+
+    def find(self,objectids=None,programs=None,exclude_programs=None,status=None):
+        """Returns the rows of the commands matching the filters, in log order.
+
+        Parameters
+        ----------
+        objectids: list
+            objectids to keep
+        programs: list
+            programs to keep
+        exclude_programs: list
+            programs to skip
+        status: str
+            pass: only exitcode 0; fail: only exitcode other than 0. Default: all
+
+        :return: rows of the index
+        :rtype: list
+        """
+        if self.rows is None:
+            self.load()
+        if objectids is not None:
+            if self.by_objectid is None:
+                self.by_objectid={}
+                for i,row in enumerate(self.rows):
+                    self.by_objectid.setdefault(row[3],[]).append(i)
+            indices=sorted([i for o in objectids for i in self.by_objectid.get(str(o),[])])
+            rows=[self.rows[i] for i in indices]
+        else:
+            rows=self.rows
+        result=[]
+        for row in rows:
+            if programs is not None and row[4] not in programs:
+                continue
+            if exclude_programs and row[4] in exclude_programs:
+                continue
+            if status=='pass' and row[2]!=0:
+                continue
+            if status=='fail' and row[2]==0:
+                continue
+            result.append(row)
+        return result
+
+    def read_records(self,objectids=None,programs=None,exclude_programs=None,status=None):
+        """Generator to read the commands matching the filters (see find()) using a memory map of the log.
+
+        :return: yields a dict for each command
+        :rtype: dict
+        """
+        rows=self.find(objectids=objectids,programs=programs,exclude_programs=exclude_programs,status=status)
+        if not rows:
+            return
+        with open(self.log_file,'rb') as f:
+            with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mm:
+                for offset,length,exitcode,objectid,commandname in rows:
+                    yield json.loads(mm[offset:offset+length])
+
+
+def get_env_log(log_file):
+    """Returns the path to the ENV log of a pyrpipe log e.g. <timestamp>_pyrpipeENV.log for <timestamp>_pyrpipe.log.
+    Segments of a log e.g. <timestamp>_pyrpipe.log.1.gz use the ENV log of the log.
+    """
+    log_dir=pu.get_file_directory(log_file)
+    name=pu.get_filename(log_file)
+    if "_pyrpipe.log" in name:
+        name=name.split("_pyrpipe.log")[0]+"_pyrpipe"
+    else:
+        name=pu.get_file_basename(name[:-3] if name.endswith(".gz") else name)
+    return os.path.join(log_dir,name+"ENV.log")
+
+
+def get_log_source(log_file):
+    """Returns the host and session of a pyrpipe log, read from its ENV log.
+    Older ENV logs do not save the host and session; host is NA and session is the name of the log.
+
+    :return: A tuple with host, session, the system information and the programs in the ENV log
+    :rtype: tuple
+    """
+    env_log=get_env_log(log_file)
+    sys_info={}
+    programs={}
+    if pu.check_files_exist(env_log):
+        sys_info,programs=pu.parse_env_log(env_log)
+    session=sys_info.get('session',pu.get_file_basename(env_log)[:-len("ENV")])
+    return sys_info.get('host','NA'),session,sys_info,programs
+
+
+def get_start_key(record):
+    """Returns the start time of a command in seconds since epoch, used to sort commands. 0 if the start time is missing.
+    """
+    try:
+        return pu.parse_timestamp(record['starttime']).timestamp()
+    except (KeyError,TypeError,ValueError):
+        return 0.0
+
+
+def read_log_keys(log_file,file_index,host,session,spool=None):
+    """Read the start time, position, exitcode and retry key of each command in a log.
+    Records are not kept in memory; their byte offset and length are saved and they are read again when merging.
+    Compressed logs can not be read at an offset, so their lines are copied uncompressed to spool and the offsets refer to the spool.
+
+    Parameters
+    ----------
+    log_file: str
+        path to the log
+    file_index: int
+        index of the log in the merged logs
+    host: str
+        host of the log
+    session: str
+        session of the log
+    spool: file
+        temporary file opened in binary mode. Required for compressed logs.
+
+    :return: list of (start, file index, offset, length, exitcode, retry key) tuples sorted by start time
+    :rtype: list
+    """
+    keys=[]
+    offset=0
+    with (gzip.open(log_file,'rb') if log_file.endswith(".gz") else open(log_file,'rb')) as f:
+        for line in f:
+            if spool is not None:
+                spool.write(line)
+            if line.strip() and not line.startswith(b"#") and line.endswith(b"\n"):
+                record=json.loads(line)
+                try:
+                    exitcode=int(record.get('exitcode',-1))
+                except (TypeError,ValueError):
+                    exitcode=-1
+                keys.append((get_start_key(record),file_index,offset,len(line),exitcode,get_retry_key(record,host,session)))
+            offset+=len(line)
+    if spool is not None:
+        spool.flush()
+    return sorted(keys,key=lambda k: (k[0],k[2]))
+
+
+def get_utc_timestamp(timestamp):
+    """Returns a timestamp from the log as ISO-8601 in UTC. Invalid timestamps are returned unchanged.
+    """
+    try:
+        return pu.parse_timestamp_utc(timestamp).isoformat()
+    except (TypeError,ValueError):
+        return timestamp
+
+
+def get_retry_key(record,host,session):
+    """Commands with the same objectid and command line run on the same host and session are attempts of the same command
+    """
+    return hashlib.md5("\t".join([host,session,str(record.get('objectid','NA')),record['cmd']]).encode("utf-8")).digest()
+
+
+def merge_logs(log_files,out_file,deduplicate=True):
+    """Merge pyrpipe logs from many runs and hosts into one log ordered by the start time of commands.
+    Commands of each log are sorted by start time and the logs are merged with a k-way merge, reading one record at a time,
+    so the stdout of the commands is never held in memory. Compressed logs are decompressed to a temporary file next to out_file.
+    Each record is tagged with the host and session from the ENV log of its log, and its start and end times are saved as
+    ISO-8601 in UTC. A merged ENV log with the total cores of all hosts is written next to the merged log, so that
+    Benchmark and the diagnostic reports can use it.
+
+    Parameters
+    ----------
+    log_files: list
+        paths to pyrpipe logs. Logs compressed with gzip are supported.
+    out_file: str
+        path to the merged log e.g. merged_pyrpipe.log
+    deduplicate: bool
+        remove failed attempts of commands which were retried later in the same session (same host, session, objectid and
+        command line). Successful commands are always kept. The number of attempts is saved as attempts in the record which is kept.
+
+    :return: A tuple with the number of commands written and the number of failed attempts removed
+    :rtype: tuple
+    """
+    sources=[get_log_source(l) for l in log_files]
+    spools={}
+    maps={}
+    written=0
+    removed=0
+    try:
+        keys=[]
+        for i,l in enumerate(log_files):
+            if l.endswith(".gz"):
+                spools[i]=tempfile.TemporaryFile(dir=pu.get_file_directory(out_file) or None)
+            keys.append(read_log_keys(l,i,sources[i][0],sources[i][1],spools.get(i)))
+        #last attempt of each command
+        last={}
+        if deduplicate:
+            for k in heapq.merge(*keys,key=lambda k: (k[0],k[1],k[2])):
+                last[k[5]]=(k[1],k[2])
+        for i,l in enumerate(log_files):
+            if keys[i]:
+                if i in spools:
+                    maps[i]=mmap.mmap(spools[i].fileno(),0,access=mmap.ACCESS_READ)
+                else:
+                    with open(l,'rb') as f:
+                        maps[i]=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        #failed attempts removed before the next attempt
+        failed={}
+        with open(out_file,"w") as out:
+            out.write("#START LOG\n")
+            for start,file_index,offset,length,exitcode,retry_key in heapq.merge(*keys,key=lambda k: (k[0],k[1],k[2])):
+                attempts=0
+                if deduplicate:
+                    if exitcode!=0 and last[retry_key]!=(file_index,offset):
+                        failed[retry_key]=failed.get(retry_key,0)+1
+                        removed+=1
+                        continue
+                    attempts=failed.pop(retry_key,0)
+                record=json.loads(maps[file_index][offset:offset+length])
+                record['host'],record['session']=sources[file_index][0],sources[file_index][1]
+                #logs of different versions save times in different formats
+                for key in ['starttime','endtime']:
+                    if key in record:
+                        record[key]=get_utc_timestamp(record[key])
+                if attempts>0:
+                    record['attempts']=attempts+1
+                out.write(json.dumps(record)+"\n")
+                written+=1
+    finally:
+        for m in maps.values():
+            m.close()
+        for spool in spools.values():
+            spool.close()
+    write_merged_env_log(sources,get_env_log(out_file))
+    return written,removed
+
+
+def write_merged_env_log(sources,env_log):
+    """Write the ENV log of a merged log. System information of the first log is used, with cpu as the total cores
+    of all hosts and the hosts and sessions that were merged. Sessions with an unknown host are counted as separate hosts.
+    Programs of all ENV logs are saved.
+    """
+    sys_info={}
+    hosts={}
+    sessions=[]
+    programs={}
+    for host,session,info,this_programs in sources:
+        if not sys_info:
+            sys_info=dict(info)
+        programs.update(this_programs)
+        if host=="NA":
+            host=session
+        try:
+            hosts[host]=max(hosts.get(host,0),int(info['cpu'].split(" ")[0]))
+        except (KeyError,ValueError):
+            pass
+        if session not in sessions:
+            sessions.append(session)
+    sys_info['cpu']=str(sum(hosts.values()))+' logical CPU cores'
+    sys_info['hosts']=hosts
+    sys_info['sessions']=sessions
+    with open(env_log,"w") as f:
+        f.write("#START LOG\n")
+        f.write(json.dumps(sys_info)+"\n")
+        f.write("#PROGRAMS\n")
+        for name,desc in programs.items():
+            f.write(json.dumps(desc)+"\n")
+
+
+def clean_field(value):
+    """Returns value as a string without tabs and newlines, to save in the index
+    """
+    return str(value).replace("\t"," ").replace("\n"," ")
+
+
+def format_seconds(seconds):
+    """Returns seconds as H:MM:SS
+    """
+    if seconds is None:
+        return "NA"
+    return str(timedelta(seconds=round(seconds)))
@@ -9,7 +9,10 @@ contains classes of RNA-Seq alignment programs
 
 from pyrpipe import pyrpipe_utils as pu
 from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 class Aligner:
     """This is an abstract class for alignment programs.
@@ -18,13 +21,14 @@ class Aligner:
         self.category="Aligner"
         self.passedArgumentDict={}
         self.index=index
+        self.share_index=False
         
     def build_index(self):
         """function to create an index used by the aligner
         """
         pass
     
-    def check_index(self):
+    def check_index(self,full_verify=False):
         """Function to check if index of this object is valid and exists
         """
     
@@ -33,6 +37,32 @@ class Aligner:
         
         """
         pass
+    
+    def get_index_memory(self,index,index_files,args_dict):
+        """Function to get the memory needed by the index files of a job.
+        If self.share_index is True the index is memory-mapped (--mm) and pre-warmed into the page cache once,
+        so that concurrent jobs using the same index are counted only once by the resource manager.
+        
+        Parameters
+        ----------
+        index: str
+            path to the index
+        index_files: list
+            files of the index
+        args_dict: dict
+            arguments passed to the aligner
+        
+        :return: A tuple with the arguments, private memory and shared memory to pass to the resource manager
+        :rtype: tuple
+        """
+        index_size=pu.get_total_size(*index_files)
+        if not self.share_index:
+            #each process loads its own copy
+            return args_dict,index_size,None
+        
+        new_args={**args_dict,'--mm':""}
+        pr.resourceManagerObject.prewarm(*index_files)
+        return new_args,0,(index,index_size)
 
 class Hisat2(Aligner):
     """This class represents hisat2 program.
@@ -41,6 +71,9 @@ class Hisat2(Aligner):
        ----------       
        hisat2_index: string
             path to q histat2 index. This index will be used when hisat is invoked using this object.
+       
+       share_index: bool
+            memory-map the index (--mm) so that concurrent hisat2 processes share a single copy of the index.
             
        **kwargs: dict
             parameters passed to the hisat2 program. These parameters could be overridden later when running hisat.
@@ -49,10 +82,11 @@ class Hisat2(Aligner):
     ----------
     
     """ 
-    def __init__(self,hisat2_index="",**kwargs):
+    def __init__(self,hisat2_index="",share_index=False,**kwargs):
         
         super().__init__() 
         self.programName="hisat2"
+        self.share_index=share_index
         #check if hisat2 exists
         if not pe.check_dependencies([self.programName]):
             raise Exception("ERROR: "+ self.programName+" not found.")
@@ -72,6 +106,8 @@ class Hisat2(Aligner):
                             '--reorder','--mm','--qc-filter','--seed','--non-deterministic',
                             '--remove-chrname','--add-chrname','--version']
         
+        #argument to set threads
+        self.threads_args=['-p']
         
         #initialize the passed arguments
         self.passedArgumentDict=kwargs
@@ -88,7 +124,7 @@ class Hisat2(Aligner):
         
         
             
-    def build_index(self,index_path,index_name,*args,verbose=False,quiet=False,logs=True,objectid="NA",**kwargs):
+    def build_index(self,index_path,index_name,*args,overwrite=True,verbose=False,quiet=False,logs=True,objectid="NA",registry=None,**kwargs):
         """Build a hisat index with given parameters and saves the new index to self.hisat2_index.
         
         Parameters
@@ -103,6 +139,9 @@ class Hisat2(Aligner):
         args: tuple
             Path to reference input files
             
+        overwrite: bool
+            If False and an index with same name exists, the existing index is used
+            
         verbose : bool
             Print stdout and std error
             
@@ -115,6 +154,9 @@ class Hisat2(Aligner):
         objectid : string 
             Provide an id to attach with this command e.g. the SRR accession. This is useful for debugging, benchmarking and reports.
         
+        registry: IndexRegistry
+            If provided, an index built with the same reference files and parameters is reused from the registry. Otherwise the index is built in the registry and index_path is ignored.
+        
         kwargs: dict
             Parameters for the hisat2-build command
         
@@ -132,8 +174,18 @@ class Hisat2(Aligner):
         if not pu.check_files_exist(*args):
             pu.print_boldred("Please check input reference sequences provided to hisat2-build. Exiting")
             return False
+        
+        #reuse an index built with the same references and parameters
+        if registry is not None:
+            index_dir=registry.get_or_build('hisat2-build',list(args),{**kwargs,'index_name':index_name},
+                                            lambda path: self.build_index(path,index_name,*args,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**kwargs),
+                                            ignore_args=['-p'])
+            if not index_dir:
+                return False
+            self.hisat2_index=os.path.join(index_dir,index_name)
+            self.passedArgumentDict['-x']=self.hisat2_index
+            return self.check_index()
             
-        overwrite=True
         print("Building hisat index...")
         
         hisat2Buildvalid_args=['-c','--large-index','-a','-p','--bmax','--bmaxdivn','--dcv','--nodc','-r','-3','-o',
@@ -149,24 +201,36 @@ class Hisat2(Aligner):
             #check if files exists
             if pu.check_hisatindex(os.path.join(index_path,index_name)):
                 print("Hisat2 index with same name already exists. Exiting...")
+                self.hisat2_index=os.path.join(index_path,index_name)
+                self.passedArgumentDict['-x']=self.hisat2_index
                 return True
         
+        #get threads from the shared core budget
+        build_args,job_id=pr.resourceManagerObject.acquire('hisat2-build',kwargs,['-p'],objectid=objectid)
+        
         hisat2Build_Cmd=['hisat2-build']
         #add options
-        hisat2Build_Cmd.extend(pu.parse_unix_args(hisat2Buildvalid_args,kwargs))
+        hisat2Build_Cmd.extend(pu.parse_unix_args(hisat2Buildvalid_args,build_args))
         #add input files
         hisat2Build_Cmd.append(str(",".join(args)))
         #add dir/basenae
         hisat2Build_Cmd.append(os.path.join(index_path,index_name))
         #print("Executing:"+str(" ".join(hisat2Build_Cmd)))
         
+        #mark the index incomplete until the build finishes
+        pu.start_index_manifest(os.path.join(index_path,index_name))
+        
         #start ececution
-        status=pe.execute_command(hisat2Build_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(hisat2Build_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("hisatBuild failed")
             return False
         
-        #check index files
+        #write manifest and check index files
+        pu.write_index_manifest(os.path.join(index_path,index_name),pu.get_hisatindex_files(os.path.join(index_path,index_name)))
         if not pu.check_hisatindex(os.path.join(index_path,index_name)):
             pu.print_boldred("hisatBuild failed")
             return False
@@ -263,13 +327,23 @@ class Hisat2(Aligner):
             
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #memory used by the index
+        index=mergedArgsDict.get('-x',self.hisat2_index)
+        mergedArgsDict,memory,shared_memory=self.get_index_memory(index,pu.get_hisatindex_files(index),mergedArgsDict)
+        
+        #get threads from the shared core budget
+        mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid,memory=memory,shared_memory=shared_memory)
        
         hisat2_Cmd=['hisat2']
         #add options
         hisat2_Cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))        
         
         #execute command
-        cmd_status=pe.execute_command(hisat2_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            cmd_status=pe.execute_command(hisat2_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not cmd_status:
             print("hisat2 failed:"+" ".join(hisat2_Cmd))
      
@@ -278,9 +352,19 @@ class Hisat2(Aligner):
         
         
     
-    def check_index(self):
+    def check_index(self,full_verify=False):
+        """Function to check hisat2 index using its manifest.
+        
+        Parameters
+        ----------
+        full_verify: bool
+            Verify checksums of all the index files
+        
+        :return: Returns True if index exists and is valid
+        :rtype: bool
+        """
         if hasattr(self,'hisat2_index'):
-            return(pu.check_hisatindex(self.hisat2_index))
+            return(pu.check_hisatindex(self.hisat2_index,full_verify))
         else:
             return False
 
@@ -313,18 +397,20 @@ class Star(Aligner):
                             '--genomeDir','--genomeLoad','--genomeFastaFiles','--genomeChrBinNbits','--genomeSAindexNbases','--genomeSAsparseD','--genomeSuffixLengthMax','--genomeChainFiles','--genomeFileSizes',
                             '--sjdbFileChrStartEnd','--sjdbGTFfile','--sjdbGTFchrPrefix','--sjdbGTFfeatureExon','--sjdbGTFtagExonParentTranscript','--sjdbGTFtagExonParentGene','--sjdbOverhang','--sjdbScore','--sjdbInsertSave',
                             '--inputBAMfile','--readFilesIn','--readFilesCommand','--readMapNumber','--readMatesLengthsIn','--readNameSeparator','--clip3pNbases','--clip5pNbases','--clip3pAdapterSeq','--clip3pAdapterMMp','--clip3pAfterAdapterNbases',
-                            '--limitGenomeGenerateRAM','--limitIObufferSize','--limitOutSAMoneReadBytes','--limitOutSJoneRead','--limitOutSJcollapsed','--limitBAMsortRAM ','--limitSjdbInsertNsj','--outFileNamePrefix','--outTmpDir','--outTmpKeep',
+                            '--limitGenomeGenerateRAM','--limitIObufferSize','--limitOutSAMoneReadBytes','--limitOutSJoneRead','--limitOutSJcollapsed','--limitBAMsortRAM','--limitSjdbInsertNsj','--outFileNamePrefix','--outTmpDir','--outTmpKeep',
                             '--outStd','--outReadsUnmapped','--outQSconversionAdd','--outMultimapperOrder','--outSAMtype','--outSAMmode','--outSAMstrandField','--outSAMattributes','--outSAMattrIHstart','--outSAMunmapped','--outSAMorder',
                             '--outSAMprimaryFlag','--outSAMreadID','--outSAMmapqUnique','--outSAMflagOR','--outSAMflagAND','--outSAMattrRGline','--outSAMheaderHD','--outSAMheaderPG','--outSAMheaderCommentFile','--outSAMfilter','--outSAMmultNmax',
                             '--outBAMcompression','--outBAMsortingThreadN','--bamRemoveDuplicatesType','--bamRemoveDuplicatesMate2basesN','--outWigType','--outWigStrand','--outWigReferencesPrefix','--outWigNorm','--outFilterType',
                             '--outFilterMultimapScoreRange','--outFilterMultimapNmax','--outFilterMismatchNmax','--outFilterMismatchNoverLmax','--outFilterMismatchNoverReadLmax','--outFilterScoreMin','--outFilterScoreMinOverLread',
                             '--outFilterMatchNmin','--outFilterMatchNminOverLread','--outFilterIntronMotifs','--outSJfilterReads','--outSJfilterOverhangMin','--outSJfilterCountUniqueMin','--outSJfilterCountTotalMin','--outSJfilterDistToOtherSJmin',
-                            '--outSJfilterIntronMaxVsReadN','--scoreGap','--scoreGapNoncan','--scoreGapGCAG ','--scoreGapATAC','--scoreGenomicLengthLog2scale','--scoreDelOpen','--scoreDelBase','--scoreInsOpen','--scoreInsBase','--scoreStitchSJshift',
+                            '--outSJfilterIntronMaxVsReadN','--scoreGap','--scoreGapNoncan','--scoreGapGCAG','--scoreGapATAC','--scoreGenomicLengthLog2scale','--scoreDelOpen','--scoreDelBase','--scoreInsOpen','--scoreInsBase','--scoreStitchSJshift',
                             '--seedSearchStartLmax','--seedSearchStartLmaxOverLread','--seedSearchLmax','--seedMultimapNmax','--seedPerReadNmax','--seedPerWindowNmax','--seedNoneLociPerWindow','--alignIntronMin','--alignIntronMax','--alignMatesGapMax',
                             '--alignSJoverhangMin','--alignSJstitchMismatchNmax','--alignSJDBoverhangMin','--alignSplicedMateMapLmin','--alignSplicedMateMapLminOverLmate','--alignWindowsPerReadNmax','--alignTranscriptsPerWindowNmax','--alignTranscriptsPerReadNmax',
                             '--alignEndsType','--alignEndsProtrude','--alignSoftClipAtReferenceEnds','--winAnchorMultimapNmax','--winBinNbits','--winAnchorDistNbins','--winFlankNbins','--winReadCoverageRelativeMin','--winReadCoverageBasesMin',
                             '--chimOutType','--chimSegmentMin','--chimScoreMin','--chimScoreDropMax','--chimScoreSeparation','--chimScoreJunctionNonGTAG','--chimJunctionOverhangMin','--chimSegmentReadGapMax','--chimFilter','--chimMainSegmentMultNmax']
                 
+        #argument to set threads
+        self.threads_args=['--runThreadN']
        
         #initialize the passed arguments
         self.passedArgumentDict=kwargs
@@ -339,7 +425,7 @@ class Star(Aligner):
             
     
     
-    def build_index(self,index_path,*args,verbose=False,quiet=False,logs=True,objectid="NA",**kwargs):
+    def build_index(self,index_path,*args,verbose=False,quiet=False,logs=True,objectid="NA",registry=None,**kwargs):
         """Build a star index with given parameters and saves the new index to self.star_index.
         Parameters
         ----------
@@ -356,6 +442,8 @@ class Star(Aligner):
             Log this command to pyrpipe logs
         objectid: str
             Provide an id to attach with this command e.g. the SRR accession. This is useful for debugging, benchmarking and reports.
+        registry: IndexRegistry
+            If provided, an index built with the same reference files and parameters (including --sjdbGTFfile) is reused from the registry. Otherwise the index is built in the registry and index_path is ignored.
         
         kwargs: dict
             Parameters for the star command
@@ -367,7 +455,16 @@ class Star(Aligner):
             pu.print_boldred("Please provide input fasta file to build STAR index")
             return ""
         
-       
+        #reuse an index built with the same references and parameters
+        if registry is not None:
+            index_dir=registry.get_or_build('STAR',list(args),kwargs,
+                                            lambda path: self.build_index(path,*args,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**kwargs),
+                                            ignore_args=self.threads_args)
+            if not index_dir:
+                return False
+            self.star_index=index_dir
+            self.passedArgumentDict['--genomeDir']=self.star_index
+            return self.check_index()
         
         #create path if doesnt exist
         if not pu.check_paths_exist(index_path):
@@ -380,15 +477,25 @@ class Star(Aligner):
         
         mergedOpts={**kwargs,**newOpts}
         
+        #get threads from the shared core budget
+        mergedOpts,job_id=pr.resourceManagerObject.acquire(self.programName,mergedOpts,self.threads_args,objectid=objectid)
+        
         starbuild_Cmd=['STAR']
         starbuild_Cmd.extend(pu.parse_unix_args(self.valid_args,mergedOpts))
         
+        #mark the index incomplete until the build finishes
+        pu.start_index_manifest(index_path)
+        
         #execute command
-        status=pe.execute_command(starbuild_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(starbuild_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         
         
         if status:
             if pu.check_paths_exist(index_path):
+                pu.write_index_manifest(index_path)
                 #update object's index
                 self.star_index=index_path
                 self.passedArgumentDict['--genomeDir']=self.star_index
@@ -489,13 +596,19 @@ class Star(Aligner):
             
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #get threads from the shared core budget
+        mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid)
        
         star_cmd=['STAR']
         #add options
         star_cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))        
         
         #execute command
-        cmd_status=pe.execute_command(star_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            cmd_status=pe.execute_command(star_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         
         if not cmd_status:
             print("STAR failed:"+" ".join(star_cmd))
@@ -504,9 +617,131 @@ class Star(Aligner):
         return cmd_status
     
     
-    def check_index(self):
+    def run_genome_load(self,mode,out_dir="",verbose=False,quiet=False,logs=True):
+        """Load the STAR index into shared memory or remove it from shared memory.
+        
+        Parameters
+        ----------
+        mode: str
+            value of --genomeLoad. LoadAndExit to load the genome or Remove to remove it from shared memory.
+        out_dir: str
+            directory for the STAR log files. Default: current directory
+        verbose: bool
+            Print stdout and std error
+        quiet: bool
+            Print nothing
+        logs: bool
+            Log this command to pyrpipe logs
+            
+        :return: Returns the status of star. True is passed, False if failed.
+        :rtype: bool
+        """
+        if not self.check_index():
+            raise Exception("ERROR: Invalid star index. Please run build index to generate an index.")
+        
+        if not out_dir:
+            out_dir=os.getcwd()
+        
+        #log index load and removal separately from the alignments
+        command_name="STAR genomeLoad" if mode!="Remove" else "STAR genomeRemove"
+        prefix=os.path.join(out_dir,"STAR_genome"+mode+"_")
+        star_cmd=['STAR','--genomeLoad',mode,'--genomeDir',self.star_index,'--outFileNamePrefix',prefix]
+        cmd_status=pe.execute_command(star_cmd,verbose=verbose,quiet=quiet,logs=logs,command_name=command_name)
+        if not cmd_status:
+            pu.print_boldred("STAR --genomeLoad {} failed".format(mode))
+        return cmd_status
+    
+    
+    def perform_batch_alignment(self,sra_objects,out_suffix="_star",out_dir="",num_jobs=1,verbose=False,quiet=False,logs=True,**kwargs):
+        """Align multiple samples against a single copy of the genome kept in shared memory.
+        The genome is loaded once with --genomeLoad LoadAndExit, each sample is aligned with --genomeLoad LoadAndKeep
+        and the genome is removed from the shared memory at the end, also when an alignment fails or raises an error.
+        
+        Parameters
+        ----------
+        sra_objects: list
+            list of SRA objects to align
+        out_suffix: string
+            Suffix for the output file
+        out_dir: str
+            output directory. Output of each sample is written to out_dir/<SRR_accession>. Default: sra_object.location
+        num_jobs: int
+            number of samples to align at the same time
+        verbose: bool
+            Print stdout and std error
+        quiet: bool
+            Print nothing
+        logs: bool
+            Log this command to pyrpipe logs
+        kwargs: dict
+            Options to pass to star. This will override the existing options in self.passed_args_dict.
+            
+        :return: A dict with SRR accession as key and the path to the output dir as value. Empty string for failed samples.
+        :rtype: dict
+        """
+        
+        #sorted bam needs a fixed sorting memory when the genome is shared
+        mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        if "SortedByCoordinate" in mergedArgsDict.get("--outSAMtype","") and "--limitBAMsortRAM" not in mergedArgsDict:
+            pu.print_boldred("--limitBAMsortRAM is required to output sorted BAM with shared genome. Exiting")
+            return {}
+        
+        if out_dir and not pu.check_paths_exist(out_dir):
+            pu.mkdir(out_dir)
+        
+        #runtimes in seconds for the genome load, each sample and the genome removal
+        self.batch_runtimes={'genomeLoad':0,'alignment':{},'genomeRemove':0}
+        results={}
+        
+        time_start=time.perf_counter()
+        if not self.run_genome_load("LoadAndExit",out_dir=out_dir,verbose=verbose,quiet=quiet,logs=logs):
+            return {}
+        self.batch_runtimes['genomeLoad']=time.perf_counter()-time_start
+        
+        def align(sra_object):
+            sample_dir=""
+            if out_dir:
+                sample_dir=os.path.join(out_dir,sra_object.srr_accession)
+            sample_start=time.perf_counter()
+            result=self.perform_alignment(sra_object,out_suffix=out_suffix,out_dir=sample_dir,verbose=verbose,quiet=quiet,logs=logs,**{**kwargs,"--genomeLoad":"LoadAndKeep"})
+            self.batch_runtimes['alignment'][sra_object.srr_accession]=time.perf_counter()-sample_start
+            return result
+        
+        try:
+            if num_jobs>1:
+                #share cores between the samples running together
+                pr.resourceManagerObject.set_queued_jobs(min(num_jobs,len(sra_objects))-1)
+                with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+                    outputs=list(executor.map(align,sra_objects))
+            else:
+                outputs=[align(sra_object) for sra_object in sra_objects]
+            for sra_object,output in zip(sra_objects,outputs):
+                results[sra_object.srr_accession]=output
+        finally:
+            #always remove the genome from shared memory
+            time_start=time.perf_counter()
+            self.run_genome_load("Remove",out_dir=out_dir,verbose=verbose,quiet=quiet,logs=logs)
+            self.batch_runtimes['genomeRemove']=time.perf_counter()-time_start
+        
+        if not quiet:
+            pu.print_green("Genome load took {:.1f}s; {} samples aligned in {:.1f}s".format(self.batch_runtimes['genomeLoad'],len(results),sum(self.batch_runtimes['alignment'].values())))
+        
+        return results
+    
+    
+    def check_index(self,full_verify=False):
+        """Function to check STAR index using its manifest.
+        
+        Parameters
+        ----------
+        full_verify: bool
+            Verify checksums of all the index files
+        
+        :return: Returns True if index exists and is valid
+        :rtype: bool
+        """
         if hasattr(self,'star_index'):
-            return(pu.check_starindex(self.star_index))
+            return(pu.check_starindex(self.star_index,full_verify))
         else:
             return False
             
@@ -519,17 +754,20 @@ class Bowtie2(Aligner):
        ----------
        bowtie2_index: string
             path to a bowtie2 index. This index will be used when bowtie2 is invoked using this object.
+       share_index: bool
+            memory-map the index (--mm) so that concurrent bowtie2 processes share a single copy of the index.
        **kwargs: dict
             parameters passed to the bowtie2 program. These parameters could be overridden later when running bowtie2.
        Attributes
        ----------
     """ 
-    def __init__(self,bowtie2_index,**kwargs):
+    def __init__(self,bowtie2_index,share_index=False,**kwargs):
         """Bowtie2 constructor. Initialize bowtie2 index and other parameters.
         """       
         
         super().__init__() 
         self.programName="bowtie2"
+        self.share_index=share_index
         self.dep_list=[self.programName]        
         if not pe.check_dependencies(self.dep_list):
             raise Exception("ERROR: "+ self.programName+" not found.")
@@ -548,6 +786,9 @@ class Bowtie2(Aligner):
                             '-p','--threads','--reorder','--mm','--qc-filter','--seed','--non-deterministic',
                             '--version','-h','--help']
         
+        #argument to set threads
+        self.threads_args=['-p','--threads']
+        
         #initialize the passed arguments
         self.passedArgumentDict=kwargs
         
@@ -560,7 +801,7 @@ class Bowtie2(Aligner):
             print("No Bowtie2 index provided. Please build index now to generate an index...")
         
         
-    def build_index(self,index_path,index_name,*args,verbose=False,quiet=False,logs=True,objectid="NA",**kwargs):
+    def build_index(self,index_path,index_name,*args,overwrite=True,verbose=False,quiet=False,logs=True,objectid="NA",registry=None,**kwargs):
         """Build a bowtie2 index with given parameters and saves the new index to self.bowtie2_index.
         Parameters
         ----------
@@ -570,6 +811,8 @@ class Bowtie2(Aligner):
             A name for the index
         arg3: tuple
             Path to reference input files
+        overwrite: bool
+            If False and an index with same name exists, the existing index is used
         verbose: bool
             Print stdout and std error
         quiet: bool
@@ -580,6 +823,8 @@ class Bowtie2(Aligner):
             Provide an id to attach with this command e.g. the SRR accession. This is useful for debugging, benchmarking and reports.
         kwargs: dict
             Options to pass to stringtie. This will override the existing options in self.passed_args_dict (only replace existing arguments and not replace all the arguments).
+        registry: IndexRegistry
+            If provided, an index built with the same reference files and parameters is reused from the registry. Otherwise the index is built in the registry and index_path is ignored.
             
         arg4: dict
             Parameters for the hisat2-build command
@@ -596,8 +841,17 @@ class Bowtie2(Aligner):
         if not pu.check_files_exist(*args):
             pu.print_boldred("Please check input reference sequences provided to bowtie2-build. Exiting")
             return False
-            
-        overwrite=True
+        
+        #reuse an index built with the same references and parameters
+        if registry is not None:
+            index_dir=registry.get_or_build('bowtie2-build',list(args),{**kwargs,'index_name':index_name},
+                                            lambda path: self.build_index(path,index_name,*args,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**kwargs),
+                                            ignore_args=['--threads'])
+            if not index_dir:
+                return False
+            self.bowtie2_index=os.path.join(index_dir,index_name)
+            self.passedArgumentDict['-x']=self.bowtie2_index
+            return self.check_index()
         
         
         bowtie2_build_args=['-f','-c','--large-index','--debug','--sanitized','--verbose','-a',
@@ -614,24 +868,36 @@ class Bowtie2(Aligner):
             #check if files exists
             if pu.check_bowtie2index(os.path.join(index_path,index_name)):
                 print("bowtie2 index with same name already exists. Exiting...")
+                self.bowtie2_index=os.path.join(index_path,index_name)
+                self.passedArgumentDict['-x']=self.bowtie2_index
                 return True
             
+        #get threads from the shared core budget. -p is --packed for bowtie2-build
+        build_args,job_id=pr.resourceManagerObject.acquire('bowtie2-build',kwargs,['--threads'],objectid=objectid)
+            
         bowtie2Build_Cmd=['bowtie2-build']
         #add options
-        bowtie2Build_Cmd.extend(pu.parse_unix_args(bowtie2_build_args,kwargs))
+        bowtie2Build_Cmd.extend(pu.parse_unix_args(bowtie2_build_args,build_args))
         #add input files
         bowtie2Build_Cmd.append(str(",".join(args)))
         #add dir/basenae
         bowtie2Build_Cmd.append(os.path.join(index_path,index_name))
         #print("Executing:"+str(" ".join(hisat2Build_Cmd)))
         
+        #mark the index incomplete until the build finishes
+        pu.start_index_manifest(os.path.join(index_path,index_name))
+        
         #start ececution
-        status=pe.execute_command(bowtie2Build_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(bowtie2Build_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("bowtie2-build failed")
             return False
         
-        #check index files
+        #write manifest and check index files
+        pu.write_index_manifest(os.path.join(index_path,index_name),pu.get_bowtie2index_files(os.path.join(index_path,index_name)))
         if not pu.check_bowtie2index(os.path.join(index_path,index_name)):
             pu.print_boldred("bowtie2-build failed")
             return False
@@ -733,6 +999,13 @@ class Bowtie2(Aligner):
         
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #memory used by the index
+        index=mergedArgsDict.get('-x',self.bowtie2_index)
+        mergedArgsDict,memory,shared_memory=self.get_index_memory(index,pu.get_bowtie2index_files(index),mergedArgsDict)
+        
+        #get threads from the shared core budget
+        mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid,memory=memory,shared_memory=shared_memory)
             
         bowtie2_cmd=['bowtie2']
         bowtie2_cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))
@@ -740,18 +1013,26 @@ class Bowtie2(Aligner):
         #print("Executing:"+" ".join(bowtie2_cmd))
         
         #start ececution
-        status=pe.execute_command(bowtie2_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(bowtie2_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("bowtie2 failed")
         return status
     
     
-    def check_index(self):
+    def check_index(self,full_verify=False):
         """Function to check bowtie index.
         Returns True is index exist on disk.
+        
+        Parameters
+        ----------
+        full_verify: bool
+            Verify checksums of all the index files
         """
         if hasattr(self,'bowtie2_index'):
-            return(pu.check_bowtie2index(self.bowtie2_index))
+            return(pu.check_bowtie2index(self.bowtie2_index,full_verify))
         return False
 
 
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 20:41:37 2026
+
+@author: usingh
+
+Predict runtime and peak memory of programs from previous pyrpipe logs
+"""
+
+import os
+import json
+import glob
+import math
+import heapq
+import numpy as np
+from pyrpipe import pyrpipe_utils as pu
+
+
+class RuntimeModel():
+    """
+    Class to learn a model of runtime and peak memory of each program from pyrpipe logs.
+    Runtime is modelled in log-log space, log(runtime)=a+b*log(input size)+c*log(threads), so that b and c are the
+    scaling exponents with input size and threads. Peak memory is modelled as linear in input size and threads.
+    Only successful commands are used. Terms are dropped if they do not vary in the logs e.g. all commands used the same threads.
+
+    Attributes
+    ----------
+    data: dict
+        program name is the key and a list of (input size, threads, runtime, maxrss) tuples is the value
+    models: dict
+        program name is the key and the fitted model is the value
+    """
+    def __init__(self):
+        self.data={}
+        self.models={}
+
+    def add_logs(self,*args):
+        """Add commands from pyrpipe log files. Input size is taken from the log, or estimated from the files in the command for older logs.
+
+        Parameters
+        ----------
+        args: tuple
+            paths to pyrpipe log files or directories containing them
+
+        :return: number of commands added
+        :rtype: int
+        """
+        num_commands=0
+        for log_file in get_log_files(*args):
+            for record in pu.read_log_records(log_file):
+                try:
+                    if int(record['exitcode'])!=0:
+                        continue
+                except (ValueError,TypeError):
+                    continue
+                program=record.get('commandname',record['cmd'].split(" ")[0])
+                inputsize=record.get('inputsize')
+                if inputsize is None:
+                    inputsize=pu.get_cmd_input_size(record['cmd'])
+                self.data.setdefault(program,[]).append((inputsize,
+                                                         pu.get_cmd_threads(record['cmd']),
+                                                         pu.parse_runtime(record['runtime']),
+                                                         record.get('maxrss')))
+                num_commands+=1
+        return num_commands
+
+    def fit(self):
+        """Fit the runtime and memory model of each program.
+
+        :return: fitted models
+        :rtype: dict
+        """
+        self.models={}
+        for program,rows in self.data.items():
+            sizes=np.array([r[0] for r in rows],dtype=float)
+            threads=np.array([r[1] for r in rows],dtype=float)
+            runtimes=np.array([r[2] for r in rows],dtype=float)
+            maxrss=np.array([r[3] if r[3] is not None else np.nan for r in rows],dtype=float)
+            known_size=sizes>0
+            model={'commands':len(rows),
+                   'median_size':float(np.median(sizes[known_size])) if known_size.any() else 0.0,
+                   'median_threads':float(np.median(threads))}
+            #runtime in log-log space
+            keep=runtimes>0
+            model['runtime']=fit_least_squares({'size':np.log(np.where(known_size,sizes,1)),'threads':np.log(threads)},
+                                               np.log(np.where(keep,runtimes,1)),keep,known_size)
+            #memory is linear
+            keep=~np.isnan(maxrss)
+            model['maxrss']=fit_least_squares({'size':sizes,'threads':threads},np.nan_to_num(maxrss),keep,known_size)
+            self.models[program]=model
+        return self.models
+
+    def predict(self,program,inputs,threads=1):
+        """Predict the runtime and peak memory of a program.
+
+        Parameters
+        ----------
+        program: str
+            name of the program as saved in the logs e.g. hisat2
+        inputs: list or int
+            paths to the input files or the total input size in bytes
+        threads: int
+            number of threads
+
+        :return: dict with runtime in seconds and maxrss in bytes. maxrss is None if memory was not logged. None if the program is not in the model.
+        :rtype: dict
+        """
+        if not self.models:
+            self.fit()
+        if program not in self.models:
+            pu.print_boldred("No logs found for {}".format(program))
+            return None
+        model=self.models[program]
+        size=get_input_size(inputs)
+        if size<=0:
+            size=model['median_size']
+        threads=max(1,int(threads))
+        result={'runtime':None,'maxrss':None}
+        if model['runtime'] is not None:
+            result['runtime']=math.exp(evaluate(model['runtime'],{'size':math.log(max(size,1)),'threads':math.log(threads)}))
+        if model['maxrss'] is not None:
+            result['maxrss']=max(0.0,evaluate(model['maxrss'],{'size':size,'threads':threads}))
+        return result
+
+    def predict_samples(self,samples,programs,threads=1):
+        """Predict runtime and peak memory of each sample processed by a list of programs one after another.
+        The input size of the sample is used for all the programs.
+
+        Parameters
+        ----------
+        samples: list
+            list of (objectid, inputs) tuples e.g. from read_sample_sheet()
+        programs: list
+            programs run for each sample
+        threads: int
+            threads used by each program
+
+        :return: list of dicts with objectid, runtime (seconds) and maxrss (bytes)
+        :rtype: list
+        """
+        result=[]
+        for objectid,inputs in samples:
+            runtime=0.0
+            maxrss=0.0
+            for program in programs:
+                prediction=self.predict(program,inputs,threads)
+                if prediction is None:
+                    continue
+                runtime+=prediction['runtime'] or 0.0
+                maxrss=max(maxrss,prediction['maxrss'] or 0.0)
+            result.append({'objectid':objectid,'inputsize':get_input_size(inputs),'runtime':runtime,'maxrss':maxrss})
+        return result
+
+    def save(self,out_file):
+        """Save the fitted models as json
+        """
+        if not self.models:
+            self.fit()
+        with open(out_file,"w") as f:
+            json.dump(self.models,f,indent=1)
+
+    def load(self,in_file):
+        """Load models saved with save()
+        """
+        with open(in_file) as f:
+            self.models=json.load(f)
+        return self.models
+
+
+def fit_least_squares(features,target,keep,known_size):
+    """Fit target=intercept+sum(coef*feature) with numpy least squares.
+    The size feature is used if the input size is known and varies, the threads feature if threads vary.
+    Features are dropped, threads first, if there are not more rows than coefficients.
+
+    :return: dict with intercept and coefficients. None if there is no data.
+    :rtype: dict
+    """
+    names=[]
+    if (keep&known_size).sum()>0 and np.ptp(features['size'][keep&known_size])>0:
+        names.append('size')
+    if keep.sum()>0 and np.ptp(features['threads'][keep])>0:
+        names.append('threads')
+    while True:
+        rows=keep&known_size if 'size' in names else keep
+        if rows.sum()>len(names) or not names:
+            break
+        names.pop()
+    if rows.sum()==0:
+        return None
+    X=np.column_stack([np.ones(rows.sum())]+[features[n][rows] for n in names])
+    coef=np.linalg.lstsq(X,target[rows],rcond=None)[0]
+    return {'intercept':float(coef[0]),'coef':{n:float(c) for n,c in zip(names,coef[1:])}}
+
+
+def evaluate(fitted,values):
+    """Evaluate a model returned by fit_least_squares()
+    """
+    return fitted['intercept']+sum([c*values[n] for n,c in fitted['coef'].items()])
+
+
+def get_input_size(inputs):
+    """Returns the size in bytes of the inputs.
+
+    Parameters
+    ----------
+    inputs: list or int
+        paths to files or size in bytes
+
+    :return: size in bytes
+    :rtype: int
+    """
+    if isinstance(inputs,(int,float)):
+        return inputs
+    if isinstance(inputs,str):
+        inputs=[inputs]
+    return sum([os.path.getsize(f) for f in inputs if pu.check_files_exist(f)])
+
+
+def get_log_files(*args):
+    """Returns the pyrpipe log files in the given files or directories. ENV logs are skipped.
+    """
+    log_files=[]
+    for path in args:
+        if os.path.isdir(path):
+            log_files.extend(sorted(glob.glob(os.path.join(path,"*_pyrpipe.log"))))
+        elif not path.endswith("ENV.log"):
+            log_files.append(path)
+    return log_files
+
+
+def read_sample_sheet(sample_sheet):
+    """Read a sample sheet. Each line has an objectid and its inputs separated by a tab or comma.
+    Inputs are paths to files or the input size in bytes. Lines starting with # are skipped.
+
+    :return: list of (objectid, inputs) tuples
+    :rtype: list
+    """
+    samples=[]
+    with open(sample_sheet) as f:
+        for line in f:
+            line=line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields=line.replace("\t",",").split(",")
+            inputs=[x.strip() for x in fields[1:] if x.strip()]
+            if len(inputs)==1 and inputs[0].isdigit():
+                inputs=int(inputs[0])
+            samples.append((fields[0].strip(),inputs))
+    return samples
+
+
+def estimate_makespan(runtimes,total_cores,threads=1):
+    """Estimate the time to run jobs on a machine using list scheduling.
+    Jobs are started longest first, each on the slot which becomes free first. A machine has total_cores//threads slots.
+
+    Parameters
+    ----------
+    runtimes: list
+        runtime of each job in seconds
+    total_cores: int
+        cores available
+    threads: int
+        cores used by each job
+
+    :return: A tuple with the makespan in seconds and a list with the (start,end) of each job
+    :rtype: tuple
+    """
+    slots=[0.0]*max(1,int(total_cores)//max(1,int(threads)))
+    heapq.heapify(slots)
+    schedule=[None]*len(runtimes)
+    for i in sorted(range(len(runtimes)),key=lambda i: runtimes[i],reverse=True):
+        start=heapq.heappop(slots)
+        schedule[i]=(start,start+runtimes[i])
+        heapq.heappush(slots,start+runtimes[i])
+    makespan=max([end for start,end in schedule]) if schedule else 0.0
+    return makespan,schedule
@@ -143,7 +143,9 @@ class PyrpipeLogger():
         #get cpu
         cpu=str(cpu_count())+' logical CPU cores'
         
-        envDesc={'now':str(datetime.now().strftime("%y-%m-%d %H:%M:%S")),
+        envDesc={'now':datetime.now().astimezone().isoformat(),
+                 'host':platform.node(),
+                 'session':self.logger_basename,
                  'python':pyver,
                  'os':osInfo,
                  'cpu':cpu,
@@ -151,7 +153,8 @@ class PyrpipeLogger():
                  'sysmodules':str(list(sys.modules.keys()))
                  }
         
-        self.env_logger.debug(json.dumps(envDesc))
+        #the environment is saved once in the snapshot store and referenced by its hash
+        self.env_logger.debug(json.dumps(pu.save_env_snapshot(envDesc,pu.get_env_store_path(self.logs_dir))))
         """Old
         self.env_logger.debug(sesstime)
         self.env_logger.debug(pyver)
@@ -239,9 +242,119 @@ def execute_commandRealtime(cmd):
         raise subprocess.CalledProcessError(return_code, cmd)
 
 
+def communicate_with_usage(process):
+    """Function to read the stdout of a process and wait for it, collecting the resources used by the process.
+    
+    Parameters
+    ----------
+    process: Popen
+        process started with stdout=PIPE and stderr=STDOUT
+
+    :return: A tuple with stdout, cpu time in seconds (user+system) and peak resident memory in bytes. Resources are None if not available.
+    :rtype: tuple
+    """
+    stdout=process.stdout.read()
+    process.stdout.close()
+    try:
+        pid,status,usage=os.wait4(process.pid,0)
+    except (AttributeError,ChildProcessError):
+        #os.wait4 not available
+        process.wait()
+        return stdout,None,None
+    #decode the wait status, negative for commands killed by a signal as in Popen.returncode
+    if os.WIFSIGNALED(status):
+        process.returncode=-os.WTERMSIG(status)
+    else:
+        process.returncode=os.WEXITSTATUS(status)
+    cputime=usage.ru_utime+usage.ru_stime
+    #ru_maxrss is in kilobytes on linux and bytes on macOS
+    maxrss=usage.ru_maxrss if sys.platform=="darwin" else usage.ru_maxrss*1024
+    return stdout,cputime,maxrss
+
+
+def log_running(log_message,start_time,objectid,command_name):
+    """Function to save a command which started running to the pyrpipe log.
+    The line starts with #RUNNING so that it is skipped by readers of finished commands. It is used to follow
+    commands in progress; the finished command is logged with the same cmd and starttime.
+    
+    Parameters
+    ----------
+    log_message: str
+        the command
+    start_time: datetime
+        time when the command started
+    objectid: str
+        id attached with the command
+    command_name: str
+        name of the command
+
+    :return: None
+    """
+    runDict={'cmd':log_message,
+             'starttime':start_time.isoformat(),
+             'objectid':objectid,
+             'commandname':command_name,
+             'pid':os.getpid()
+            }
+    pyrpipeLoggerObject.cmd_logger.debug("#RUNNING "+json.dumps(runDict))
+
+
+def log_command(log_message,exitcode,start_time,runtime,stdout,stderr,objectid,command_name,cputime=None,maxrss=None,inputsize=None,reads=None):
+    """Function to save a command to the pyrpipe log.
+    
+    Parameters
+    ----------
+    log_message: str
+        the command
+    exitcode: int
+        return code of the command
+    start_time: datetime
+        time when the command started
+    runtime: float
+        duration in seconds measured with a monotonic clock
+    stdout: str
+        stdout of the command
+    stderr: str
+        stderr of the command
+    objectid: str
+        id attached with the command
+    command_name: str
+        name of the command
+    cputime: float
+        user and system cpu time in seconds
+    maxrss: int
+        peak resident memory in bytes
+    inputsize: int
+        total size in bytes of the input files of the command
+    reads: int
+        number of reads processed, from the summary printed by the program
+
+    :return: None
+    """
+    logDict={'cmd':log_message,
+             'exitcode':exitcode,
+             'runtime':round(runtime,6),
+             'starttime':start_time.isoformat(),
+             'endtime':(start_time+timedelta(seconds=runtime)).isoformat(),
+             'stdout':stdout,
+             'stderr':stderr,
+             'objectid':objectid,
+             'commandname':command_name,
+             'cputime':round(cputime,6) if cputime is not None else None,
+             'maxrss':maxrss,
+             'inputsize':inputsize,
+             'reads':reads
+            }
+    pyrpipeLoggerObject.cmd_logger.debug(json.dumps(logDict))
+
+
 def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",command_name=""):
     """Function to execute commands using popen. 
     All commands executed by this function can be logged and saved to pyrpipe logs.
+    Start and end of a command are logged as ISO-8601 timestamps and the runtime in seconds is measured with a monotonic clock.
+    A #RUNNING line is logged when the command starts so that commands in progress can be followed.
+    CPU time and peak memory of the command are also logged, together with the size of its input files and the number of reads
+    if the program prints a summary.
     
     Parameters
     ----------
@@ -266,11 +379,17 @@ def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",comman
     log_message=" ".join(cmd)
     if not quiet:
         pu.print_blue("$ "+log_message)
-    time_start = time.time()
-    starttime_str=time.strftime("%y-%m-%d %H:%M:%S", time.localtime(time.time()))
+    #measure inputs before the command creates any output
+    input_size=pu.get_cmd_input_size(log_message) if logs else None
+    start_time=datetime.now().astimezone()
+    time_start=time.perf_counter()
+    if logs:
+        log_running(log_message,start_time,objectid,command_name)
     try:
         result = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-        stdout,stderr = result.communicate()
+        stdout,cputime,maxrss = communicate_with_usage(result)
+        stderr=""
+        timeDiff=time.perf_counter()-time_start
         #convert to string
         if stdout:
             stdout=stdout.decode("utf-8")
@@ -280,8 +399,6 @@ def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",comman
             stderr=stderr.decode("utf-8")
         else:
             stderr=""
-        
-        timeDiff = round(time.time() - time_start) #round to remove microsecond term
     
         if verbose:
             if stdout:
@@ -289,7 +406,7 @@ def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",comman
             if stderr:
                 pu.print_boldred("STDERR:\n"+stderr)
         if not quiet:
-            pu.print_green("Time taken:"+str(timedelta(seconds=timeDiff)))
+            pu.print_green("Time taken:"+str(timedelta(seconds=round(timeDiff,2))))
             
                 
         exitCode=result.returncode
@@ -306,20 +423,11 @@ def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",comman
                           'version':getProgramVersion(parent_command).strip(),
                           'path':getProgramPath(parent_command).strip()
                           }
-                pyrpipeLoggerObject.env_logger.debug(json.dumps(progDesc))
+                pyrpipeLoggerObject.env_logger.debug(json.dumps(pu.save_env_snapshot(progDesc,pu.get_env_store_path(pyrpipeLoggerObject.logs_dir))))
                 pyrpipeLoggerObject.logged_programs.append(command_name)
             
-            #create a dict and dump as json
-            logDict={'cmd':log_message,
-                 'exitcode':exitCode,
-                 'runtime':str(timedelta(seconds=timeDiff)),
-                 'starttime':str(starttime_str),
-                 'stdout':stdout,
-                 'stderr':stderr,
-                 'objectid':objectid,
-                 'commandname':command_name
-                }
-            pyrpipeLoggerObject.cmd_logger.debug(json.dumps(logDict))
+            log_command(log_message,exitCode,start_time,timeDiff,stdout,stderr,objectid,command_name,cputime=cputime,maxrss=maxrss,
+                        inputsize=input_size,reads=pu.get_read_count(stdout))
     
         if exitCode==0:
             return True
@@ -328,47 +436,17 @@ def execute_command(cmd,verbose=False,quiet=False,logs=True,objectid="NA",comman
     except OSError as e:
         pu.print_boldred("OSError exception occured.\n"+str(e))
         #log error
-        timeDiff = round(time.time() - time_start)
-        logDict={'cmd':log_message,
-                 'exitcode':'-1',
-                 'runtime':str(timedelta(seconds=timeDiff)),
-                 'starttime':str(starttime_str),
-                 'stdout':"",
-                 'stderr':"OSError exception occured.\n"+str(e),
-                 'objectid':objectid,
-                 'commandname':command_name                 
-                }
-        pyrpipeLoggerObject.cmd_logger.debug(json.dumps(logDict))
+        log_command(log_message,-1,start_time,time.perf_counter()-time_start,"","OSError exception occured.\n"+str(e),objectid,command_name)
         return False
     except subprocess.CalledProcessError as e:
         pu.print_boldred("CalledProcessError exception occured.\n"+str(e))
         #log error
-        timeDiff = round(time.time() - time_start)
-        logDict={'cmd':log_message,
-                 'exitcode':'-1',
-                 'runtime':str(timedelta(seconds=timeDiff)),
-                 'starttime':str(starttime_str),
-                 'stdout':"",
-                 'stderr':"CalledProcessError exception occured.\n"+str(e),
-                 'objectid':objectid,
-                 'commandname':command_name                 
-                }
-        pyrpipeLoggerObject.cmd_logger.debug(json.dumps(logDict))
+        log_command(log_message,-1,start_time,time.perf_counter()-time_start,"","CalledProcessError exception occured.\n"+str(e),objectid,command_name)
         return False
     except:
         pu.print_boldred("Fatal error occured during execution.\n"+str(sys.exc_info()[0]))
         #log error
-        timeDiff = round(time.time() - time_start)
-        logDict={'cmd':log_message,
-                 'exitcode':'-1',
-                 'runtime':str(timedelta(seconds=timeDiff)),
-                 'starttime':str(starttime_str),
-                 'stdout':"",
-                 'stderr':str("Fatal error occured during execution.\n"+str(sys.exc_info()[0])),
-                 'objectid':objectid,
-                 'commandname':command_name
-                }
-        pyrpipeLoggerObject.cmd_logger.debug(json.dumps(logDict))
+        log_command(log_message,-1,start_time,time.perf_counter()-time_start,"","Fatal error occured during execution.\n"+str(sys.exc_info()[0]),objectid,command_name)
         return False
     
 
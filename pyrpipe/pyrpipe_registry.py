@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:36:08 2026
+
+@author: usingh
+
+Registry to reuse indices built with the same reference files and build parameters
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import fcntl
+from datetime import datetime
+from pyrpipe import pyrpipe_utils as pu
+
+
+class IndexRegistry():
+    """
+    Class to manage a local cache of indices.
+    Each index is identified by a fingerprint of the program, the content of the input reference files (e.g. FASTA/GTF)
+    and the build arguments. If an index with the same fingerprint exists it is returned instead of building a new one.
+    File locks make sure that concurrent processes do not build the same index twice.
+
+    Parameters
+    ----------
+    cache_dir: str
+        directory to store the indices. Default: $PYRPIPE_INDEX_CACHE or ~/.pyrpipe/index_cache
+
+    Attributes
+    ----------
+    entry_file: str
+        name of the file written inside an index directory once the index is complete
+    """
+    def __init__(self,cache_dir=""):
+        if not cache_dir:
+            cache_dir=os.environ.get("PYRPIPE_INDEX_CACHE",os.path.join(os.path.expanduser("~"),".pyrpipe","index_cache"))
+        self.cache_dir=os.path.abspath(cache_dir)
+        self.fingerprints_dir=os.path.join(self.cache_dir,"fingerprints")
+        self.entry_file="pyrpipe_registry.json"
+        for d in [self.cache_dir,self.fingerprints_dir]:
+            if not pu.check_paths_exist(d):
+                os.makedirs(d,exist_ok=True)
+
+    def fingerprint_file(self,file_path):
+        """Returns sha256 of a file's content.
+        The fingerprint is cached using the path, size and modification time of the file so that large references are hashed only once.
+
+        Parameters
+        ----------
+        file_path: str
+            path to the file
+
+        :return: hex digest
+        :rtype: str
+        """
+        file_path=os.path.abspath(file_path)
+        stat=os.stat(file_path)
+        cache_file=os.path.join(self.fingerprints_dir,hashlib.sha256(file_path.encode("utf-8")).hexdigest()+".json")
+        if pu.check_files_exist(cache_file):
+            try:
+                with open(cache_file) as f:
+                    cached=json.load(f)
+                if cached['size']==stat.st_size and cached['mtime']==stat.st_mtime_ns:
+                    return cached['sha256']
+            except (ValueError,KeyError):
+                pass
+
+        sha=hashlib.sha256()
+        with open(file_path,'rb') as f:
+            for chunk in iter(lambda: f.read(8*1024*1024),b''):
+                sha.update(chunk)
+        digest=sha.hexdigest()
+
+        write_json_atomic(cache_file,{'path':file_path,'size':stat.st_size,'mtime':stat.st_mtime_ns,'sha256':digest})
+        return digest
+
+    def get_key(self,program,inputs,build_args,ignore_args=[]):
+        """Returns the fingerprint of an index.
+
+        Parameters
+        ----------
+        program: str
+            name of the program building the index e.g. hisat2-build
+        inputs: list
+            paths to reference files
+        build_args: dict
+            arguments used to build the index. Values which are paths to existing files are replaced by the fingerprint of the file.
+        ignore_args: list
+            arguments which do not change the index e.g. threads
+
+        :return: hex digest
+        :rtype: str
+        """
+        args={}
+        for k,v in build_args.items():
+            if k in ignore_args:
+                continue
+            if isinstance(v,str) and pu.check_files_exist(v):
+                v="file:"+self.fingerprint_file(v)
+            elif isinstance(v,(list,tuple)):
+                v=[str(x) for x in v]
+            else:
+                v=str(v)
+            args[k]=v
+        description={'program':program,
+                     'inputs':[self.fingerprint_file(f) for f in inputs],
+                     'args':args}
+        return hashlib.sha256(json.dumps(description,sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get_index_dir(self,program,key):
+        """Returns the directory of an index in the cache
+        """
+        return os.path.join(self.cache_dir,program.replace(" ","_"),key)
+
+    def lookup(self,program,inputs,build_args,ignore_args=[]):
+        """Returns the directory of an existing index matching the inputs and build arguments.
+
+        :return: path to the index directory. Empty string if no complete index exists.
+        :rtype: str
+        """
+        index_dir=self.get_index_dir(program,self.get_key(program,inputs,build_args,ignore_args))
+        if pu.check_files_exist(os.path.join(index_dir,self.entry_file)):
+            return index_dir
+        return ""
+
+    def get_or_build(self,program,inputs,build_args,build_function,ignore_args=[]):
+        """Returns an existing index or builds a new one in the cache.
+
+        Parameters
+        ----------
+        program: str
+            name of the program building the index e.g. hisat2-build
+        inputs: list
+            paths to reference files
+        build_args: dict
+            arguments used to build the index
+        build_function: function
+            function which takes the index directory as argument, builds the index there and returns True if successful
+        ignore_args: list
+            arguments which do not change the index e.g. threads
+
+        :return: path to the index directory. Empty string if the build failed.
+        :rtype: str
+        """
+        if not pu.check_files_exist(*inputs):
+            pu.print_boldred("Please check input reference files: {}".format(" ".join(inputs)))
+            return ""
+
+        key=self.get_key(program,inputs,build_args,ignore_args)
+        index_dir=self.get_index_dir(program,key)
+        entry=os.path.join(index_dir,self.entry_file)
+        parent_dir=os.path.dirname(index_dir)
+        if not pu.check_paths_exist(parent_dir):
+            os.makedirs(parent_dir,exist_ok=True)
+
+        #only one process builds an index, others wait and reuse it
+        with open(index_dir+".lock","w") as lock:
+            fcntl.flock(lock,fcntl.LOCK_EX)
+            try:
+                if pu.check_files_exist(entry):
+                    pu.print_green("Using {} index from registry: {}".format(program,index_dir))
+                    return index_dir
+
+                #remove a partially built index
+                if pu.check_paths_exist(index_dir):
+                    shutil.rmtree(index_dir)
+                os.makedirs(index_dir)
+
+                if not build_function(index_dir):
+                    pu.print_boldred("Failed to build {} index in registry".format(program))
+                    return ""
+
+                write_json_atomic(entry,{'program':program,
+                                         'key':key,
+                                         'inputs':[os.path.abspath(f) for f in inputs],
+                                         'args':{k:str(v) for k,v in build_args.items()},
+                                         'created':datetime.now().isoformat()})
+                return index_dir
+            finally:
+                fcntl.flock(lock,fcntl.LOCK_UN)
+
+
+def write_json_atomic(out_file,data):
+    """Write a dict as json. The file is written to a temporary file first and then renamed.
+    """
+    temp_file=out_file+".tmp"+str(os.getpid())
+    with open(temp_file,"w") as f:
+        json.dump(data,f)
+    os.replace(temp_file,out_file)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:31 2026
+
+@author: usingh
+
+Classes to share the available cores and memory among the programs executed by pyrpipe
+"""
+
+import os
+import json
+import threading
+import itertools
+from multiprocessing import cpu_count
+from pyrpipe import pyrpipe_utils as pu
+
+
+def get_total_memory():
+    """Returns the physical memory of this machine in bytes.
+
+    :return: memory in bytes. None if it can not be determined.
+    :rtype: int
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE')*os.sysconf('SC_PHYS_PAGES')
+    except (ValueError,OSError,AttributeError):
+        return None
+
+
+def get_threads_config_path():
+    """Returns the path to the threads config written by the thread scaling benchmark.
+
+    :return: $PYRPIPE_THREADS_CONFIG or ~/.pyrpipe/threads.json
+    :rtype: str
+    """
+    return os.environ.get("PYRPIPE_THREADS_CONFIG",os.path.join(os.path.expanduser("~"),".pyrpipe","threads.json"))
+
+
+def load_threads_config(config_file=None):
+    """Read the recommended threads of each program from the threads config.
+
+    Parameters
+    ----------
+    config_file: str
+        path to the config. Default: get_threads_config_path()
+
+    :return: dict with program name as key and threads as value. Empty if the config does not exist.
+    :rtype: dict
+    """
+    if config_file is None:
+        config_file=get_threads_config_path()
+    if not pu.check_files_exist(config_file):
+        return {}
+    try:
+        with open(config_file) as f:
+            config=json.load(f)
+        return {k:max(1,int(v['threads'])) for k,v in config.items()}
+    except (ValueError,KeyError,TypeError):
+        pu.print_boldred("Ignoring invalid threads config: "+config_file)
+        return {}
+
+
+class ResourceManager():
+    """
+    Class to manage the cores used by the programs run via pyrpipe.
+    Every wrapper consults the resource manager before executing a command. If the thread argument of a program
+    was not given by the user, the number of threads is filled in from a core budget shared by all the jobs
+    running in this python process.
+
+    A new job gets an equal share of the cores among the running, queued and new jobs (at most max_jobs of them),
+    and never more than the cores that are not in use. Hence jobs scale down when many jobs run and scale up when
+    only one job remains. A job never gets more threads than the default of its program in the threads config,
+    which is written by the thread scaling benchmark (see pyrpipe.scaling).
+
+    Jobs can also declare the memory they need. A job waits until its memory fits in total_memory. Memory shared
+    between processes e.g. a memory-mapped index is counted once for all the jobs using it.
+
+    Parameters
+    ----------
+    total_cores: int
+        total number of cores available to pyrpipe. Default: all logical cores
+    max_jobs: int
+        maximum number of jobs expected to run at the same time. Default: total_cores
+    min_threads: int
+        minimum number of threads given to a job
+    total_memory: int
+        memory in bytes available to pyrpipe. Default: physical memory of the machine
+    threads_config: str
+        path to the threads config. Default: $PYRPIPE_THREADS_CONFIG or ~/.pyrpipe/threads.json
+
+    Attributes
+    ----------
+    running_jobs: dict
+        jobs currently running. Job id is the key and a dict with program, objectid and threads is the value.
+    queued_jobs: int
+        number of jobs declared using set_queued_jobs() that have not started yet
+    shared_footprints: dict
+        memory shared by the running jobs. The key identifies the shared data e.g. index path and the value is a dict with bytes and number of users.
+    enabled: bool
+        if False thread arguments are not filled in
+    default_threads: dict
+        recommended threads of programs read from the threads config
+    """
+    def __init__(self,total_cores=None,max_jobs=None,min_threads=1,total_memory=None,threads_config=None):
+        if total_cores is None:
+            total_cores=cpu_count()
+        if max_jobs is None:
+            max_jobs=total_cores
+        if total_memory is None:
+            total_memory=get_total_memory()
+        self.total_cores=max(1,int(total_cores))
+        self.max_jobs=max(1,int(max_jobs))
+        self.min_threads=max(1,int(min_threads))
+        self.total_memory=total_memory
+        self.running_jobs={}
+        self.queued_jobs=0
+        self.shared_footprints={}
+        self.warmed_files=set()
+        self.enabled=True
+        self.default_threads=load_threads_config(threads_config)
+        self.lock=threading.Condition()
+        self.warm_lock=threading.Lock()
+        self.job_counter=itertools.count(1)
+
+    def set_queued_jobs(self,num_jobs):
+        """Declare the number of jobs which are about to be started e.g. number of samples to process.
+        Queued jobs are considered when dividing the cores so that the first job does not take all the cores.
+
+        Parameters
+        ----------
+        num_jobs: int
+            number of jobs to be started
+
+        :return: None
+        """
+        with self.lock:
+            self.queued_jobs=max(0,int(num_jobs))
+
+    def get_used_cores(self):
+        """Returns the number of cores used by the running jobs
+
+        :return: number of cores in use
+        :rtype: int
+        """
+        return sum([job['threads'] for job in self.running_jobs.values()])
+
+    def get_used_memory(self):
+        """Returns the memory in bytes used by the running jobs, counting shared memory once
+
+        :return: memory in bytes
+        :rtype: int
+        """
+        private=sum([job['memory'] for job in self.running_jobs.values()])
+        shared=sum([v['bytes'] for v in self.shared_footprints.values()])
+        return private+shared
+
+    def can_admit(self,memory=0,shared_memory=None):
+        """Check if a job needing the given memory can start now.
+        A job is always admitted if no other job is running.
+
+        Parameters
+        ----------
+        memory: int
+            private memory in bytes needed by the job
+        shared_memory: tuple
+            (key,bytes) memory which can be shared with other jobs using the same key
+
+        :return: True if the job can start
+        :rtype: bool
+        """
+        if self.total_memory is None or len(self.running_jobs)==0:
+            return True
+        needed=memory
+        if shared_memory is not None and shared_memory[0] not in self.shared_footprints:
+            needed+=shared_memory[1]
+        return self.get_used_memory()+needed<=self.total_memory
+
+    def get_threads(self,program=None):
+        """Returns the number of threads a new job should use.
+
+        Parameters
+        ----------
+        program: str
+            name of the program. Threads are limited to the default of the program in the threads config.
+
+        :return: number of threads
+        :rtype: int
+        """
+        #jobs sharing the cores, including the new job
+        num_jobs=min(len(self.running_jobs)+1+self.queued_jobs,self.max_jobs)
+        num_jobs=max(num_jobs,len(self.running_jobs)+1)
+        share=self.total_cores//num_jobs
+        free=self.total_cores-self.get_used_cores()
+        threads=min(share,free)
+        if program in self.default_threads:
+            threads=min(threads,self.default_threads[program])
+        return max(self.min_threads,threads)
+
+    def acquire(self,program,args_dict,threads_args,objectid="NA",memory=0,shared_memory=None):
+        """Register a job and fill in its thread argument.
+        If any of the threads_args is already present in args_dict the user's value is kept and only counted
+        against the core budget. If memory is given, waits until the job fits in the memory budget.
+
+        Parameters
+        ----------
+        program: str
+            name of the program
+        args_dict: dict
+            arguments which will be passed to the program
+        threads_args: list
+            thread arguments of the program e.g. ['-p','--threads']. The first one is used to set the threads.
+        objectid: str
+            id attached with the command
+        memory: int
+            private memory in bytes needed by the job
+        shared_memory: tuple
+            (key,bytes) memory which can be shared with other jobs using the same key e.g. (index path, index size)
+
+        :return: A tuple with the arguments (a new dict) and the job id. The job id must be passed to release() after the job finishes.
+        :rtype: tuple
+        """
+        new_args=dict(args_dict)
+        track_memory=memory>0 or shared_memory is not None
+        with self.lock:
+            #wait for memory
+            if track_memory:
+                self.lock.wait_for(lambda: self.can_admit(memory,shared_memory))
+            
+            #the user provided the threads
+            user_threads=None
+            for arg in threads_args:
+                if arg in new_args:
+                    try:
+                        user_threads=int(new_args[arg])
+                    except (ValueError,TypeError):
+                        user_threads=self.min_threads
+                    break
+
+            if user_threads is not None:
+                threads=user_threads
+            elif self.enabled and len(threads_args)>0:
+                threads=self.get_threads(program)
+                new_args[threads_args[0]]=str(threads)
+            elif track_memory:
+                threads=0
+            else:
+                return new_args,None
+
+            job_id=next(self.job_counter)
+            shared_key=None
+            if shared_memory is not None:
+                shared_key=shared_memory[0]
+                if shared_key not in self.shared_footprints:
+                    self.shared_footprints[shared_key]={'bytes':shared_memory[1],'users':0}
+                self.shared_footprints[shared_key]['users']+=1
+            self.running_jobs[job_id]={'program':program,'objectid':objectid,'threads':threads,'memory':memory,'shared':shared_key}
+            if self.queued_jobs>0:
+                self.queued_jobs-=1
+
+        return new_args,job_id
+
+    def release(self,job_id):
+        """Release the cores used by a job
+
+        Parameters
+        ----------
+        job_id: int
+            id returned by acquire()
+
+        :return: None
+        """
+        if job_id is None:
+            return
+        with self.lock:
+            job=self.running_jobs.pop(job_id,None)
+            if job is not None and job['shared'] is not None:
+                self.shared_footprints[job['shared']]['users']-=1
+                if self.shared_footprints[job['shared']]['users']<1:
+                    del self.shared_footprints[job['shared']]
+            self.lock.notify_all()
+
+    def prewarm(self,*args):
+        """Read files into the page cache once per process, e.g. index files which are memory-mapped by several processes.
+        Files already read by this resource manager are skipped.
+
+        Parameters
+        ----------
+        args: tuple
+            paths of files to read
+
+        :return: number of bytes read
+        :rtype: int
+        """
+        with self.warm_lock:
+            to_read=[f for f in args if f not in self.warmed_files]
+            bytes_read=pu.warm_page_cache(*to_read)
+            self.warmed_files.update(to_read)
+        return bytes_read
+
+
+###create resource manager shared by all wrappers
+resourceManagerObject=ResourceManager()
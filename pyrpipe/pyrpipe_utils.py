@@ -7,8 +7,28 @@ Created on Mon Oct 21 12:04:28 2019
 """
 
 import os
+import glob
+import gzip
+import re
+import json
+import zlib
+import hashlib
 import datetime as dt
 
+#extensions of files counted as input of a command
+input_extensions=['.fastq','.fq','.fastq.gz','.fq.gz','.fastq.bz2','.fq.bz2','.fasta','.fa','.fasta.gz','.fa.gz','.sra','.bam','.cram','.sam']
+#arguments used by programs to set threads
+thread_args=['-p','--threads','-@','--runThreadN','--CPU','-t','--num-threads','--cores']
+#summaries with the number of reads processed by a program
+read_count_patterns=[re.compile(r'^\s*([\d,]+) reads; of these:',re.M),
+                     re.compile(r'^Input:\s+([\d,]+) reads',re.M),
+                     re.compile(r'processed ([\d,]+) reads'),
+                     re.compile(r'^reads read\s*:\s*([\d,]+)',re.M)]
+#arguments which take output files
+output_args=['-o','-S','-O','--out','--output','--outFileNamePrefix','--un','--al','--un-conc','--al-conc','--un-gz','--output-dir',
+             'out=','out1=','out2=','outm=','outm1=','outm2=','outu=','outu1=','outu2=']
+#fields of the ENV log which change with each session and are not saved in environment snapshots
+env_session_keys=['now','host','session','name']
 
 
 
@@ -123,6 +143,57 @@ def get_time_stamp(shorten=False):
     return timestamp
     
 
+def parse_runtime(runtime):
+    """Function to convert a runtime saved in pyrpipe logs to seconds.
+    Runtimes are saved as seconds; older logs save them as strings e.g. 1:02:03 or 2 days, 1:02:03
+    Parameters
+    ----------
+    runtime: float or str
+        runtime from the log
+
+    :return: runtime in seconds
+    :rtype: float
+    """
+    try:
+        return float(runtime)
+    except ValueError:
+        pass
+    days=0
+    if "day" in runtime:
+        day_str,runtime=runtime.split(",")
+        days=int(day_str.split()[0])
+    hours,minutes,seconds=runtime.strip().split(":")
+    return days*86400+int(hours)*3600+int(minutes)*60+float(seconds)
+
+def parse_timestamp(timestamp):
+    """Function to convert a timestamp saved in pyrpipe logs to datetime.
+    Timestamps are saved in ISO-8601 format; older logs use yy-mm-dd HH:MM:SS
+    Parameters
+    ----------
+    timestamp: str
+        timestamp from the log
+
+    :return: the timestamp
+    :rtype: datetime
+    """
+    try:
+        return dt.datetime.fromisoformat(timestamp)
+    except ValueError:
+        return dt.datetime.strptime(timestamp,"%y-%m-%d %H:%M:%S")
+
+def parse_timestamp_utc(timestamp):
+    """Function to convert a timestamp saved in pyrpipe logs to datetime in UTC.
+    Timestamps without UTC offset e.g. yy-mm-dd HH:MM:SS in older logs are in local time.
+    Parameters
+    ----------
+    timestamp: str
+        timestamp from the log
+
+    :return: the timestamp in UTC
+    :rtype: datetime
+    """
+    return parse_timestamp(timestamp).astimezone(dt.timezone.utc)
+
 def get_sra_ftppath(srrid):
     """Return an ftp address to download sra files
     """
@@ -177,43 +248,178 @@ def check_files_exist(*args):
         return False
     return True
 
-def check_hisatindex(index):
+def get_index_manifest(index):
+    """Function to get the path to the manifest file of an index.
+    The manifest of an index directory (STAR, salmon) is stored inside the directory and the manifest of an
+    index prefix (hisat2, bowtie2) or an index file (kallisto) is stored as <index>.manifest.json
+    Parameters
+    ----------
+    index: str
+        Path to the index
+
+    :return: path to the manifest file
+    :rtype: str
+    """
+    if os.path.isdir(index):
+        return os.path.join(index,"pyrpipe_index_manifest.json")
+    return index+".manifest.json"
+
+def get_crc32(file_path,chunk_size=8*1024*1024):
+    """Function to compute CRC32 checksum of a file.
+    Parameters
+    ----------
+    file_path: str
+        Path to the file
+
+    :return: checksum as hex string
+    :rtype: str
+    """
+    crc=0
+    with open(file_path,'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size),b''):
+            crc=zlib.crc32(chunk,crc)
+    return "{:08x}".format(crc)
+
+def start_index_manifest(index):
+    """Function to mark an index as incomplete before it is built.
+    If the build crashes the index fails validation until it is built again.
+    Parameters
+    ----------
+    index: str
+        Path to the index
+
+    :return: None
+    """
+    manifest_file=get_index_manifest(index)
+    with open(manifest_file,'w') as f:
+        json.dump({'complete':False,'files':[]},f)
+
+def write_index_manifest(index,files=None):
+    """Function to write a manifest with names, sizes and CRC32 checksums of the index files.
+    Parameters
+    ----------
+    index: str
+        Path to the index
+    files: list
+        Paths to the index files. Default: all the files inside the index directory
+
+    :return: path to the manifest file
+    :rtype: str
+    """
+    manifest_file=get_index_manifest(index)
+    if os.path.isdir(index):
+        base_dir=index
+        if files is None:
+            files=[os.path.join(root,f) for root,dirs,names in os.walk(index) for f in names]
+    else:
+        base_dir=os.path.dirname(index)
+        if files is None:
+            files=[index]
+    entries=[]
+    for f in sorted(files):
+        if os.path.abspath(f)==os.path.abspath(manifest_file):
+            continue
+        entries.append({'name':os.path.relpath(f,base_dir or "."),'size':os.path.getsize(f),'crc32':get_crc32(f)})
+    temp_file=manifest_file+".tmp"
+    with open(temp_file,'w') as f:
+        json.dump({'complete':True,'files':entries},f,indent=1)
+    os.replace(temp_file,manifest_file)
+    return manifest_file
+
+def check_index_manifest(index,full_verify=False):
+    """Function to validate an index using its manifest.
+    By default only the sizes of the files are checked. With full_verify the CRC32 checksums are also checked.
+    Parameters
+    ----------
+    index: str
+        Path to the index
+    full_verify: bool
+        Verify checksums of all the index files
+
+    :return: Return true if index is valid
+    :rtype: bool
+    """
+    manifest_file=get_index_manifest(index)
+    try:
+        with open(manifest_file) as f:
+            manifest=json.load(f)
+    except (OSError,ValueError):
+        return False
+    if not manifest.get('complete',False) or len(manifest.get('files',[]))<1:
+        return False
+    base_dir=index if os.path.isdir(index) else os.path.dirname(index)
+    for entry in manifest['files']:
+        file_path=os.path.join(base_dir,entry['name'])
+        try:
+            if os.stat(file_path).st_size!=entry['size']:
+                return False
+        except OSError:
+            return False
+        if full_verify and get_crc32(file_path)!=entry['crc32']:
+            return False
+    return True
+
+def check_hisatindex(index,full_verify=False):
     """Function to check if hisat2 index is valid and exists.
     Parameters
     ----------
     index: str
         Path to the index 
+    full_verify: bool
+        Verify checksums of the index files if a manifest exists
 
     :return: Return true if index is valid
     :rtype: bool
     """
+    if check_files_exist(get_index_manifest(index)):
+        return check_index_manifest(index,full_verify)
     return check_files_exist(index+".1.ht2")
 
-def check_salmonindex(index):
+def get_hisatindex_files(index):
+    """Function to list the files of a hisat2 index.
+    Parameters
+    ----------
+    index: str
+        Path to the index
+
+    :return: paths to the .ht2 or .ht2l files of the index
+    :rtype: list
+    """
+    return sorted(glob.glob(glob.escape(index)+".*.ht2")+glob.glob(glob.escape(index)+".*.ht2l"))
+
+def check_salmonindex(index,full_verify=False):
     """Function to check if salmon index is valid and exists.
     Parameters
     ----------
     index: str
         Path to the index 
+    full_verify: bool
+        Verify checksums of the index files if a manifest exists
 
     :return: Return true if index is valid
     :rtype: bool
     """
     if not check_paths_exist(index):
         return False
+    if check_files_exist(get_index_manifest(index)):
+        return check_index_manifest(index,full_verify)
     return True
 
-def check_starindex(index):
+def check_starindex(index,full_verify=False):
     """Function to check if star index is valid and exists.
     Parameters
     ----------
     index: str
         Path to the index 
+    full_verify: bool
+        Verify checksums of the index files if a manifest exists
 
     :return: Return true if index is valid
     :rtype: bool
     """
     if check_paths_exist(index):
+        if check_files_exist(get_index_manifest(index)):
+            return check_index_manifest(index,full_verify)
         files_to_check=['chrLength.txt',
                       'chrNameLength.txt',
                       'chrName.txt',
@@ -227,17 +433,51 @@ def check_starindex(index):
     
     return False
 
-def check_bowtie2index(index):
+def check_bowtie2index(index,full_verify=False):
     """Function to check if bowtie2 index is valid and exists.
     Parameters
     ----------
     index: str
         Path to the index 
+    full_verify: bool
+        Verify checksums of the index files if a manifest exists
 
     :return: Return true if index is valid
     :rtype: bool
     """
+    if check_files_exist(get_index_manifest(index)):
+        return check_index_manifest(index,full_verify)
     return check_files_exist(index+".1.bt2")
+
+def get_bowtie2index_files(index):
+    """Function to list the files of a bowtie2 index.
+    Parameters
+    ----------
+    index: str
+        Path to the index
+
+    :return: paths to the .bt2 or .bt2l files of the index
+    :rtype: list
+    """
+    return sorted(glob.glob(glob.escape(index)+".*.bt2")+glob.glob(glob.escape(index)+".*.bt2l"))
+
+def check_kallistoindex(index,full_verify=False):
+    """Function to check if kallisto index is valid and exists.
+    Parameters
+    ----------
+    index: str
+        Path to the index 
+    full_verify: bool
+        Verify checksum of the index file if a manifest exists
+
+    :return: Return true if index is valid
+    :rtype: bool
+    """
+    if not check_files_exist(index):
+        return False
+    if check_files_exist(get_index_manifest(index)):
+        return check_index_manifest(index,full_verify)
+    return True
     
 
 def byte_to_readable(size_bytes):
@@ -273,6 +513,269 @@ def get_file_size(file_path):
         return byte_to_readable(file_info.st_size)
     
 
+def get_total_size(*args):
+    """Returns total size of files in bytes
+    Parameters
+    ----------
+    args: tuple
+        paths to files. Missing files are ignored.
+
+    :return: total size in bytes
+    :rtype: int
+    """
+    total=0
+    for file_path in args:
+        if check_files_exist(file_path):
+            total+=os.stat(file_path).st_size
+    return total
+
+def warm_page_cache(*args,chunk_size=8*1024*1024):
+    """Read files so that their content is kept in the page cache of the OS.
+    Parameters
+    ----------
+    args: tuple
+        paths to files
+    chunk_size: int
+        bytes to read at a time
+
+    :return: number of bytes read
+    :rtype: int
+    """
+    bytes_read=0
+    buffer=bytearray(chunk_size)
+    for file_path in args:
+        if not check_files_exist(file_path):
+            continue
+        with open(file_path,'rb',buffering=0) as f:
+            if hasattr(os,'posix_fadvise'):
+                os.posix_fadvise(f.fileno(),0,0,os.POSIX_FADV_WILLNEED)
+            while True:
+                n=f.readinto(buffer)
+                if not n:
+                    break
+                bytes_read+=n
+    return bytes_read
+
+def open_log(log_file):
+    """Function to open a pyrpipe log for reading as text. Files ending with .gz are opened with gzip.
+    """
+    if log_file.endswith(".gz"):
+        return gzip.open(log_file,'rt')
+    return open(log_file)
+
+def read_log_records(log_file):
+    """Generator to read the commands saved in a pyrpipe log one at a time.
+    The log is streamed line by line; lines starting with # are skipped. Logs compressed with gzip (.gz) are read directly.
+    Parameters
+    ----------
+    log_file: str
+        Path to the pyrpipe log
+
+    :return: yields a dict for each logged command
+    :rtype: dict
+    """
+    with open_log(log_file) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            yield json.loads(line)
+
+def parse_env_log(env_log):
+    """Function to read the ENV log saved by pyrpipe.
+    Parameters
+    ----------
+    env_log: str
+        Path to the ENV log
+
+    :return: A tuple with a dict containing the system information and a dict with program names as keys and program information as values
+    :rtype: tuple
+    """
+    sys_info={}
+    programs={}
+    #snapshots are saved next to the logs unless $PYRPIPE_ENV_STORE is set
+    log_dir=os.path.dirname(os.path.abspath(env_log))
+    store_dir=os.path.join(log_dir,"env_snapshots")
+    if not check_paths_exist(store_dir):
+        store_dir=get_env_store_path(log_dir)
+    with open(env_log) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            if not sys_info:
+                sys_info=resolve_env_snapshot(json.loads(line),store_dir)
+            else:
+                this_program=resolve_env_snapshot(json.loads(line),store_dir)
+                programs[this_program['name']]=this_program
+    return sys_info,programs
+
+def get_env_store_path(logs_dir=None):
+    """Returns the directory where environment snapshots are saved.
+    The store is kept next to the logs so that it is copied, archived or merged together with them.
+    Parameters
+    ----------
+    logs_dir: str
+        directory of the logs. Default: pyrpipe_logs in the current directory
+
+    :return: $PYRPIPE_ENV_STORE or env_snapshots in logs_dir. Empty if $PYRPIPE_ENV_STORE is set to empty, to save environments in the ENV log.
+    :rtype: str
+    """
+    if logs_dir is None:
+        logs_dir=os.path.join(os.getcwd(),"pyrpipe_logs")
+    return os.environ.get("PYRPIPE_ENV_STORE",os.path.join(logs_dir,"env_snapshots"))
+
+def get_env_hash(env_desc):
+    """Returns the sha256 hash of an environment description, ignoring the fields in env_session_keys.
+    Two sessions ran in the same environment if their hashes are equal.
+    Parameters
+    ----------
+    env_desc: dict
+        environment description from the ENV log
+
+    :return: hash as a hex string. The snapshot reference if env_desc has one.
+    :rtype: str
+    """
+    if 'snapshot' in env_desc:
+        return env_desc['snapshot']
+    content={k:v for k,v in env_desc.items() if k not in env_session_keys and k!='snapshot'}
+    return hashlib.sha256(json.dumps(content,sort_keys=True).encode("utf-8")).hexdigest()
+
+def save_env_snapshot(env_desc,store_dir=None):
+    """Save an environment description in the snapshot store as <hash>.json. Snapshots already in the store are not written again.
+    Parameters
+    ----------
+    env_desc: dict
+        environment description
+    store_dir: str
+        path to the snapshot store. Default: get_env_store_path()
+
+    :return: A dict with the fields in env_session_keys and the snapshot reference (hash), to save in the ENV log instead of env_desc.
+        env_desc is returned if the store is disabled or can not be written.
+    :rtype: dict
+    """
+    if store_dir is None:
+        store_dir=get_env_store_path()
+    if not store_dir:
+        return env_desc
+    env_hash=get_env_hash(env_desc)
+    snapshot_file=os.path.join(store_dir,env_hash+".json")
+    try:
+        if not check_files_exist(snapshot_file):
+            os.makedirs(store_dir,exist_ok=True)
+            temp_file=snapshot_file+".tmp"+str(os.getpid())
+            with open(temp_file,"w") as f:
+                json.dump({k:v for k,v in env_desc.items() if k not in env_session_keys},f)
+            os.replace(temp_file,snapshot_file)
+    except OSError as e:
+        print_boldred("Can not save environment snapshot to {}: {}".format(store_dir,e))
+        return env_desc
+    reference={k:v for k,v in env_desc.items() if k in env_session_keys}
+    reference['snapshot']=env_hash
+    return reference
+
+def resolve_env_snapshot(env_desc,store_dir=None):
+    """Replace a snapshot reference saved in the ENV log with the environment description in the snapshot store.
+    Descriptions without a reference (older logs) are returned unchanged.
+    Parameters
+    ----------
+    env_desc: dict
+        a line of the ENV log
+    store_dir: str
+        path to the snapshot store. Default: get_env_store_path()
+
+    :return: environment description with the snapshot reference
+    :rtype: dict
+    """
+    if 'snapshot' not in env_desc:
+        return env_desc
+    #full description saved with its hash e.g. in a merged ENV log
+    if set(env_desc.keys())-set(env_session_keys)-{'snapshot'}:
+        return env_desc
+    if store_dir is None:
+        store_dir=get_env_store_path()
+    snapshot_file=os.path.join(store_dir,env_desc['snapshot']+".json")
+    if not check_files_exist(snapshot_file):
+        print_boldred("Environment snapshot {} not found in {}".format(env_desc['snapshot'],store_dir))
+        return env_desc
+    with open(snapshot_file) as f:
+        snapshot=json.load(f)
+    return {**snapshot,**env_desc}
+
+def get_cmd_input_size(cmd,extensions=input_extensions,output_args=output_args):
+    """Function to estimate the input size of a command from the files in its arguments.
+    Files with sequence or alignment extensions e.g. .fastq, .sra or .bam are counted except the ones passed to output arguments e.g. -o, -S.
+    Parameters
+    ----------
+    cmd: str
+        the command
+    extensions: list
+        extensions of input files
+    output_args: list
+        arguments which take output files
+
+    :return: total size in bytes of the input files found
+    :rtype: int
+    """
+    total=0
+    tokens=cmd.split(" ")
+    for i in range(len(tokens)):
+        if i>0 and tokens[i-1] in output_args:
+            continue
+        token=tokens[i]
+        #key=value arguments e.g. in=reads.fq for bbduk
+        if "=" in token:
+            key,token=token.split("=",1)
+            if key+"=" in output_args:
+                continue
+        for f in token.split(","):
+            if f.endswith(tuple(extensions)) and os.path.isfile(f):
+                total+=os.path.getsize(f)
+    return total
+
+def get_cmd_threads(cmd):
+    """Function to get the number of threads used by a command from its thread argument e.g. -p 8, --runThreadN 8, -@ 8, threads=8.
+    Parameters
+    ----------
+    cmd: str
+        the command
+
+    :return: number of threads. 1 if no thread argument is found.
+    :rtype: int
+    """
+    tokens=cmd.split(" ")
+    for i in range(len(tokens)):
+        if tokens[i].startswith("threads="):
+            try:
+                return max(1,int(tokens[i].split("=")[1]))
+            except ValueError:
+                continue
+        if tokens[i] in thread_args and i+1<len(tokens):
+            #flags like hisat2 -t or bowtie2-build -p have no value
+            try:
+                return max(1,int(tokens[i+1]))
+            except ValueError:
+                continue
+    return 1
+
+def get_read_count(stdout):
+    """Function to get the number of reads processed by a command from the summary printed by the program.
+    Summaries of hisat2/bowtie2 ("N reads; of these:"), bbduk ("Input: N reads"), kallisto ("processed N reads") and
+    fasterq-dump ("reads read : N") are recognized.
+    Parameters
+    ----------
+    stdout: str
+        stdout of the command
+
+    :return: number of reads. None if no summary is found.
+    :rtype: int
+    """
+    if not stdout:
+        return None
+    for pattern in read_count_patterns:
+        match=pattern.search(stdout)
+        if match:
+            return int(match.group(1).replace(",",""))
+    return None
+
 #TODO: override in case of empty list
 def parse_java_args(valid_args_list,passed_args):
     """
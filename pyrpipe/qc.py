@@ -8,6 +8,7 @@ Created on Mon Nov 25 17:48:00 2019
 
 from pyrpipe import pyrpipe_utils as pu
 from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
 import os
 
 class RNASeqQC:
@@ -209,6 +210,9 @@ class BBmap(RNASeqQC):
                             'entropyk','minbasefrequency','entropytrim','entropymask','entropymark','cardinality',
                             'cardinalityout','loglogk','loglogbuckets','-Xmx','-eoom','-da']
         
+        #argument to set threads
+        self.threads_args=['threads']
+        
         self.passedArgumentDict=kwargs
             
             
@@ -286,6 +290,9 @@ class BBmap(RNASeqQC):
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
         
+        #get threads from the shared core budget
+        mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid)
+        
         #create command to run
         bbduk_cmd=["bbduk.sh"]
         
@@ -294,7 +301,10 @@ class BBmap(RNASeqQC):
         
         
         #start ececution
-        status=pe.execute_command(bbduk_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(bbduk_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("bbduk failed")
         #return status
@@ -416,12 +426,15 @@ class BBmap(RNASeqQC):
         bbsplit_args=['ref','ref_x','build','path','in','in1','in2','outu','outu2','outu1','qin','interleaved',
                           'maxindel','minratio','minhits','ambiguous','ambiguous2',
                           'qtrim','untrim','out_','basename','bs','scafstats',
-                          'refstats','nzo','-Xmx','-eoom','-da']
+                          'refstats','nzo','threads','-Xmx','-eoom','-da']
         
         #override existing arguments
         #don't use class arguments
         mergedArgsDict={**kwargs}
         
+        #get threads from the shared core budget
+        mergedArgsDict,job_id=pr.resourceManagerObject.acquire('bbsplit.sh',mergedArgsDict,self.threads_args,objectid=objectid)
+        
         #create command to run
         bbsp_cmd=["bbsplit.sh"]
         
@@ -430,7 +443,10 @@ class BBmap(RNASeqQC):
         
         
         #start ececution
-        status=pe.execute_command(bbsp_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(bbsp_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("bbsplit failed")
         #return status
@@ -8,6 +8,7 @@ Created on Thu Jan  2 18:20:41 2020
 
 from pyrpipe import pyrpipe_utils as pu
 from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
 import os
 
 class Quant:
@@ -23,7 +24,7 @@ class Quant:
         """
         pass
     
-    def check_index(self):
+    def check_index(self,full_verify=False):
         """Function to check if index of this object is valid and exists
         """
     
@@ -59,18 +60,22 @@ class Kallisto(Quant):
         
         self.valid_args=pu.get_union(self.validArgsIndex,self.validArgsQuant,self.validArgsPseudo,self.validArgsh5dump)
         
+        #argument to set threads and the subcommands which accept it
+        self.threads_args=['-t','--threads']
+        self.threaded_subcommands=['quant','pseudo']
+        
         #initialize the passed arguments
         self.passedArgumentDict=kwargs
         
         #if index is passed, update the passed arguments
-        if len(kallisto_index)>0 and pu.check_files_exist(kallisto_index):
+        if len(kallisto_index)>0 and pu.check_kallistoindex(kallisto_index):
             print("kallisto index is: "+kallisto_index)
             self.kallisto_index=kallisto_index
             self.passedArgumentDict['-i']=self.kallisto_index
         else:
             print("No kallisto index provided. Please use build_index() now to generate an index...")
             
-    def build_index(self,index_path,index_name,fasta,verbose=False,quiet=False,logs=True,objectid="NA",**kwargs):
+    def build_index(self,index_path,index_name,fasta,verbose=False,quiet=False,logs=True,objectid="NA",registry=None,**kwargs):
         """Function to  build kallisto index
         index_path: str
             path to the output directory
@@ -84,6 +89,8 @@ class Kallisto(Quant):
             Log this command to pyrpipe logs
         objectid: str
             Provide an id to attach with this command e.g. the SRR accession. This is useful for debugging, benchmarking and reports.
+        registry: IndexRegistry
+            If provided, an index built with the same fasta and parameters is reused from the registry. Otherwise the index is built in the registry and index_path is ignored.
         kwargs: dict
             Options to pass to kallisto. This will override the existing options in self.passed_args_dict (only replace existing arguments and not replace all the arguments).
         """
@@ -93,6 +100,17 @@ class Kallisto(Quant):
             pu.print_boldred("{} does not exist. Exiting".format(fasta))
             return False
         
+        #reuse an index built with the same fasta and parameters
+        if registry is not None:
+            index_dir=registry.get_or_build('kallisto index',[fasta],{**kwargs,'index_name':index_name},
+                                            lambda path: self.build_index(path,index_name,fasta,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**kwargs),
+                                            ignore_args=self.threads_args)
+            if not index_dir:
+                return False
+            self.kallisto_index=os.path.join(index_dir,index_name)
+            self.passedArgumentDict['-i']=self.kallisto_index
+            return self.check_index()
+        
         #create out dir
         if not pu.check_paths_exist(index_path):
             if not pu.mkdir(index_path):
@@ -103,12 +121,16 @@ class Kallisto(Quant):
         newOpts={"--":(fasta,),"-i":indexOut}
         mergedOpts={**kwargs,**newOpts}
         
-        #call salmon
+        #mark the index incomplete until the build finishes
+        pu.start_index_manifest(indexOut)
+        
+        #call kallisto
         status=self.run_kallisto("index",verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**mergedOpts)
         
         if status:
             #check if sam file is present in the location directory of sra_object
             if pu.check_files_exist(indexOut):
+                pu.write_index_manifest(indexOut)
                 self.kallisto_index=indexOut
                 self.passedArgumentDict['-i']=self.kallisto_index
                 pu.print_green("kallisto_index is:"+self.kallisto_index)
@@ -196,21 +218,34 @@ class Kallisto(Quant):
         
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #get threads from the shared core budget
+        job_id=None
+        if subcommand in self.threaded_subcommands:
+            mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid)
             
         kallisto_Cmd=['kallisto',subcommand]
         kallisto_Cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))
         
         #start ececution
-        status=pe.execute_command(kallisto_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,command_name=" ".join(kallisto_Cmd[0:2]))
+        try:
+            status=pe.execute_command(kallisto_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,command_name=" ".join(kallisto_Cmd[0:2]))
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pe.print_boldred("kallisto failed")
         return status       
     
-    def check_index(self):
+    def check_index(self,full_verify=False):
         """Check valid kallisto index
+        
+        Parameters
+        ----------
+        full_verify: bool
+            Verify checksum of the index file
         """
         if hasattr(self,'kallisto_index'):
-            return(pu.check_files_exist(self.kallisto_index))
+            return(pu.check_kallistoindex(self.kallisto_index,full_verify))
         return False
             
 
@@ -261,11 +296,15 @@ class Salmon(Quant):
 
         self.valid_args=pu.get_union(self.validArgsIndex,self.validArgsQuantReads,self.validArgsQuantAlign,self.validArgsQuantMerge)
         
+        #argument to set threads and the subcommands which accept it
+        self.threads_args=['-p','--threads']
+        self.threaded_subcommands=['index','quant']
+        
         #initialize the passed arguments
         self.passedArgumentDict=kwargs
         
         #if index is passed, update the passed arguments
-        if len(salmon_index)>0 and pu.check_salmon_index(salmon_index):
+        if len(salmon_index)>0 and pu.check_salmonindex(salmon_index):
             print("salmon index is: "+salmon_index)
             self.salmon_index=salmon_index
             self.passedArgumentDict['-i']=self.salmon_index
@@ -274,7 +313,7 @@ class Salmon(Quant):
             
             
             
-    def build_index(self,index_path,index_name,fasta,verbose=False,quiet=False,logs=True,objectid="NA",**kwargs):
+    def build_index(self,index_path,index_name,fasta,verbose=False,quiet=False,logs=True,objectid="NA",registry=None,**kwargs):
         """
         build salmon index
         
@@ -290,6 +329,8 @@ class Salmon(Quant):
             Log this command to pyrpipe logs
         objectid: str
             Provide an id to attach with this command e.g. the SRR accession. This is useful for debugging, benchmarking and reports.
+        registry: IndexRegistry
+            If provided, an index built with the same fasta and parameters is reused from the registry. Otherwise the index is built in the registry and index_path is ignored.
         kwargs: dict
             Options to pass to kallisto. This will override the existing options
         """
@@ -298,6 +339,17 @@ class Salmon(Quant):
         if not pu.check_files_exist(fasta):
             pu.print_boldred("{} does not exist. Exiting".format(fasta))
             return False
+        
+        #reuse an index built with the same fasta and parameters
+        if registry is not None:
+            index_dir=registry.get_or_build('salmon index',[fasta],{**kwargs,'index_name':index_name},
+                                            lambda path: self.build_index(path,index_name,fasta,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**kwargs),
+                                            ignore_args=self.threads_args)
+            if not index_dir:
+                return False
+            self.salmon_index=os.path.join(index_dir,index_name)
+            self.passedArgumentDict['-i']=self.salmon_index
+            return self.check_index()
         #create out dir
         if not pu.check_paths_exist(index_path):
             if not pu.mkdir(index_path):
@@ -307,6 +359,11 @@ class Salmon(Quant):
         newOpts={"-t":fasta,"-i":indexOut}
         mergedOpts={**kwargs,**newOpts}
         
+        #mark the index incomplete until the build finishes
+        if not pu.check_paths_exist(indexOut):
+            pu.mkdir(indexOut)
+        pu.start_index_manifest(indexOut)
+        
         #call salmon
         status=self.run_salmon("index",verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,**mergedOpts)
         
@@ -314,6 +371,7 @@ class Salmon(Quant):
             #check if sam file is present in the location directory of sra_object
             #if check_files_exist(os.path.join(indexOut,"versionInfo.json")): #not sure if this is reliable
             if pu.check_paths_exist(indexOut):
+                pu.write_index_manifest(indexOut)
                 self.salmon_index=indexOut
                 self.passedArgumentDict['-i']=self.salmon_index
                 pu.print_green("salmon index is:"+self.salmon_index)
@@ -399,19 +457,34 @@ class Salmon(Quant):
         
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #get threads from the shared core budget
+        job_id=None
+        if subcommand in self.threaded_subcommands:
+            mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid)
             
         salmon_Cmd=['salmon',subcommand]
         salmon_Cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))
         
         #start ececution
-        status=pe.execute_command(salmon_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,command_name=" ".join(salmon_Cmd[0:2]))
+        try:
+            status=pe.execute_command(salmon_Cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid,command_name=" ".join(salmon_Cmd[0:2]))
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("salmon failed")
         return status 
 
-    def check_index(self):
+    def check_index(self,full_verify=False):
+        """Check valid salmon index
+        
+        Parameters
+        ----------
+        full_verify: bool
+            Verify checksums of all the index files
+        """
         if hasattr(self,'salmon_index'):
-            return pu.check_salmonindex(self.salmon_index)
+            return pu.check_salmonindex(self.salmon_index,full_verify)
         return False
     
     
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:52:16 2026
+
+@author: usingh
+
+Measure how programs scale with threads and recommend the number of threads to use
+"""
+
+import os
+import json
+from datetime import datetime
+from multiprocessing import cpu_count
+import numpy as np
+from pyrpipe import pyrpipe_utils as pu
+from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
+from pyrpipe.pyrpipe_registry import write_json_atomic
+
+
+class ScalingBenchmark():
+    """
+    Class to run a wrapper on the same input with an increasing number of threads e.g. 1, 2, 4, ... N.
+    Wall time, CPU time and peak memory of each run are read from the pyrpipe log. Amdahl's law,
+    T(n)=serial+parallel/n, is fitted to the runtimes and the largest thread count with parallel efficiency
+    above a threshold is recommended. The recommendation can be saved to the threads config read by the resource manager.
+
+    Parameters
+    ----------
+    run_function: function
+        wrapper function to run e.g. Hisat2.perform_alignment. Thread argument is passed to it as a keyword argument.
+    program: str
+        name of the program in the log e.g. hisat2
+    thread_arg: str
+        argument to set the threads e.g. -p
+    thread_counts: list
+        thread counts to run. Default: powers of 2 up to max_threads
+    max_threads: int
+        maximum threads. Default: all logical cores
+    efficiency_threshold: float
+        minimum parallel efficiency (speedup/threads) of the recommended thread count
+    out_dir: str
+        directory to save the report. Default: current directory
+
+    Attributes
+    ----------
+    results: list
+        list of dicts with threads, runtime, cputime and maxrss of each run
+    """
+    def __init__(self,run_function,program,thread_arg,thread_counts=None,max_threads=None,efficiency_threshold=0.7,out_dir=""):
+        if max_threads is None:
+            max_threads=cpu_count()
+        if thread_counts is None:
+            thread_counts=get_thread_counts(max_threads)
+        if not out_dir:
+            out_dir=os.getcwd()
+        self.run_function=run_function
+        self.program=program
+        self.thread_arg=thread_arg
+        self.thread_counts=sorted(set([int(t) for t in thread_counts]))
+        self.efficiency_threshold=efficiency_threshold
+        self.out_dir=out_dir
+        self.results=[]
+
+    def run(self,*args,**kwargs):
+        """Run the wrapper with each thread count. Arguments are passed to the wrapper.
+
+        :return: results of the runs
+        :rtype: list
+        """
+        log_file=pe.pyrpipeLoggerObject.log_path
+        for threads in self.thread_counts:
+            offset=os.path.getsize(log_file) if pu.check_files_exist(log_file) else 0
+            pu.print_blue("Running {} with {} threads".format(self.program,threads))
+            status=self.run_function(*args,**{**kwargs,self.thread_arg:str(threads)})
+            if not status:
+                pu.print_boldred("{} failed with {} threads".format(self.program,threads))
+                continue
+            records=[r for r in read_records_from(log_file,offset) if r.get('commandname')==self.program and int(r['exitcode'])==0]
+            if not records:
+                pu.print_boldred("No log records found for {} with {} threads".format(self.program,threads))
+                continue
+            self.add_result(threads,
+                            sum([pu.parse_runtime(r['runtime']) for r in records]),
+                            get_total([r.get('cputime') for r in records]),
+                            get_max([r.get('maxrss') for r in records]))
+        return self.results
+
+    def add_result(self,threads,runtime,cputime=None,maxrss=None):
+        """Add the measurement of a run
+        """
+        self.results.append({'threads':int(threads),'runtime':runtime,'cputime':cputime,'maxrss':maxrss})
+
+    def fit(self):
+        """Fit Amdahl's law to the runtimes.
+
+        :return: A tuple with the serial time, parallel time (on one thread) and the parallel fraction
+        :rtype: tuple
+        """
+        if not self.results:
+            raise Exception("ERROR: No results to fit. Please run the scaling benchmark first.")
+        return fit_amdahl([r['threads'] for r in self.results],[r['runtime'] for r in self.results])
+
+    def get_report(self):
+        """Returns a list of dicts with the measurements of each run, observed speedup and efficiency relative to the
+        fitted single thread runtime, and the speedup predicted by Amdahl's law.
+        """
+        serial,parallel,fraction=self.fit()
+        t1=serial+parallel
+        report=[]
+        for r in sorted(self.results,key=lambda r: r['threads']):
+            speedup=t1/r['runtime'] if r['runtime']>0 else 0
+            report.append({**r,
+                           'speedup':speedup,
+                           'efficiency':speedup/r['threads'],
+                           'amdahl_speedup':t1/(serial+parallel/r['threads']) if t1>0 else 1})
+        return report
+
+    def recommend(self):
+        """Returns the largest thread count with parallel efficiency above the threshold.
+
+        :return: number of threads
+        :rtype: int
+        """
+        recommended=1
+        for r in self.get_report():
+            if r['efficiency']>=self.efficiency_threshold:
+                recommended=max(recommended,r['threads'])
+        return recommended
+
+    def write_report(self):
+        """Write the report as csv to out_dir/<program>_thread_scaling.csv.
+
+        :return: path to the report
+        :rtype: str
+        """
+        report=self.get_report()
+        out_file=os.path.join(self.out_dir,self.program.replace(" ","_")+"_thread_scaling.csv")
+        columns=['threads','runtime','cputime','maxrss','speedup','efficiency','amdahl_speedup']
+        with open(out_file,"w") as f:
+            f.write(",".join(columns)+"\n")
+            for r in report:
+                f.write(",".join(["" if r[c] is None else str(r[c]) for c in columns])+"\n")
+        serial,parallel,fraction=self.fit()
+        pu.print_green("{}: parallel fraction {:.3f}, recommended threads {}".format(self.program,fraction,self.recommend()))
+        return out_file
+
+    def save_config(self,config_file=None):
+        """Save the recommended threads for the program in the threads config.
+        The resource manager uses it as the default threads of the program.
+
+        Parameters
+        ----------
+        config_file: str
+            path to the config. Default: $PYRPIPE_THREADS_CONFIG or ~/.pyrpipe/threads.json
+
+        :return: the config entry of the program
+        :rtype: dict
+        """
+        if config_file is None:
+            config_file=pr.get_threads_config_path()
+        config={}
+        if pu.check_files_exist(config_file):
+            with open(config_file) as f:
+                config=json.load(f)
+        config_dir=pu.get_file_directory(config_file)
+        if config_dir and not pu.check_paths_exist(config_dir):
+            os.makedirs(config_dir,exist_ok=True)
+        serial,parallel,fraction=self.fit()
+        entry={'threads':self.recommend(),
+               'parallel_fraction':fraction,
+               'efficiency_threshold':self.efficiency_threshold,
+               'updated':datetime.now().astimezone().isoformat()}
+        config[self.program]=entry
+        write_json_atomic(config_file,config)
+        return entry
+
+
+def get_thread_counts(max_threads):
+    """Returns powers of 2 up to max_threads, and max_threads
+    """
+    counts=[]
+    t=1
+    while t<max_threads:
+        counts.append(t)
+        t*=2
+    counts.append(max(1,int(max_threads)))
+    return counts
+
+
+def fit_amdahl(threads,runtimes):
+    """Fit runtime=serial+parallel/threads using least squares.
+
+    Parameters
+    ----------
+    threads: list
+        thread counts
+    runtimes: list
+        runtime with each thread count
+
+    :return: A tuple with the serial time, parallel time (on one thread) and the parallel fraction parallel/(serial+parallel)
+    :rtype: tuple
+    """
+    threads=np.array(threads,dtype=float)
+    runtimes=np.array(runtimes,dtype=float)
+    if len(np.unique(threads))<2:
+        return 0.0,float(runtimes.mean()*threads.mean()),1.0
+    X=np.column_stack([np.ones(len(threads)),1/threads])
+    serial,parallel=np.linalg.lstsq(X,runtimes,rcond=None)[0]
+    #keep the fit physical
+    serial=max(0.0,float(serial))
+    parallel=max(0.0,float(parallel))
+    total=serial+parallel
+    fraction=parallel/total if total>0 else 0.0
+    return serial,parallel,fraction
+
+
+def read_records_from(log_file,offset):
+    """Returns the records written to a pyrpipe log after the offset (in bytes)
+    """
+    records=[]
+    if not pu.check_files_exist(log_file):
+        return records
+    with open(log_file) as f:
+        f.seek(offset)
+        for line in f:
+            line=line.strip()
+            if not line or line.startswith("#"):
+                continue
+            records.append(json.loads(line))
+    return records
+
+
+def get_total(values):
+    """Sum of values, None if any value is missing
+    """
+    if any([v is None for v in values]):
+        return None
+    return sum(values)
+
+
+def get_max(values):
+    """Max of values ignoring missing values, None if no value is present
+    """
+    values=[v for v in values if v is not None]
+    if not values:
+        return None
+    return max(values)
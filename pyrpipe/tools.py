@@ -7,6 +7,7 @@ Created on Wed Dec  4 14:54:22 2019
 """
 from pyrpipe import pyrpipe_utils as pu
 from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
 import os
 
 class RNASeqTools:
@@ -24,6 +25,10 @@ class Samtools(RNASeqTools):
         self.valid_args=['-b','-C','-1','-u','-h','-H','-c','-o','-U','-t','-L','-r',
                             '-R','-q','-l','-m','-f','-F','-G','-s','-M','-x','-B','-?','-S','-O','-T','-@']
         
+        #argument to set threads and the subcommands which accept it
+        self.threads_args=['-@']
+        self.threaded_subcommands=['view','sort','merge','index']
+        
         self.passedArgumentDict=kwargs
         
         
@@ -253,13 +258,21 @@ class Samtools(RNASeqTools):
             
         #override existing arguments
         mergedArgsDict={**self.passedArgumentDict,**kwargs}
+        
+        #get threads from the shared core budget
+        job_id=None
+        if sub_command in self.threaded_subcommands:
+            mergedArgsDict,job_id=pr.resourceManagerObject.acquire(self.programName,mergedArgsDict,self.threads_args,objectid=objectid)
        
         samtools_cmd=['samtools',sub_command]
         #add options
         samtools_cmd.extend(pu.parse_unix_args(self.valid_args,mergedArgsDict))
                 
         #start ececution
-        status=pe.execute_command(samtools_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        try:
+            status=pe.execute_command(samtools_cmd,verbose=verbose,quiet=quiet,logs=logs,objectid=objectid)
+        finally:
+            pr.resourceManagerObject.release(job_id)
         if not status:
             pu.print_boldred("samtools failed")
         
@@ -8,15 +8,17 @@ Created on Tue Dec 10 11:16:40 2019
 
 import sys
 import os
+import re
+import time
+import shutil
+import multiprocessing
 import argparse
 import json
+from collections import OrderedDict
 from pyrpipe import pyrpipe_utils as pu
-from jinja2 import Environment, BaseLoader
-from weasyprint import HTML,CSS
 from html import escape
 import datetime as dt
-import multiqc as mc
-from pyrpipe import benchmark as bm
+#modules needed by only some subcommands e.g. jinja2, weasyprint, multiqc, pandas are imported where they are used
 
 
 try:
@@ -30,19 +32,7 @@ from pyrpipe import report_templates
 
 def parseEnvLog(envLog):
     #parse the env log
-    with open(envLog) as f:
-        envdata=f.read().splitlines()
-    
-    sysInfo={}
-    progList={}
-    for l in envdata:
-        if not l.startswith("#"):
-            if not sysInfo:
-                sysInfo=json.loads(l)
-            else:
-                thisProgram=json.loads(l)
-                progList[thisProgram['name']]=thisProgram
-    return sysInfo,progList
+    return pu.parse_env_log(envLog)
 
 def generateEnvReportTable(sysInfo,progList):
     """create html table to list environment
@@ -56,12 +46,13 @@ def generateEnvReportTable(sysInfo,progList):
     
     
     
-    os=sysInfo['os']
-    now=sysInfo['now']
-    sysmodulesList=sysInfo['sysmodules'].strip('][').split(', ')
-    syspathList=sysInfo['syspath'].strip('][').split(', ')
-    python=sysInfo['python']
-    cpu=sysInfo['cpu']
+    #fields are missing if the environment snapshot is not found
+    os=sysInfo.get('os','NA')
+    now=sysInfo.get('now','NA')
+    sysmodulesList=sysInfo.get('sysmodules','[]').strip('][').split(', ')
+    syspathList=sysInfo.get('syspath','[]').strip('][').split(', ')
+    python=sysInfo.get('python','NA')
+    cpu=sysInfo.get('cpu','NA')
     
     ##create system info table
     tabStr='\n<h2>Environment Information</h2>'
@@ -71,7 +62,7 @@ def generateEnvReportTable(sysInfo,progList):
     tabStr+='<tr><th colspan="3">Programs</th></tr>'
     tabStr+='\n<tr> <th>{}</th> <th>{}</th> <th>{}</th>  </tr>'.format("name","version","path")
     for k, v in progList.items():
-        tabStr+='\n<tr> <td>{}</td> <td>{}</td> <td>{}</td>  </tr>'.format(v["name"],v["version"],v["path"])
+        tabStr+='\n<tr> <td>{}</td> <td>{}</td> <td>{}</td>  </tr>'.format(v["name"],v.get("version","NA"),v.get("path","NA"))
     tabStr+='\n</table>'    
     tabStr+='\n<br><br>'
     tabStr+='\n<table class="sysInfotable" >'
@@ -80,6 +71,8 @@ def generateEnvReportTable(sysInfo,progList):
     tabStr+='\n<tr>    <td>Python</td> <td>{}</td>    </tr>'.format(python)
     tabStr+='\n<tr>    <td>Operating system</td> <td>{}</td>    </tr>'.format(os)
     tabStr+='\n<tr>    <td>CPU</td> <td>{}</td>    </tr>'.format(cpu)
+    if 'snapshot' in sysInfo:
+        tabStr+='\n<tr>    <td>Environment snapshot</td> <td>{}</td>    </tr>'.format(sysInfo['snapshot'])
     tabStr+='\n</table>'
     tabStr+='\n<br><br>'
     #add sys modules table
@@ -104,44 +97,99 @@ def generateEnvReportTable(sysInfo,progList):
 
     
     
-def generateHTMLReport(templateFile,cmdLog,envLog,coverage='f'):
-    """Generates html report
+def getReportHead(cmdLog,title="<em>pyrpipe</em> report"):
+    """Returns the head of a report page
+    """
+    headHTML=pkg_resources.read_text(report_templates, 'head.html')
+    headHTML+='\n<h2> {}</h2>'.format(title)
+    headHTML+='\n<stron>file name:{}</strong>'.format(cmdLog)
+    headHTML+='\n<hr><br><br>\n'
+    return headHTML
+
+
+def newReportStats():
+    """Returns a dict to collect counts of commands while reading the log
+    """
+    return {'numCommands':0,'failedCommands':0,'passedCommands':0,'last':None}
+
+
+def scanLog(cmdLog,coverage,splitBy='objectid',pageSize=1000):
+    """First pass over the log. Counts the commands and collects the byte offsets of the commands of each fragment.
+    A fragment is the commands of one objectid, or a page of pageSize commands.
+    Only the offsets of the commands are kept in memory, not the records. Memory grows with the number of commands but not with the size of their outputs.
+    
     Parameters
     ----------
-    templatefile: string
-        path to a template file
-    cmdlog: string
+    cmdLog: string
         path to the log file
-    envlog: string
-        path to the env log file
     coverage: string
         tpye of report: full, summary, fail, pass
+    splitBy: string
+        objectid or page
+    pageSize: int
+        commands per page
     
+    :return: A tuple with the counts of commands and an OrderedDict with fragment name as key and a dict with title, offsets, commands and failed as value
+    :rtype: tuple
     """
-    #vars for generating summary
-    startTime=""
-    endTime=""
-    numCommands=0
-    failedCommands=0
-    passedCommands=0
-    numPrograms=0
-    progNames=[]
-    #parse envLog
-    sysInfo,progList=parseEnvLog(envLog)
-    
-    #get starttime #end time is calculated from log below
-    startTime=dt.datetime.strptime(sysInfo['now'],"%y-%m-%d %H:%M:%S")
-    #total progs used
-    progNames=progList.keys()
-    numPrograms=len(progNames)
-    
-    #read the template
-    templateHTMLFile = pkg_resources.read_text(report_templates, templateFile)
-    #load template file
-    template = Environment(loader=BaseLoader()).from_string(templateHTMLFile)
-    
+    stats=newReportStats()
+    fragments=OrderedDict()
+    numSelected=0
+    offset=0
+    with open(cmdLog,'rb') as f:
+        for line in f:
+            thisOffset=offset
+            offset+=len(line)
+            if not line.strip() or line.startswith(b"#"):
+                continue
+            thisDict=json.loads(line)
+            stats['numCommands']+=1
+            stats['last']={'starttime':thisDict['starttime'],'runtime':thisDict['runtime']}
+            exitcode=int(thisDict['exitcode'])
+            if exitcode==0:
+                stats['passedCommands']+=1
+            else:
+                stats['failedCommands']+=1
+            #skip passed
+            if coverage=='i' and exitcode==0:
+                continue
+            #skip failed
+            if coverage=='p' and exitcode!=0:
+                continue
+            
+            if splitBy=='page':
+                title="page {}".format(numSelected//pageSize+1)
+                name="page_{:05d}".format(numSelected//pageSize+1)
+            else:
+                title=str(thisDict.get('objectid','NA'))
+                name=re.sub(r'[^\w.-]','_',title)
+            if name not in fragments:
+                fragments[name]={'title':title,'offsets':[],'commands':0,'failed':0}
+            fragments[name]['offsets'].append(thisOffset)
+            fragments[name]['commands']+=1
+            if exitcode!=0:
+                fragments[name]['failed']+=1
+            numSelected+=1
+    return stats,fragments
+
+
+def truncateOutput(text,maxLines,rawFile,rawLink):
+    """Returns the html escaped text. If the text has more than 2*maxLines lines only the first and last maxLines
+    lines are returned with a link to the full text, which is written to rawFile.
     """
-    for each command executed get the report parameters.
+    if maxLines<1 or text.count("\n")<2*maxLines:
+        return escape(text)
+    lines=text.split("\n")
+    if len(lines)<=2*maxLines:
+        return escape(text)
+    with open(rawFile,'w') as f:
+        f.write(text)
+    omitted=len(lines)-2*maxLines
+    return escape("\n".join(lines[:maxLines]))+'\n<a href="{}">... {} lines not shown, see full output</a>\n'.format(escape(rawLink),omitted)+escape("\n".join(lines[-maxLines:]))
+
+
+def renderRecord(template,thisDict,progList,rawName,maxLines=0,rawDir="",rawLink=""):
+    """Render a command using the template.
     Template should specify the parameters:
         cmd: the command executed
         stdout: the stdout
@@ -149,102 +197,239 @@ def generateHTMLReport(templateFile,cmdLog,envLog,coverage='f'):
         exitcode: return code obtained
         starttime: time started
         runtime: execution time
-        
-        example record:{'cmd':logMessage,
-                 'exitcode':str(exitCode),
-                 'runtime':str(dt.timedelta(seconds=timeDiff)),
-                 'starttime':str(strStartTime),
-                 'stdout':stdout,
-                 'stderr':stderr                 
-                }
     """
-    with open(cmdLog) as f:
-        data=f.read().splitlines()
-    
-    #read head.html
-    headHTML=pkg_resources.read_text(report_templates, 'head.html')
-    #add file name
-    headHTML+='\n<h2> <em>pyrpipe</em> report</h2>'
-    headHTML+='\n<stron>file name:{}</strong>'.format(cmdLog)
-    headHTML+='\n<hr><br><br>\n'
-    
-    fullHTML="\n<h2> Details </h2>"
     failColor="rgb(208,28,139)"
     passColor="rgb(77,172,38)" 
-    for l in data:
-        if not l.startswith("#"):
-            thisDict=json.loads(l)
-            numCommands+=1
-            #add color to table
-            if int(thisDict['exitcode'])==0:
-                thisDict['statuscolor']=passColor
-                passedCommands+=1
-            else:
-                thisDict['statuscolor']=failColor
-                failedCommands+=1
-            
-            #program name
-            programname=thisDict['cmd'].split(" ")[0]
-            #add program version info
-            newDict={**thisDict,**progList[programname]}
-            
-            #skip passed
-            if coverage=='i' and int(thisDict['exitcode'])==0:
-                continue
-            #skip failed
-            if coverage=='p' and int(thisDict['exitcode'])!=0:
-                continue
-            
-            #escape all special html charecters
-            for k, v in newDict.items():
-                newDict[k] = escape(str(v))
-            fullHTML=fullHTML+"\n"+template.render(newDict)
-            
-    #get start and runtime of last command
-    lastDict=json.loads(data[-1])
-    lastST=dt.datetime.strptime(lastDict['starttime'],"%y-%m-%d %H:%M:%S")
-    try:
-        lastruntime= dt.datetime.strptime(lastDict['runtime'],"%H:%M:%S")
-        deltaTime = dt.timedelta(days=0,hours=lastruntime.hour, minutes=lastruntime.minute, seconds=lastruntime.second)
-    except ValueError:
-        #try days format
-        timeString=lastDict['runtime'].split(",")
-        days=int(timeString[0].split(" ")[0].strip())
-        rest=timeString[1].strip()
-        #hours=int(days)*24
-        lastruntime= dt.datetime.strptime(rest,"%H:%M:%S")
-        #one day less
-        #lastruntime=lastruntime+dt.timedelta(days=days-1)
-        deltaTime = dt.timedelta(days=days,hours=lastruntime.hour, minutes=lastruntime.minute, seconds=lastruntime.second)
-    
-    endTime=lastST+deltaTime
-    #remove one extra day
-    #endTime=dt.timedelta(days=endTime.day-1,hours=endTime.hour, minutes=endTime.minute, seconds=endTime.second)
+    #add color to table
+    if int(thisDict['exitcode'])==0:
+        thisDict['statuscolor']=passColor
+    else:
+        thisDict['statuscolor']=failColor
+    
+    #program name
+    programname=thisDict['cmd'].split(" ")[0]
+    #add program version info
+    newDict={**thisDict,**progList.get(programname,{'name':programname,'version':'','path':''})}
+    
+    #show runtime as H:MM:SS
+    newDict['runtime']=str(dt.timedelta(seconds=round(pu.parse_runtime(newDict['runtime']),3)))
+    
+    #escape all special html charecters
+    for k, v in newDict.items():
+        if k in ['stdout','stderr']:
+            fileName="{}_{}.txt".format(rawName,k)
+            newDict[k]=truncateOutput(str(v),maxLines,os.path.join(rawDir,fileName),rawLink+fileName)
+        else:
+            newDict[k] = escape(str(v))
+    return template.render(newDict)
+
+
+#compiled templates, one per process
+compiledTemplates={}
+def getTemplate(templateFile):
+    """Returns the compiled template. Templates are compiled once per process.
+    """
+    if templateFile not in compiledTemplates:
+        from jinja2 import Environment, BaseLoader
+        templateHTMLFile = pkg_resources.read_text(report_templates, templateFile)
+        compiledTemplates[templateFile]=Environment(loader=BaseLoader()).from_string(templateHTMLFile)
+    return compiledTemplates[templateFile]
+
+
+def renderFragment(job):
+    """Render the commands of a fragment and write them to a file. Runs in a worker process.
+    
+    Parameters
+    ----------
+    job: dict
+        templateFile, cmdLog, progList, name, fragment (from scanLog), outFile, title (if not None the fragment is written as a complete page),
+        maxLines, rawDir and rawLink
+    
+    :return: path to the fragment file
+    :rtype: string
+    """
+    template=getTemplate(job['templateFile'])
+    with open(job['cmdLog'],'rb') as log, open(job['outFile'],'w') as out:
+        if job['title'] is not None:
+            out.write(getReportHead(job['cmdLog'],title=escape(job['title'])))
+            out.write('\n<a href="index.html">index</a><br><br>')
+        for i,offset in enumerate(job['fragment']['offsets']):
+            log.seek(offset)
+            thisDict=json.loads(log.readline())
+            rawName="{}_{}".format(job['name'],i+1)
+            out.write("\n"+renderRecord(template,thisDict,job['progList'],rawName,job['maxLines'],job['rawDir'],job['rawLink']))
+        if job['title'] is not None:
+            out.write("\n</body>\n</html>")
+    return job['outFile']
+
+
+def renderFragments(jobList,numJobs=1):
+    """Render fragments using a pool of numJobs processes
+    """
+    if numJobs>1 and len(jobList)>1:
+        with multiprocessing.get_context('fork').Pool(numJobs) as pool:
+            #small fragments are sent to workers in chunks
+            for outFile in pool.imap_unordered(renderFragment,jobList,chunksize=max(1,len(jobList)//(numJobs*16))):
+                pass
+    else:
+        for job in jobList:
+            renderFragment(job)
+
+
+def generateSummary(stats,sysInfo,progList):
+    """Returns html summary of a log using counts collected while reading the log
+    """
+    #get starttime #end time is calculated from the last command
+    #times are compared in local time, older logs save times without UTC offset
+    startTime=pu.parse_timestamp(sysInfo['now']).astimezone()
+    endTime=startTime
+    if stats['last'] is not None:
+        lastST=pu.parse_timestamp(stats['last']['starttime']).astimezone()
+        deltaTime=dt.timedelta(seconds=pu.parse_runtime(stats['last']['runtime']))
+        endTime=lastST+deltaTime
+    #total progs used
+    progNames=progList.keys()
     
-            
-    #generate summary
     summary='\n<h2> Summary </h2>'
     summary+='\n<div class="summary">'
     summary+='\n<code>Time start: {}     Time end: {}      Total time: {}</code>'.format(str(startTime),str(endTime), str(endTime-startTime))
     summary+='\n<br><br>'
-    summary+='\n<span>Num commands: {}</span>'.format(numCommands)
+    summary+='\n<span>Num commands: {}</span>'.format(stats['numCommands'])
     summary+='\n<br><br>'
-    summary+='\nNum failed commands: {}'.format(failedCommands)
+    summary+='\nNum failed commands: {}'.format(stats['failedCommands'])
     summary+='\n<br><br>'
-    summary+='\nNum passed commands: {}'.format(passedCommands)
+    summary+='\nNum passed commands: {}'.format(stats['passedCommands'])
     summary+='\n<br><br>'
-    summary+='\nTotal programs: {}'.format(numPrograms)
+    summary+='\nTotal programs: {}'.format(len(progNames))
     summary+='\n<br><br>'
     summary+='\nPrograms: {}'.format(",".join(progNames))
     summary+='\n<br><br>'
     summary+='\n</div>'
-        
-    envTable=generateEnvReportTable(sysInfo,progList)
-    headHTML=headHTML+summary+fullHTML+envTable+"\n</body>\n</html>"
-    return headHTML
+    return summary
+
+
+def generateHTMLReport(templateFile,cmdLog,envLog,outFile,coverage='f',numJobs=1,maxLines=0):
+    """Generates html report and writes it to outFile.
+    Commands of each objectid are rendered to a fragment file by a pool of processes and the report is assembled from the fragments.
+    Only the byte offsets of the commands are kept in memory (see scanLog), not the records with their outputs.
+    
+    Parameters
+    ----------
+    templatefile: string
+        path to a template file
+    cmdlog: string
+        path to the log file
+    envlog: string
+        path to the env log file
+    outFile: string
+        path to the html file
+    coverage: string
+        tpye of report: full, summary, fail, pass
+    numJobs: int
+        number of processes to render the report
+    maxLines: int
+        show only first and last maxLines lines of stdout/stderr. Full output is written to <outFile>_raw. 0 to show full output.
+    
+    :return: path to the html file
+    :rtype: string
+    """
+    #parse envLog
+    sysInfo,progList=parseEnvLog(envLog)
+    stats,fragments=scanLog(cmdLog,coverage,splitBy='objectid')
+    
+    fragmentsDir=outFile+"_fragments"
+    rawDir=outFile+"_raw"
+    for d in [fragmentsDir,rawDir]:
+        if not pu.check_paths_exist(d):
+            pu.mkdir(d)
+    jobList=[]
+    for name,fragment in fragments.items():
+        jobList.append({'templateFile':templateFile,'cmdLog':cmdLog,'progList':progList,'name':name,'fragment':fragment,
+                        'outFile':os.path.join(fragmentsDir,name+".html"),'title':None,
+                        'maxLines':maxLines,'rawDir':rawDir,'rawLink':os.path.basename(rawDir)+"/"})
+    renderFragments(jobList,numJobs)
+    
+    #assemble the report
+    with open(outFile,'w') as f:
+        f.write(getReportHead(cmdLog))
+        f.write(generateSummary(stats,sysInfo,progList))
+        f.write("\n<h2> Details </h2>")
+        for job in jobList:
+            with open(job['outFile']) as fragment:
+                shutil.copyfileobj(fragment,f)
+        f.write(generateEnvReportTable(sysInfo,progList))
+        f.write("\n</body>\n</html>")
+    shutil.rmtree(fragmentsDir)
+    #remove raw dir if no output was truncated
+    if not os.listdir(rawDir):
+        os.rmdir(rawDir)
+    return outFile
+
+
+def generatePagedHTMLReport(templateFile,cmdLog,envLog,outDir,coverage='f',pageSize=1000,splitBy='page',numJobs=1,maxLines=0):
+    """Generates html report split into pages, and an index page with the summary and links to the pages.
+    Pages are rendered by a pool of processes.
+    
+    Parameters
+    ----------
+    templatefile: string
+        path to a template file
+    cmdlog: string
+        path to the log file
+    envlog: string
+        path to the env log file
+    outDir: string
+        directory to write index.html and the pages
+    coverage: string
+        tpye of report: full, summary, fail, pass
+    pageSize: int
+        commands per page when splitting by page
+    splitBy: string
+        page: pages of pageSize commands; objectid: one page per objectid
+    numJobs: int
+        number of processes to render the report
+    maxLines: int
+        show only first and last maxLines lines of stdout/stderr. Full output is written to <outDir>/raw. 0 to show full output.
+    
+    :return: path to the index page
+    :rtype: string
+    """
+    rawDir=os.path.join(outDir,"raw")
+    for d in [outDir,rawDir]:
+        if not pu.check_paths_exist(d):
+            pu.mkdir(d)
+    sysInfo,progList=parseEnvLog(envLog)
+    stats,pages=scanLog(cmdLog,coverage,splitBy=splitBy,pageSize=pageSize)
+    
+    jobList=[]
+    for name,page in pages.items():
+        jobList.append({'templateFile':templateFile,'cmdLog':cmdLog,'progList':progList,'name':name,'fragment':page,
+                        'outFile':os.path.join(outDir,name+".html"),'title':page['title'],
+                        'maxLines':maxLines,'rawDir':rawDir,'rawLink':"raw/"})
+    renderFragments(jobList,numJobs)
+    
+    #write index
+    indexFile=os.path.join(outDir,"index.html")
+    with open(indexFile,'w') as f:
+        f.write(getReportHead(cmdLog))
+        f.write(generateSummary(stats,sysInfo,progList))
+        f.write('\n<h2> Details </h2>')
+        f.write('\n<table class="programinfo" >')
+        f.write('\n<tr> <th>{}</th> <th>{}</th> <th>{}</th>  </tr>'.format(splitBy,"commands","failed"))
+        for name,v in pages.items():
+            f.write('\n<tr> <td><a href="{}">{}</a></td> <td>{}</td> <td>{}</td>  </tr>'.format(name+".html",escape(v['title']),v['commands'],v['failed']))
+        f.write('\n</table>')
+        f.write(generateEnvReportTable(sysInfo,progList))
+        f.write("\n</body>\n</html>")
+    #add css used by head.html
+    with open(os.path.join(outDir,"simple.css"),'w') as f:
+        f.write(pkg_resources.read_text(report_templates, 'simple.css'))
+    print("Report written to {}".format(indexFile))
+    return indexFile
     
 
-def writeHtmlToPdf(htmlText,outFile):
+def writeHtmlToPdf(htmlFile,outFile):
+    from weasyprint import HTML,CSS
     if not outFile.endswith(".pdf"):
         outFile=outFile+".pdf"
    
@@ -252,7 +437,7 @@ def writeHtmlToPdf(htmlText,outFile):
     cssFile = pkg_resources.read_text(report_templates, 'simple.css')
     #HTML(string=htmlText).write_pdf(outFile)
     #HTML(string=htmlText).write_pdf(outFile, stylesheets=[CSS('/home/usingh/work/urmi/hoap/pyrpipe/pyrpipe/report_templates/simple.css')])
-    HTML(string=htmlText).write_pdf(outFile, stylesheets=[CSS(string=cssFile)])
+    HTML(filename=htmlFile).write_pdf(outFile, stylesheets=[CSS(string=cssFile)])
     print("Report written to {}".format(outFile))
     
 def writeHtml(htmlText,outFile):
@@ -283,72 +468,98 @@ def writeHtmlToMarkdown(htmlText,outFile):
     """
     
 
-def getCommandsFromLog(inFile,filterList,coverage):
-    with open(inFile) as f:
-        data=f.read().splitlines()
+def readLogRecords(inFile,coverage='a',objectids=None):
+    """Generator to read the commands in a log with the given status.
+    If objectids are given, the log is indexed (see logtools.LogIndex) and only the commands of these objectids are read.
+    
+    Parameters
+    ----------
+    inFile: string
+        path to the log
+    coverage: string
+        commands to use [(a)ll,fa(i)l,(p)ass]
+    objectids: list
+        objectids to read. Default: all
+    """
+    if objectids:
+        from pyrpipe.logtools import LogIndex
+        status={'i':'fail','p':'pass'}.get(coverage)
+        yield from LogIndex(inFile).read_records(objectids=objectids,status=status)
+        return
+    for thisLog in pu.read_log_records(inFile):
+        status=int(thisLog['exitcode'])
+        #skip passed
+        if coverage=='i' and status==0:
+            continue
+        #skip failed
+        if coverage=='p' and status!=0:
+            continue
+        yield thisLog
+
+
+def getCommandsFromLog(inFile,filterList,coverage,objectids=None):
     commands=[]
-    for l in data:
-        if not l.startswith("#"):
-            thisLog=json.loads(l)
-            thisName=thisLog["cmd"].split(' ')[0]
-            if filterList and thisName in filterList:
-                continue
-            status=int(thisLog['exitcode'])
-            #skip passed
-            if coverage=='i' and status==0:
-                continue
-            #skip failed
-            if coverage=='p' and status!=0:
-                continue
-            
-            commands.append(thisLog["cmd"])
+    for thisLog in readLogRecords(inFile,coverage,objectids):
+        thisName=thisLog["cmd"].split(' ')[0]
+        if filterList and thisName in filterList:
+            continue
+        commands.append(thisLog["cmd"])
             
     return commands
 
-def getStdoutFromLog(inFile,filterList,coverage):
-    """Return a dict with objid_program as key and stdout
+def openStdoutFile(tempDir,key):
+    """Create a new file <key>.txt in tempDir. If it exists, <key>_1.txt, <key>_2.txt ... are tried.
+    Files are created exclusively so that parallel workers never write to the same file.
     """
-    with open(inFile) as f:
-        data=f.read().splitlines()
-    stdout={}
-    duplicate_ctr={}
-    for l in data:
-        if not l.startswith("#"):
-            thisLog=json.loads(l)
-            thisObj=thisLog['objectid']
-            thisProgram=thisLog['commandname']
-            #filter program
-            thisName=thisLog["stdout"].split(' ')[0]
-            if filterList and thisName in filterList:
-                continue
-            status=int(thisLog['exitcode'])
-            #skip passed
-            if coverage=='i' and status==0:
-                continue
-            #skip failed
-            if coverage=='p' and status!=0:
-                continue
-            
-            key=thisObj+"_"+thisProgram
-            #handle duplicate
-            if key in stdout:
-                
-                if key in duplicate_ctr:
-                    duplicate_ctr[key]+=1
-                else:
-                    duplicate_ctr[key]=1
-                #new key    
-                suffix=duplicate_ctr[key]
-                key=key+"_"+str(suffix)
-                
-            stdout[key]=thisLog["stdout"]
-            
-    return stdout
+    suffix=0
+    while True:
+        thisName=key if suffix==0 else key+"_"+str(suffix)
+        tempFile=os.path.join(tempDir,thisName+".txt")
+        try:
+            fd=os.open(tempFile,os.O_WRONLY|os.O_CREAT|os.O_EXCL,0o666)
+            return tempFile,os.fdopen(fd,'w')
+        except FileExistsError:
+            suffix+=1
+
+
+def writeStdoutFromLog(inFile,filterList,tempDir,coverage='a',objectids=None):
+    """Write the stdout of each command to tempDir/<objectid>_<program>.txt.
+    The log is read once and each stdout is written as soon as it is read, so memory does not grow with the log.
+    
+    Parameters
+    ----------
+    inFile: string
+        path to the log. Logs compressed with gzip are supported.
+    filterList: list
+        programs to skip
+    tempDir: string
+        directory to write the files
+    coverage: string
+        commands to use [(a)ll,fa(i)l,(p)ass]
+    objectids: list
+        objectids to write. Only their commands are read using the log index. Default: all
+    
+    :return: paths of the files written
+    :rtype: list
+    """
+    flist=[]
+    for thisLog in readLogRecords(inFile,coverage,objectids):
+        thisObj=str(thisLog.get('objectid','NA'))
+        thisProgram=thisLog.get('commandname',thisLog['cmd'].split(' ')[0])
+        #filter program
+        if filterList and thisProgram in filterList:
+            continue
+        
+        tempFile,f=openStdoutFile(tempDir,re.sub(r'[^\w.-]','_',thisObj+"_"+thisProgram))
+        with f:
+            f.write(thisLog["stdout"])
+        flist.append(tempFile)
+    return flist
 
 
 
-def generateBashScript(logFile,outFile,filterList,coverage='a'):
-    commands=getCommandsFromLog(logFile,filterList,coverage)
+def generateBashScript(logFile,outFile,filterList,coverage='a',objectids=None):
+    commands=getCommandsFromLog(logFile,filterList,coverage,objectids)
     if not outFile.endswith(".sh"):
         outFile=outFile+".sh"
     shebang="#!/bin/bash "
@@ -360,51 +571,296 @@ def generateBashScript(logFile,outFile,filterList,coverage='a'):
     print("shell commands written to "+outFile)
 
 
+def getCommandChains(inFile,filterList,coverage,objectids=None):
+    """Returns the commands of each objectid in the order they were started.
+    Commands with objectid NA started before the first objectid command are setup commands e.g. building an index,
+    the remaining NA commands are finalize commands e.g. merging results.
+    
+    :return: A tuple with the setup commands, an OrderedDict with objectid as key and list of its commands as value, and the finalize commands
+    :rtype: tuple
+    """
+    records=[]
+    for thisLog in readLogRecords(inFile,coverage,objectids):
+        thisName=thisLog["cmd"].split(' ')[0]
+        if filterList and thisName in filterList:
+            continue
+        records.append((pu.parse_timestamp(thisLog['starttime']) if thisLog.get('starttime') else None,
+                        str(thisLog.get('objectid','NA')),thisLog["cmd"]))
+    
+    #sort by start time, commands started at the same time stay in log order
+    if all([r[0] is not None for r in records]):
+        records=sorted(records,key=lambda r: r[0].replace(tzinfo=None) if r[0].tzinfo is None else r[0].astimezone().replace(tzinfo=None))
+    setup=[]
+    chains=OrderedDict()
+    finalize=[]
+    for starttime,objectid,cmd in records:
+        if objectid=="NA":
+            if chains:
+                finalize.append(cmd)
+            else:
+                setup.append(cmd)
+        else:
+            chains.setdefault(objectid,[]).append(cmd)
+    return setup,chains,finalize
+
+
+def generateMakefile(logFile,outFile,filterList,coverage='a',numJobs=1,objectids=None):
+    """Write the commands as a Makefile with one target per objectid. Targets depend on the setup target and the
+    finalize target depends on all objectids, so that make -j runs the objectids in parallel.
+    """
+    setup,chains,finalize=getCommandChains(logFile,filterList,coverage,objectids)
+    #make target names
+    targets=OrderedDict()
+    for objectid in chains:
+        targets[objectid]="obj_"+re.sub(r'[^\w.-]','_',objectid)
+    
+    with open(outFile,"w") as f:
+        f.write("#Run with: make -f {} [-j N]\n".format(os.path.basename(outFile)))
+        f.write("SHELL := /bin/bash\n")
+        f.write("MAKEFLAGS += -j{}\n".format(numJobs))
+        f.write(".PHONY: all setup finalize {}\n\n".format(" ".join(targets.values())))
+        f.write("all: finalize\n\n")
+        f.write("setup:\n")
+        for cmd in setup:
+            f.write("\t{}\n".format(cmd.replace("$","$$")))
+        f.write("\n")
+        for objectid,cmds in chains.items():
+            f.write("{}: setup\n".format(targets[objectid]))
+            for cmd in cmds:
+                f.write("\t{}\n".format(cmd.replace("$","$$")))
+            f.write("\n")
+        f.write("finalize: {}\n".format(" ".join(targets.values())))
+        for cmd in finalize:
+            f.write("\t{}\n".format(cmd.replace("$","$$")))
+    print("Makefile written to "+outFile)
+
+
+def generateParallelScript(logFile,outFile,filterList,coverage='a',numJobs=1,objectids=None):
+    """Write the commands as a bash script which runs the commands of each objectid as one job.
+    Jobs run in parallel using GNU parallel, or xargs if parallel is not installed. Setup commands run before and finalize commands after the jobs.
+    """
+    setup,chains,finalize=getCommandChains(logFile,filterList,coverage,objectids)
+    with open(outFile,"w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("set -e\n")
+        f.write("JOBS=${{JOBS:-{}}}\n\n".format(numJobs))
+        f.write("#setup\n")
+        for cmd in setup:
+            f.write(cmd+"\n")
+        f.write("\n#commands of each objectid run in order as one job\n")
+        f.write("run_jobs() {\n")
+        f.write("    if command -v parallel >/dev/null; then parallel --halt soon,fail=1 -j \"$JOBS\"; else xargs -d '\\n' -P \"$JOBS\" -n 1 bash -c; fi\n")
+        f.write("}\n")
+        f.write("run_jobs <<'PYRPIPE_JOBS'\n")
+        for objectid,cmds in chains.items():
+            #group each command so that its operators e.g. || do not change the chain
+            f.write(" && ".join(["{{ {}; }}".format(cmd) for cmd in cmds])+"\n")
+        f.write("PYRPIPE_JOBS\n\n")
+        f.write("#finalize\n")
+        for cmd in finalize:
+            f.write(cmd+"\n")
+    print("shell commands written to "+outFile)
+
+
 def checkEnvLog(logFile):
     #check all logs exist
-    logFileDir=pu.getFileDirectory(logFile)
-    basename=pu.getFileBaseName(logFile)
+    logFileDir=pu.get_file_directory(logFile)
+    basename=pu.get_file_basename(logFile)
     envLog=os.path.join(logFileDir,basename+"ENV.log")
-    if not pu.checkFilesExists(logFile,envLog):
+    if not pu.check_files_exist(logFile,envLog):
         print("Please check missing log files. Exiting.")
         sys.exit(1)
     return envLog
 
-def generateMultiqcReport(logFile,filterList,tempDir,outFile="",coverage='a',verbose=False,cleanup=False):
-    #dump stdout from logs to temp directory
-    stdout=getStdoutFromLog(logFile,filterList,coverage)
+def generateMultiqcReport(logFiles,filterList,tempDir,outFile="",coverage='a',verbose=False,cleanup=False,numJobs=1,objectids=None):
+    """Write stdout of commands in the logs to tempDir and run multiqc on it.
     
+    Parameters
+    ----------
+    logFiles: list
+        pyrpipe logs or segments of a log e.g. compressed with gzip. Segments are read in parallel using numJobs processes.
+    objectids: list
+        objectids to include. Only their commands are read using the log index. Default: all
+    """
+    if isinstance(logFiles,str):
+        logFiles=[logFiles]
+    #dump stdout from logs to temp directory
     flist=[]
-    for o in stdout:
-        thisName=o+".txt"
-        tempFile=os.path.join(tempDir,thisName)
-#        print("opening:"+tempFile)
-        f=open(tempFile,"w")
-        f.write(stdout[o])
-        #rint(stdout[o])
-        f.close()
-        flist.append(tempFile)
+    if numJobs>1 and len(logFiles)>1:
+        with multiprocessing.get_context('fork').Pool(min(numJobs,len(logFiles))) as pool:
+            for thisList in pool.starmap(writeStdoutFromLog,[(l,filterList,tempDir,coverage,objectids) for l in logFiles]):
+                flist.extend(thisList)
+    else:
+        for l in logFiles:
+            flist.extend(writeStdoutFromLog(l,filterList,tempDir,coverage,objectids))
+    if verbose:
+        pu.print_blue("{} stdout files written to {}".format(len(flist),tempDir))
     
     #run multiqc
+    import multiqc as mc
     mc.run(tempDir)
     
     #cleanup
     if cleanup:
         for f in flist:
-            pu.printBlue("Removing {}".format(f))
+            pu.print_blue("Removing {}".format(f))
             os.remove(f)   
 
-def generateBenchmarkReport(logFile,envLog,filterList,tempDir,outFile="",verbose=False):
+def generateBenchmarkReport(logFile,envLog,filterList,tempDir,outFile="",verbose=False,lanes="objectid",maxLanes=100,objectids=None):
     """
     ignores failed commands with exitcode !=0
     """
     
-    ob=bm.Benchmark(logFile,envLog,outDir=tempDir)
+    from pyrpipe import benchmark as bm
+    ob=bm.Benchmark(logFile,envLog,out_dir=tempDir,objectids=objectids)
     #generate benchmarks
     ob.plot_time_perobject()
     ob.plot_time_perprogram()
+    #percentiles and outlier samples
+    ob.write_statistics_report()
+    #gantt chart
+    ob.plot_timeline(lanes=lanes,max_lanes=maxLanes)
+    #critical paths and parallel efficiency
+    summary=ob.write_efficiency_report()
+    if verbose:
+        for k,v in summary.items():
+            print("{}: {}".format(k,v))
     
-    pu.printGreen("Benchmark report saved to:"+tempDir+"/benchmark_reports")
+    pu.print_green("Benchmark report saved to:"+tempDir+"/benchmark_reports")
+
+
+def generateTrace(logFile,envLog,tempDir,outFile="",lanes="objectid",samplesFile=None,objectids=None):
+    """Export the log in the Chrome Trace Event format
+    """
+    from pyrpipe import benchmark as bm
+    ob=bm.Benchmark(logFile,envLog,out_dir=tempDir,objectids=objectids)
+    outFile=ob.write_trace(out_file=outFile if outFile else None,lanes=lanes,samples_file=samplesFile)
+    pu.print_green("Trace written to {}. Open it in https://ui.perfetto.dev or chrome://tracing".format(outFile))
+    return outFile
+
+
+def generateComparison(baseLog,newLog,tempDir,outFile="",threshold=0.1,alpha=0.05,verbose=False):
+    """Compare runtimes and memory of each program in two logs.
+    
+    :return: number of programs with regressions
+    :rtype: int
+    """
+    from pyrpipe import benchmark as bm
+    base=bm.Benchmark(baseLog,checkEnvLog(baseLog),out_dir=tempDir)
+    new=bm.Benchmark(newLog,checkEnvLog(newLog),out_dir=tempDir)
+    #environments are compared by their snapshot hash
+    baseEnv=pu.get_env_hash(parseEnvLog(base.env_log)[0])
+    newEnv=pu.get_env_hash(parseEnvLog(new.env_log)[0])
+    if baseEnv==newEnv:
+        pu.print_green("Environments are identical ({})".format(newEnv[:12]))
+    else:
+        pu.print_yellow("Environments differ ({} {})".format(baseEnv[:12],newEnv[:12]))
+    result=base.compare(new,threshold=threshold,alpha=alpha)
+    if outFile:
+        result.to_csv(outFile,index=False)
+        print("Comparison written to "+outFile)
+    
+    cols=[c for c in ['program','base_commands','new_commands','base_median_runtime','new_median_runtime','delta_runtime','pvalue_runtime','delta_maxrss','pvalue_maxrss','regression'] if c in result.columns]
+    print(result[cols].to_string(index=False))
+    regressions=result[result['regression']]
+    for program in regressions['program']:
+        pu.print_boldred("Regression: "+program)
+    if regressions.shape[0]==0:
+        pu.print_green("No regressions found")
+    return regressions.shape[0]
+
+
+def generatePrediction(sampleSheet,logFiles,programs,cores,threads,outFile="",verbose=False):
+    """Predict the runtime of each sample and the makespan of all samples on the given cores.
+    """
+    from pyrpipe import prediction
+    model=prediction.RuntimeModel()
+    numCommands=model.add_logs(*logFiles)
+    if numCommands<1:
+        pu.print_boldred("No successful commands found in logs. Exiting.")
+        sys.exit(1)
+    model.fit()
+    if not programs:
+        programs=list(model.models.keys())
+    samples=prediction.read_sample_sheet(sampleSheet)
+    predictions=model.predict_samples(samples,programs,threads)
+    makespan,schedule=prediction.estimate_makespan([p['runtime'] for p in predictions],cores,threads)
+    
+    if verbose:
+        for p,(start,end) in zip(predictions,schedule):
+            print("{}\t{}\t{:.1f} GB\tstart: {}\tend: {}".format(p['objectid'],dt.timedelta(seconds=round(p['runtime'])),
+                                                               p['maxrss']/1e9,dt.timedelta(seconds=round(start)),dt.timedelta(seconds=round(end))))
+    if outFile:
+        with open(outFile,"w") as f:
+            f.write("objectid,inputsize,runtime,maxrss,start,end\n")
+            for p,(start,end) in zip(predictions,schedule):
+                f.write("{},{},{},{},{},{}\n".format(p['objectid'],p['inputsize'],p['runtime'],p['maxrss'],start,end))
+        print("Predictions written to "+outFile)
+    
+    concurrent=min(len(samples),max(1,cores//threads))
+    peakMemory=sum(sorted([p['maxrss'] for p in predictions],reverse=True)[:concurrent])
+    pu.print_green("Samples: {} Programs: {}".format(len(samples),",".join(programs)))
+    pu.print_green("Estimated makespan on {} cores with {} threads per job: {}".format(cores,threads,dt.timedelta(seconds=round(makespan))))
+    pu.print_green("Estimated peak memory: {:.1f} GB".format(peakMemory/1e9))
+    return makespan
+
+
+def getLatestLog(logDir):
+    """Returns the most recently modified pyrpipe log in a directory
+    """
+    logs=[os.path.join(logDir,f) for f in os.listdir(logDir) if f.endswith("_pyrpipe.log")]
+    if not logs:
+        pu.print_boldred("No pyrpipe logs found in "+logDir)
+        sys.exit(1)
+    return max(logs,key=os.path.getmtime)
+
+
+def watchLog(logFile,interval=10,htmlFile="",once=False,quiet=False):
+    """Follow a log which is being written and show a summary which is refreshed every interval seconds.
+    Only the lines added since the last refresh are read.
+    """
+    from pyrpipe import logtools
+    follower=logtools.LogFollower(logFile)
+    monitor=logtools.RunMonitor()
+    try:
+        while True:
+            monitor.update(follower.read_new())
+            if once and not follower.at_end:
+                continue
+            if not quiet:
+                if not once:
+                    #clear screen
+                    print("\033[2J\033[H",end="")
+                print(logFile)
+                print(monitor.to_text())
+            if htmlFile:
+                tempFile=htmlFile+".tmp"
+                with open(tempFile,"w") as f:
+                    f.write(monitor.to_html(refresh=interval))
+                os.replace(tempFile,htmlFile)
+            if once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return monitor
+
+
+def generateMergedLog(logFiles,outFile,deduplicate=True,verbose=False):
+    """Merge logs from many runs and hosts into one log ordered by start time, with a merged ENV log.
+    Directories are searched for *_pyrpipe.log files.
+    """
+    from pyrpipe import logtools
+    from pyrpipe.prediction import get_log_files
+    logFiles=get_log_files(*logFiles)
+    if verbose:
+        for l in logFiles:
+            pu.print_blue("Merging {}".format(l))
+    written,removed=logtools.merge_logs(logFiles,outFile,deduplicate=deduplicate)
+    pu.print_green("{} commands from {} logs written to {}".format(written,len(logFiles),outFile))
+    if removed>0:
+        pu.print_green("{} failed attempts of retried commands removed".format(removed))
+    return written
 
 
 def report():
@@ -419,6 +875,10 @@ def report():
     parser.add_argument('-o', help='out file \ndefault: same as input logfile',action="store")
     parser.add_argument('-e', help='report output type: [md,pdf,html] \ndefault: pdf',default='pdf',action="store")
     parser.add_argument('-c',help='Report options [(f)ull,fa(i)l,(p)ass]\ndefault: f',default='f',action="store")
+    parser.add_argument('-s',help='Split html report into pages [none,page,objectid]. Pages are written to directory <out file>_report with an index.html \ndefault: none',default='none',choices=['none','page','objectid'],action="store")
+    parser.add_argument('--page-size',help='Commands per page when splitting by page \ndefault: 1000',default=1000,type=int,action="store")
+    parser.add_argument('-j',help='Number of processes to render the report \ndefault: 1',default=1,type=int,action="store")
+    parser.add_argument('--max-lines',help='Show only the first and last N lines of long outputs. Full outputs are linked as text files. \ndefault: 0 (show full output)',default=0,type=int,action="store")
     parser.add_argument('-v',help='verbose',action="store_true")
     parser.add_argument('logfile', help='The log file generated by pyrpipe',action="store")
     args = parser.parse_args(sys.argv[2:])
@@ -431,22 +891,32 @@ def report():
         print("Generating report")
     outFile=""
     if args.o is None:
-        outFile=pu.getFileBaseName(args.logfile)
+        outFile=pu.get_file_basename(args.logfile)
     else:
         outFile=args.o
+    if args.s!='none':
+        if args.e!='html':
+            pu.print_boldred("Split reports are only written as html. Exiting")
+            return
+        generatePagedHTMLReport('simpleDiv.html',logFile,envLog,outFile+"_report",coverage=args.c,pageSize=args.page_size,splitBy=args.s,numJobs=args.j,maxLines=args.max_lines)
+        return
     outFile+='.'+args.e
     
     
     if args.e in ['pdf','html','md']:
-        htmlReport=generateHTMLReport('simpleDiv.html',logFile,envLog,coverage=args.c)
         if args.e=='pdf':
-            writeHtmlToPdf(htmlReport,outFile)
+            htmlFile=generateHTMLReport('simpleDiv.html',logFile,envLog,outFile+".tmp.html",coverage=args.c,numJobs=args.j,maxLines=args.max_lines)
+            writeHtmlToPdf(htmlFile,outFile)
+            os.remove(htmlFile)
         elif args.e=='html':
-            writeHtml(htmlReport,outFile)
+            generateHTMLReport('simpleDiv.html',logFile,envLog,outFile,coverage=args.c,numJobs=args.j,maxLines=args.max_lines)
+            print("Report written to {}".format(outFile))
         elif args.e == 'md':
-            writeHtmlToMarkdown(htmlReport,outFile)
+            htmlFile=generateHTMLReport('simpleDiv.html',logFile,envLog,outFile+".tmp.html",coverage=args.c,numJobs=args.j,maxLines=args.max_lines)
+            writeHtmlToMarkdown(htmlFile,outFile)
+            os.remove(htmlFile)
     else:
-        pu.printBoldRed("unknown extension:"+args.e+". Exiting")
+        pu.print_boldred("unknown extension:"+args.e+". Exiting")
     
     
     
@@ -463,6 +933,9 @@ def shell():
     parser.add_argument('-c',help='Dump command options [(a)ll,fa(i)l,(p)ass]\ndefault: a',default='a',action="store")
     parser.add_argument('-v',help='verbose',action="store_true")
     parser.add_argument('-f',help='Filter by programs. Provide a comma-separated list e.g., prefetch,STAR,bowtie2 \ndefault None')
+    parser.add_argument('-m',help='Script type. bash: all commands in order; make: Makefile with a target per objectid; parallel: bash script running objectids in parallel \ndefault: bash',default='bash',choices=['bash','make','parallel'],action="store")
+    parser.add_argument('-j',help='Number of objectids to run in parallel in make and parallel scripts \ndefault: 1',default=1,type=int,action="store")
+    parser.add_argument('--objectids',help='Use only commands of these objectids, read using a sidecar index of the log (<logfile>.idx). Provide a comma-separated list e.g., SRR1,SRR2 \ndefault None')
     parser.add_argument('logfile', help='The log file generated by pyrpipe',action="store")
     args = parser.parse_args(sys.argv[2:])
     
@@ -473,16 +946,24 @@ def shell():
         print("Generating report")
     outFile=""
     if args.o is None:
-        outFile=pu.getFileBaseName(logFile)
+        outFile=pu.get_file_basename(logFile)
     else:
         outFile=args.o
-    outFile+='.sh'
     
     filters=[]
     if args.f is not None:
         filters= args.f.split(',')
     
-    generateBashScript(logFile,outFile,filters,args.c)
+    objectids=None
+    if args.objectids is not None:
+        objectids=args.objectids.split(',')
+    
+    if args.m=='make':
+        generateMakefile(logFile,outFile+'.mk',filters,args.c,numJobs=args.j,objectids=objectids)
+    elif args.m=='parallel':
+        generateParallelScript(logFile,outFile+'.sh',filters,args.c,numJobs=args.j,objectids=objectids)
+    else:
+        generateBashScript(logFile,outFile+'.sh',filters,args.c,objectids=objectids)
     
 
 def benchmark():
@@ -499,6 +980,9 @@ def benchmark():
     parser.add_argument('-v',help='verbose',action="store_true")
     parser.add_argument('-f',help='Filter by programs. Provide a comma-separated list e.g., prefetch,STAR,bowtie2 \ndefault None')
     parser.add_argument('-t',help='Temporary directory. \ndefault ./tmp',action="store")
+    parser.add_argument('-l',help='Timeline lanes [objectid,slot] \ndefault objectid',default='objectid',choices=['objectid','slot'],action="store")
+    parser.add_argument('--max-lanes',help='Maximum lanes in the timeline. Lanes are grouped for larger runs. \ndefault 100',default=100,type=int,action="store")
+    parser.add_argument('--objectids',help='Use only commands of these objectids, read using a sidecar index of the log (<logfile>.idx). Provide a comma-separated list e.g., SRR1,SRR2 \ndefault None')
     parser.add_argument('logfile', help='The log file generated by pyrpipe',action="store")
     args = parser.parse_args(sys.argv[2:])
     
@@ -510,7 +994,7 @@ def benchmark():
         print("Generating benchmarks")
     outFile=""
     if args.o is None:
-        outFile=pu.getFileBaseName(args.logfile)
+        outFile=pu.get_file_basename(args.logfile)
     else:
         outFile=args.o
     outFile+='.'+args.e
@@ -525,10 +1009,158 @@ def benchmark():
     else:
         tempDir=os.path.join(os.getcwd(),"tmp")
     #create tmp dir
-    if not pu.checkPathsExists(tempDir):
+    if not pu.check_paths_exist(tempDir):
         pu.mkdir(tempDir)
         
-    generateBenchmarkReport(logFile,envLog,filters,tempDir,outFile=outFile,verbose=args.v)
+    objectids=None
+    if args.objectids is not None:
+        objectids=args.objectids.split(',')
+        
+    generateBenchmarkReport(logFile,envLog,filters,tempDir,outFile=outFile,verbose=args.v,lanes=args.l,maxLanes=args.max_lanes,objectids=objectids)
+
+    
+def compare():
+    parser = argparse.ArgumentParser(
+   
+            description='pyrpipe diagnostic utility\nCompare runtimes and memory of two runs. Exits with status 1 if a regression is found.',
+            
+            usage='''pyrpipe_diagnostic compare [<args>] <baselog> <newlog>
+                    
+                    ''')    
+    parser.add_argument('-o', help='out csv file \ndefault: None',action="store")
+    parser.add_argument('-r', help='relative increase reported as regression \ndefault: 0.1',default=0.1,type=float,action="store")
+    parser.add_argument('-a', help='significance level \ndefault: 0.05',default=0.05,type=float,action="store")
+    parser.add_argument('-v',help='verbose',action="store_true")
+    parser.add_argument('-t',help='Temporary directory. \ndefault ./tmp',action="store")
+    parser.add_argument('baselog', help='The log file of the baseline run',action="store")
+    parser.add_argument('newlog', help='The log file of the new run',action="store")
+    args = parser.parse_args(sys.argv[2:])
+    
+    tempDir=""
+    if args.t is not None:
+        tempDir= args.t
+    else:
+        tempDir=os.path.join(os.getcwd(),"tmp")
+    if not pu.check_paths_exist(tempDir):
+        pu.mkdir(tempDir)
+    
+    outFile=""
+    if args.o is not None:
+        outFile=args.o
+    
+    numRegressions=generateComparison(args.baselog,args.newlog,tempDir,outFile=outFile,threshold=args.r,alpha=args.a,verbose=args.v)
+    if numRegressions>0:
+        sys.exit(1)
+
+    
+def trace():
+    parser = argparse.ArgumentParser(
+   
+            description='pyrpipe diagnostic utility\nExport a log as a Chrome trace for Perfetto or chrome://tracing.',
+            
+            usage='''pyrpipe_diagnostic trace [<args>] <logfile>
+                    
+                    ''')    
+    parser.add_argument('-o', help='out file. Files ending with .gz are compressed. \ndefault: <logfile>_trace.json',action="store")
+    parser.add_argument('-l',help='Tracks [objectid,slot] \ndefault objectid',default='objectid',choices=['objectid','slot'],action="store")
+    parser.add_argument('-s',help='csv file with resource samples. Column time has timestamps, other numeric columns are shown as counters \ndefault None',action="store")
+    parser.add_argument('-t',help='Temporary directory. \ndefault ./tmp',action="store")
+    parser.add_argument('--objectids',help='Use only commands of these objectids, read using a sidecar index of the log (<logfile>.idx). Provide a comma-separated list e.g., SRR1,SRR2 \ndefault None')
+    parser.add_argument('logfile', help='The log file generated by pyrpipe',action="store")
+    args = parser.parse_args(sys.argv[2:])
+    
+    logFile=args.logfile
+    envLog=checkEnvLog(logFile)
+    outFile=""
+    if args.o is None:
+        outFile=pu.get_file_basename(logFile)+"_trace.json"
+    else:
+        outFile=args.o
+    #create temp dir
+    tempDir=""
+    if args.t is not None:
+        tempDir= args.t
+    else:
+        tempDir=os.path.join(os.getcwd(),"tmp")
+    if not pu.check_paths_exist(tempDir):
+        pu.mkdir(tempDir)
+    objectids=None
+    if args.objectids is not None:
+        objectids=args.objectids.split(',')
+    
+    generateTrace(logFile,envLog,tempDir,outFile=outFile,lanes=args.l,samplesFile=args.s,objectids=objectids)
+
+    
+def predict():
+    parser = argparse.ArgumentParser(
+   
+            description='pyrpipe diagnostic utility\nPredict runtime and memory of samples from previous logs.',
+            
+            usage='''pyrpipe_diagnostic predict [<args>] <samplesheet> <logfile> [<logfile> ...]
+                    
+                    ''')    
+    parser.add_argument('-o', help='out csv file \ndefault: None',action="store")
+    parser.add_argument('-c', help='Total cores \ndefault: all logical cores',default=os.cpu_count(),type=int,action="store")
+    parser.add_argument('-t', help='Threads per job \ndefault: 1',default=1,type=int,action="store")
+    parser.add_argument('-f',help='Programs run for each sample. Provide a comma-separated list e.g., prefetch,hisat2,stringtie \ndefault all programs in logs')
+    parser.add_argument('-v',help='verbose',action="store_true")
+    parser.add_argument('samplesheet', help='File with an objectid and its input files or input size in bytes on each line',action="store")
+    parser.add_argument('logfile', help='Log files or directories with logs generated by pyrpipe',nargs='+',action="store")
+    args = parser.parse_args(sys.argv[2:])
+    
+    programs=[]
+    if args.f is not None:
+        programs=args.f.split(',')
+    outFile=""
+    if args.o is not None:
+        outFile=args.o
+    
+    generatePrediction(args.samplesheet,args.logfile,programs,args.c,args.t,outFile=outFile,verbose=args.v)
+
+    
+def watch():
+    parser = argparse.ArgumentParser(
+   
+            description='pyrpipe diagnostic utility\nFollow a log during a run and show progress.',
+            
+            usage='''pyrpipe_diagnostic watch [<args>] <logfile or log directory>
+                    
+                    ''')    
+    parser.add_argument('-i', help='Refresh interval in seconds \ndefault: 10',default=10,type=float,action="store")
+    parser.add_argument('-o', help='Also write the summary to this html file \ndefault: None',action="store")
+    parser.add_argument('-q',help='Do not print the summary in the terminal',action="store_true")
+    parser.add_argument('--once',help='Show the summary once and exit',action="store_true")
+    parser.add_argument('logfile', help='The log file generated by pyrpipe or a directory; the latest log in the directory is used \ndefault: ./pyrpipe_logs',nargs='?',default=os.path.join(os.getcwd(),"pyrpipe_logs"),action="store")
+    args = parser.parse_args(sys.argv[2:])
+    
+    logFile=args.logfile
+    if os.path.isdir(logFile):
+        logFile=getLatestLog(logFile)
+    if not pu.check_files_exist(logFile):
+        print("Please check missing log files. Exiting.")
+        sys.exit(1)
+    htmlFile=""
+    if args.o is not None:
+        htmlFile=args.o
+    
+    watchLog(logFile,interval=args.i,htmlFile=htmlFile,once=args.once,quiet=args.q)
+
+
+def merge():
+    parser = argparse.ArgumentParser(
+   
+            description='pyrpipe diagnostic utility\nMerge logs from many runs and hosts into one log ordered by start time.',
+            
+            usage='''pyrpipe_diagnostic merge [<args>] <logfile> [<logfile> ...]
+                    
+                    ''')    
+    parser.add_argument('-o', help='out file. The ENV log is written next to it. \ndefault: merged_pyrpipe.log',default='merged_pyrpipe.log',action="store")
+    parser.add_argument('-k',help='Keep failed attempts of commands retried in the same session',action="store_true")
+    parser.add_argument('-v',help='verbose',action="store_true")
+    parser.add_argument('logfile', help='Log files or directories with logs generated by pyrpipe',nargs='+',action="store")
+    args = parser.parse_args(sys.argv[2:])
+    
+    generateMergedLog(args.logfile,args.o,deduplicate=not args.k,verbose=args.v)
 
     
 def multiqc():
@@ -546,7 +1178,9 @@ def multiqc():
     parser.add_argument('-f',help='Filter by programs. Provide a comma-separated list e.g., prefetch,STAR,bowtie2 \ndefault None')
     parser.add_argument('-t',help='Temporary directory. \ndefault ./tmp',action="store")
     parser.add_argument('-r',help='Remove stdout files after processing. \ndefault ./tmp',action="store_true")
-    parser.add_argument('logfile', help='The log file generated by pyrpipe',action="store")
+    parser.add_argument('-j',help='Number of log segments to read in parallel \ndefault: 1',default=1,type=int,action="store")
+    parser.add_argument('--objectids',help='Use only commands of these objectids, read using a sidecar index of the log (<logfile>.idx). Provide a comma-separated list e.g., SRR1,SRR2 \ndefault None')
+    parser.add_argument('logfile', help='The log file generated by pyrpipe. Several segments of a log e.g. compressed with gzip can be given',nargs='+',action="store")
     args = parser.parse_args(sys.argv[2:])
     
     logFile=args.logfile
@@ -557,7 +1191,7 @@ def multiqc():
         print("Generating benchmarks")
     outFile=""
     if args.o is None:
-        outFile=pu.getFileBaseName(args.logfile)
+        outFile=pu.get_file_basename(args.logfile[0])
     else:
         outFile=args.o
     outFile+='.html'
@@ -573,58 +1207,66 @@ def multiqc():
     else:
         tempDir=os.path.join(os.getcwd(),"tmp")
     #create tmp dir
-    if not pu.checkPathsExists(tempDir):
+    if not pu.check_paths_exist(tempDir):
         pu.mkdir(tempDir) 
     
+    objectids=None
+    if args.objectids is not None:
+        objectids=args.objectids.split(',')
+    
     #run multiqc
-    generateMultiqcReport(logFile,filters,tempDir,outFile=outFile,coverage=args.c,verbose=args.v,cleanup=args.r)
+    generateMultiqcReport(logFile,filters,tempDir,outFile=outFile,coverage=args.c,verbose=args.v,cleanup=args.r,numJobs=args.j,objectids=objectids)
 
 
-##Start parsing
-subcommands=['report','shell','benchmark','multiqc','all']
-parser = argparse.ArgumentParser(
+def main():
+    ##Start parsing
+    subcommands=['report','shell','benchmark','compare','trace','predict','watch','merge','multiqc','all']
+    parser = argparse.ArgumentParser(
             
-            description='pyrpipe diagnostic utility',
+                description='pyrpipe diagnostic utility',
             
-            usage='''pyrpipe_diagnostic <command> [<args>] <logfile>
-                    The commands are:
-                    report     Generate analysis report
-                    bash      Generate all commands to bash script
-                    benchmark Generate bemchmarks
-                    multiqc Generate HTML report using multiqc
+                usage='''pyrpipe_diagnostic <command> [<args>] <logfile>
+                        The commands are:
+                        report     Generate analysis report
+                        bash      Generate all commands to bash script
+                        benchmark Generate bemchmarks
+                        compare   Compare benchmarks of two runs
+                        trace     Export a log as a Chrome trace
+                        predict   Predict runtime of samples from logs
+                        watch     Follow a log and show progress
+                        merge     Merge logs from many runs and hosts
+                        multiqc Generate HTML report using multiqc
                     
-                    ''')
-parser.add_argument('command', help='Subcommand to run [report,bash,benchmark,all]')
-
+                        ''')
+    parser.add_argument('command', help='Subcommand to run [report,bash,benchmark,all]')
 
-#parse first and last argument as subcommand and logfile 
-args = parser.parse_args(sys.argv[1:2])
-if args.command not in subcommands:
-    print ('Unrecognized command')
-    parser.print_help()
-    exit(1)
 
-if args.command == 'report':
-    report()
-elif args.command == 'shell':
-    shell()
-elif args.command == 'benchmark':
-    benchmark()
-elif args.command == 'multiqc':
-    multiqc()
+    #parse first and last argument as subcommand and logfile 
+    args = parser.parse_args(sys.argv[1:2])
+    if args.command not in subcommands:
+        print ('Unrecognized command')
+        parser.print_help()
+        exit(1)
 
+    if args.command == 'report':
+        report()
+    elif args.command == 'shell':
+        shell()
+    elif args.command == 'benchmark':
+        benchmark()
+    elif args.command == 'compare':
+        compare()
+    elif args.command == 'trace':
+        trace()
+    elif args.command == 'predict':
+        predict()
+    elif args.command == 'watch':
+        watch()
+    elif args.command == 'merge':
+        merge()
+    elif args.command == 'multiqc':
+        multiqc()
 
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:31:48 2026
+
+@author: usingh
+
+Benchmark parsing of pyrpipe logs by benchmark.Benchmark using synthetic logs.
+Usage: python tests/benchmark_logparse.py [num_commands ...]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+from datetime import timedelta
+from pyrpipe import benchmark as bm
+
+programs=['prefetch','fasterq-dump','bbduk.sh','hisat2','samtools view','samtools sort','stringtie']
+
+
+def write_synthetic_logs(out_dir,num_commands,seed=1):
+    """Write a pyrpipe log with num_commands commands, one sample per len(programs) commands
+    """
+    random.seed(seed)
+    log_file=os.path.join(out_dir,"synthetic_pyrpipe.log")
+    env_log=os.path.join(out_dir,"synthetic_pyrpipeENV.log")
+    with open(log_file,"w") as f:
+        f.write("#START LOG\n")
+        for i in range(num_commands):
+            program=programs[i%len(programs)]
+            record={'cmd':program+" -p 4 input_"+str(i),
+                    'exitcode':0 if random.random()>0.01 else 1,
+                    'runtime':str(timedelta(seconds=random.randint(0,7200))),
+                    'starttime':"26-10-19 10:00:00",
+                    'stdout':"done",
+                    'stderr':"",
+                    'objectid':"SRR"+str(i//len(programs)),
+                    'commandname':program}
+            f.write(json.dumps(record)+"\n")
+    with open(env_log,"w") as f:
+        f.write("#START LOG\n")
+        f.write(json.dumps({'now':"26-10-19 10:00:00",'python':sys.version.split(" ")[0],'os':sys.platform,'cpu':"8 logical CPU cores",
+                            'syspath':"[]",'sysmodules':"[]"})+"\n")
+        f.write("#PROGRAMS\n")
+    return log_file,env_log
+
+
+def run_benchmark(num_commands):
+    with tempfile.TemporaryDirectory() as out_dir:
+        log_file,env_log=write_synthetic_logs(out_dir,num_commands)
+        time_start=time.perf_counter()
+        ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+        parse_time=time.perf_counter()-time_start
+        time_start=time.perf_counter()
+        ob.get_time_perobject()
+        ob.get_time_perprogram()
+        aggregate_time=time.perf_counter()-time_start
+    print("{:>9} commands: parse {:8.2f}s  aggregate {:8.2f}s".format(num_commands,parse_time,aggregate_time))
+
+
+if __name__ == "__main__":
+    sizes=[int(x) for x in sys.argv[1:]] or [10000,100000,1000000]
+    for n in sizes:
+        run_benchmark(n)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:14:22 2026
+
+@author: usingh
+
+Benchmark startup time of each pyrpipe_diagnostic subcommand using a small synthetic log.
+For each subcommand the time to print help (startup and argument parsing) and the time to run it are reported.
+Heavy modules e.g. pandas or matplotlib imported when printing help are reported, and the exit status is 1 if any are found.
+Usage: python tests/benchmark_startup.py [repeats]
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import tempfile
+from benchmark_logparse import write_synthetic_logs
+
+script=os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","scripts","pyrpipe_diagnostic.py")
+#modules which subcommands must import only when they run
+heavy_modules=['pandas','numpy','matplotlib','seaborn','jinja2','weasyprint','multiqc']
+
+
+def get_commands(out_dir,log_file):
+    """Returns the arguments to run each subcommand
+    """
+    sample_sheet=os.path.join(out_dir,"samples.tsv")
+    with open(sample_sheet,"w") as f:
+        f.write("SRR1\t1000000000\nSRR2\t2000000000\n")
+    commands={'shell':['shell','-o',os.path.join(out_dir,"cmds"),log_file],
+              'report':['report','-e','html','-o',os.path.join(out_dir,"report"),log_file],
+              'benchmark':['benchmark','-t',out_dir,log_file],
+              'compare':['compare','-t',out_dir,log_file,log_file],
+              'trace':['trace','-t',out_dir,'-o',os.path.join(out_dir,"trace.json"),log_file],
+              'predict':['predict','-c','8',sample_sheet,log_file],
+              'watch':['watch','--once','-q',log_file],
+              'merge':['merge','-o',os.path.join(out_dir,"merged_pyrpipe.log"),log_file,log_file]}
+    #multiqc is optional
+    if shutil.which("multiqc"):
+        commands['multiqc']=['multiqc','-t',os.path.join(out_dir,"mqc"),log_file]
+    return commands
+
+
+def time_command(args,repeats):
+    """Returns the minimum wall time of running the script with args
+    """
+    times=[]
+    for i in range(repeats):
+        time_start=time.perf_counter()
+        subprocess.run([sys.executable,script]+args,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter()-time_start)
+    return min(times)
+
+
+def get_eager_imports(name):
+    """Returns the heavy modules imported when printing the help of a subcommand
+    """
+    code=("import sys,runpy\n"
+          "sys.argv=[{script!r},{name!r},'--help']\n"
+          "try:\n"
+          "    runpy.run_path({script!r},run_name='__main__')\n"
+          "except SystemExit:\n"
+          "    pass\n"
+          "print('IMPORTED:'+','.join([m for m in {modules!r} if m in sys.modules]))").format(script=script,name=name,modules=heavy_modules)
+    result=subprocess.run([sys.executable,'-c',code],stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,universal_newlines=True)
+    #help is printed to stdout before the imported modules
+    lines=[l for l in result.stdout.splitlines() if l.startswith("IMPORTED:")]
+    return [m for m in lines[-1][len("IMPORTED:"):].split(",") if m] if lines else []
+
+
+def run_benchmark(repeats=3):
+    """Returns the number of subcommands which import heavy modules at startup
+    """
+    num_eager=0
+    with tempfile.TemporaryDirectory() as out_dir:
+        log_file,env_log=write_synthetic_logs(out_dir,100)
+        os.makedirs(os.path.join(out_dir,"mqc"))
+        for name,args in get_commands(out_dir,log_file).items():
+            help_time=time_command([name,'--help'],repeats)
+            run_time=time_command(args,repeats)
+            eager=get_eager_imports(name)
+            print("{:>10}: help {:6.2f}s  run {:6.2f}s  {}".format(name,help_time,run_time,"eager imports: "+",".join(eager) if eager else ""))
+            if eager:
+                num_eager+=1
+    return num_eager
+
+
+if __name__ == "__main__":
+    repeats=int(sys.argv[1]) if len(sys.argv)>1 else 3
+    if run_benchmark(repeats)>0:
+        sys.exit(1)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:05:12 2026
+
+@author: usingh
+"""
+
+import os
+import json
+from pyrpipe import pyrpipe_utils as pu
+from pyrpipe import benchmark as bm
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def write_test_logs(out_dir,records):
+    """Write a pyrpipe log and an ENV log with the given command records
+    """
+    if not pu.check_paths_exist(out_dir):
+        pu.mkdir(out_dir)
+    log_file=os.path.join(out_dir,"test_pyrpipe.log")
+    env_log=os.path.join(out_dir,"test_pyrpipeENV.log")
+    with open(log_file,"w") as f:
+        f.write("#START LOG\n")
+        for r in records:
+            f.write(json.dumps(r)+"\n")
+    with open(env_log,"w") as f:
+        f.write("#START LOG\n")
+        f.write(json.dumps({'now':"26-10-19 10:00:00",'python':"Python 3",'os':"Linux",'cpu':"8 logical CPU cores",'syspath':"[]",'sysmodules':"[]"})+"\n")
+        f.write("#PROGRAMS\n")
+    return log_file,env_log
+
+
+def make_record(program,objectid,runtime,exitcode=0,starttime="26-10-19 10:00:00"):
+    return {'cmd':program+" -p 4",'exitcode':exitcode,'runtime':runtime,'starttime':starttime,
+            'stdout':"",'stderr':"",'objectid':objectid,'commandname':program}
+
+
+def test_parse_logs():
+    records=[make_record("hisat2","SRR1","0:00:10"),
+             make_record("hisat2","SRR2","0:00:30"),
+             make_record("samtools sort","SRR1","0:01:00"),
+             make_record("samtools sort","SRR1","0:00:20"),
+             make_record("stringtie","SRR2","1 day, 0:00:05"),
+             make_record("stringtie","SRR1","0:00:07",exitcode=1),
+             make_record("samtools merge","NA","0:00:02",exitcode='-1')]
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    log_file,env_log=write_test_logs(out_dir,records)
+    ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+    
+    assert ob.log_data.shape[0]==7, "Failed to parse all commands"
+    assert ob.runtimes_by_prog['samtools sort']==[60,20], "Failed runtimes by program"
+    assert ob.runtimes_by_prog['stringtie']==[86405], "Failed to parse days"
+    assert ob.runtimes_by_object['SRR1']=={'hisat2':[10],'samtools sort':[60,20]}, "Failed runtimes by object"
+    
+    per_object=ob.get_time_perobject()
+    srr1=per_object[per_object['id']=='SRR1'].iloc[0]
+    assert srr1['total']==90 and srr1['samtools sort']==80, "Failed time per object"
+    mean_object=ob.get_time_perobject(func="mean")
+    assert mean_object[mean_object['id']=='SRR1'].iloc[0]['samtools sort']==40, "Failed mean time per object"
+    
+    per_program=ob.get_time_perprogram()
+    assert list(per_program['program'])==['hisat2','samtools sort','stringtie'], "Failed programs"
+    assert list(per_program['total'])==[40,80,86405], "Failed total per program"
+    assert list(per_program['average'])==[20,40,86405], "Failed average per program"
+
+
+def test_box_data():
+    records=[make_record("hisat2","SRR"+str(i),"0:00:"+str(10+i)) for i in range(5)]
+    records+=[make_record("stringtie","SRR"+str(i),"0:00:05") for i in range(3)]
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    log_file,env_log=write_test_logs(out_dir,records)
+    ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+    
+    box_data=ob.get_programtime_boxdata()
+    assert box_data.shape==(8,2), "Failed box data shape"
+    assert list(box_data[box_data['name']=='hisat2']['data'])==[10,11,12,13,14], "Failed box data"
+    wide=ob.get_programtime_widedata()
+    assert list(wide.columns)==['hisat2','stringtie'] and wide.shape[0]==5, "Failed wide data"
+    assert wide['stringtie'].isna().sum()==2, "Failed wide data padding"
+    
+    ob.plot_time_perprogram()
+    ob.plot_time_perobject()
+    for f in ['time_per_program.png','program_boxplots.png','program_summary.png','time_per_program.csv','program_box_data.csv','time_per_object.png']:
+        assert pu.check_files_exist(os.path.join(ob.benchmark_dir,f)), "Failed to write "+f
+
+
+def test_mixed_runtime_formats():
+    records=[make_record("hisat2","SRR1","0:00:10"),
+             make_record("hisat2","SRR2",0.25,starttime="2026-10-19T10:00:00+00:00")]
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    log_file,env_log=write_test_logs(out_dir,records)
+    ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+    assert ob.runtimes_by_prog['hisat2']==[10,0.25], "Failed to parse runtimes"
+
+
+def test_mixed_starttime_formats():
+    records=[make_record("hisat2","SRR1",10.0,starttime="2026-10-19T10:00:00+02:00"),
+             make_record("hisat2","SRR2",10.0,starttime="2026-10-19T08:00:05+00:00"),
+             make_record("hisat2","SRR3",10.0,starttime="26-10-19 10:00:00")]
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    ob=bm.Benchmark(*write_test_logs(out_dir,records),out_dir=out_dir)
+    starttimes=ob.parse_starttimes(ob.log_data['starttime'])
+    assert (starttimes[1]-starttimes[0]).total_seconds()==5, "Failed to convert start times to UTC"
+    assert ob.get_timeline().shape[0]==3 and ob.get_parallel_efficiency() is not None, "Failed timeline with mixed start times"
+
+
+def test_parallel_efficiency():
+    #two samples running in parallel on 8 cores, SRR2 waits for a core
+    records=[make_record("hisat2","SRR1",100.0,starttime="2026-10-19T10:00:00+00:00"),
+             make_record("hisat2","SRR2",100.0,starttime="2026-10-19T10:00:00+00:00"),
+             make_record("stringtie","SRR1",50.0,starttime="2026-10-19T10:01:40+00:00"),
+             make_record("stringtie","SRR2",50.0,starttime="2026-10-19T10:02:30+00:00")]
+    records[2]['cmd']="stringtie -p 2 in.bam"
+    records[3]['cmd']="stringtie in.bam"
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    log_file,env_log=write_test_logs(out_dir,records)
+    ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+    
+    timeline=ob.get_timeline()
+    assert list(timeline['threads'])==[4,4,2,1], "Failed to parse threads"
+    summary=ob.get_parallel_efficiency()
+    assert summary['makespan']==200, "Failed makespan"
+    assert summary['max_concurrency']==2, "Failed max concurrency"
+    assert summary['average_concurrency']==1.5, "Failed average concurrency"
+    assert summary['total_cores']==8, "Failed to read cores from ENV log"
+    assert abs(summary['core_utilization']-(800+100+50)/(200*8))<1e-9, "Failed core utilization"
+    assert summary['critical_object']=='SRR2', "Failed critical object"
+    
+    paths=ob.get_critical_paths().set_index('objectid')
+    assert paths.loc['SRR2','wait']==50 and paths.loc['SRR2','critical_stage']=='hisat2', "Failed critical path"
+    stages=ob.get_gating_stages().set_index('program')
+    assert stages.loc['hisat2','occupancy']==0.5, "Failed occupancy"
+    assert stages.loc['hisat2','concurrency_when_running']==2, "Failed concurrency of stage"
+    #spans are 150 and 200 with 50 waiting
+    assert abs(stages.loc['hisat2','critical_path_share']-200/350)<1e-9 and abs(stages.loc['stringtie','critical_path_share']-100/350)<1e-9, "Failed critical path share"
+    
+    ob.write_efficiency_report()
+    assert pu.check_files_exist(os.path.join(ob.benchmark_dir,'gating_stages.csv')), "Failed to write report"
+
+
+def test_timeline():
+    records=[]
+    for i in range(30):
+        #commands of neighbouring objects overlap
+        records.append(make_record("hisat2","SRR"+str(i),90.0,starttime="2026-10-19T10:{:02d}:00+00:00".format(i)))
+        records.append(make_record("hisat2","SRR"+str(i),1.0,starttime="2026-10-19T10:{:02d}:35+00:00".format(i+1)))
+    out_dir=os.path.join(testVars.testDir,"benchmark_test")
+    log_file,env_log=write_test_logs(out_dir,records)
+    ob=bm.Benchmark(log_file,env_log,out_dir=out_dir)
+    
+    slots=ob.get_timeline_bars(lanes="slot",time_bins=100000)
+    assert slots['lane'].max()==1, "Failed to assign worker slots"
+    bars=ob.get_timeline_bars(lanes="objectid",time_bins=100000)
+    assert bars.shape[0]==60 and bars['lane'].max()==29, "Failed lanes per object"
+    #coarse bins merge the two commands of each object
+    bars=ob.get_timeline_bars(lanes="objectid",time_bins=10)
+    assert bars.shape[0]==30, "Failed to merge bars"
+    bars=ob.get_timeline_bars(lanes="objectid",max_lanes=10,time_bins=10)
+    assert bars['lane'].max()==9 and bars['label'].iloc[0]=="SRR0 .. SRR2", "Failed to group lanes"
+    
+    ob.plot_timeline(lanes="slot")
+    assert pu.check_files_exist(os.path.join(ob.benchmark_dir,'timeline_slot.png')), "Failed timeline plot"
+
+
+def test_compare():
+    base_records=[]
+    new_records=[]
+    for i in range(10):
+        base_records.append(make_record("hisat2","SRR"+str(i),100.0+i))
+        new_records.append(make_record("hisat2","SRR"+str(i),130.0+i))
+        base_records.append(make_record("stringtie","SRR"+str(i),20.0+i))
+        new_records.append(make_record("stringtie","SRR"+str(i),20.0+(i+3)%10))
+        base_records[-1]['maxrss']=1000
+        new_records[-1]['maxrss']=2000
+    base=bm.Benchmark(*write_test_logs(os.path.join(testVars.testDir,"benchmark_base"),base_records),out_dir=testVars.testDir)
+    new=bm.Benchmark(*write_test_logs(os.path.join(testVars.testDir,"benchmark_new"),new_records),out_dir=testVars.testDir)
+    
+    result=base.compare(new,threshold=0.1).set_index('program')
+    assert result.loc['hisat2','regression'], "Failed to detect slower program"
+    assert result.loc['hisat2','paired_objects']==10, "Failed to pair objects"
+    assert abs(result.loc['hisat2','delta_runtime']-30/104.5)<1e-9, "Failed runtime delta"
+    assert result.loc['stringtie','delta_runtime']==0, "Failed unchanged program"
+    assert result.loc['stringtie','delta_maxrss']==1, "Failed memory delta"
+    assert result.loc['stringtie','regression'], "Failed to detect memory regression"
+    #no regressions against itself
+    assert not base.compare(base)['regression'].any(), "Failed self comparison"
+
+def test_program_statistics():
+    records=[]
+    for i in range(10):
+        #1 GB input for each sample, SRR9 is ten times slower
+        runtime=1000.0 if i==9 else 100.0+i
+        records.append(make_record("hisat2","SRR"+str(i),runtime))
+        records[-1]['inputsize']=10**9
+    ob=bm.Benchmark(*write_test_logs(os.path.join(testVars.testDir,"benchmark_stats"),records),out_dir=testVars.testDir)
+    
+    stats=ob.get_program_statistics().set_index('program')
+    assert stats.loc['hisat2','commands']==10, "Failed command count"
+    assert stats.loc['hisat2','max']==1000, "Failed max"
+    assert stats.loc['hisat2','p50']==104.5, "Failed median"
+    assert stats.loc['hisat2','cv']>1, "Failed coefficient of variation"
+    
+    outliers=ob.get_outliers()
+    assert list(outliers['objectid'])==["SRR9"], "Failed to detect outlier"
+    assert outliers['runtime_per_gb'][0]==1000, "Failed runtime per GB"
+    
+    ob.write_statistics_report()
+    assert pu.check_files_exist(os.path.join(ob.benchmark_dir,"program_statistics.csv"),os.path.join(ob.benchmark_dir,"outliers.csv")), "Failed to write statistics"
+
+
+def test_throughput():
+    records=[]
+    for i in range(4):
+        records.append(make_record("hisat2","SRR"+str(i),10.0*(i+1)))
+        records[-1]['inputsize']=(i+1)*10**8
+        records[-1]['reads']=(i+1)*10**6
+    records.append(make_record("stringtie","SRR0",5.0))
+    ob=bm.Benchmark(*write_test_logs(os.path.join(testVars.testDir,"benchmark_throughput"),records),out_dir=testVars.testDir)
+    
+    result=ob.get_throughput().set_index('program')
+    assert result.loc['hisat2','reads_per_second']==10**5, "Failed reads per second"
+    assert result.loc['hisat2','mb_per_second']==10, "Failed MB per second"
+    #commands use 4 threads
+    assert result.loc['hisat2','reads_per_second_per_thread']==25000, "Failed reads per second per thread"
+    assert result.loc['hisat2','mb_per_second_per_thread']==2.5, "Failed MB per second per thread"
+    assert result['reads_per_second'].isna()['stringtie'], "Failed unknown reads"
+
+
+def test_trace():
+    records=[make_record("hisat2","SRR0",10.0,starttime="2026-10-19T10:00:00+00:00"),
+             make_record("hisat2","SRR1",10.0,starttime="2026-10-19T10:00:05+00:00"),
+             make_record("samtools","SRR0",2.0,exitcode=1,starttime="2026-10-19T10:00:10+00:00")]
+    records[0]['cputime']=40.0
+    records[0]['maxrss']=10**9
+    records[1]['cmd']="hisat2 -p 4 | samtools view -b"
+    out_dir=os.path.join(testVars.testDir,"benchmark_trace")
+    ob=bm.Benchmark(*write_test_logs(out_dir,records),out_dir=out_dir)
+    
+    counters=ob.get_resource_counters().set_index('time')
+    assert counters.loc[5.0,'threads']==8 and counters.loc[5.0,'cpu']==4 and counters.loc[5.0,'maxrss']==10**9, "Failed resource counters"
+    assert counters.loc[10.0,'threads']==8 and counters.loc[10.0,'cpu']==0, "Failed resource counters at end"
+    with open(os.path.join(out_dir,"samples.csv"),"w") as f:
+        f.write("time,load\n2026-10-19T10:00:01+00:00,3.5\n")
+    trace=ob.write_trace(out_file=os.path.join(out_dir,"trace.json"),samples_file=os.path.join(out_dir,"samples.csv"))
+    with open(trace) as f:
+        events=json.load(f)['traceEvents']
+    spans=[e for e in events if e['ph']=='X']
+    assert len(spans)==5 and spans[1]['ts']==5*10**6 and spans[1]['dur']==10**7, "Failed command spans"
+    assert [e['name'] for e in spans[2:4]]==["hisat2","samtools"] and spans[4]['cname']=='bad', "Failed piped sub-commands"
+    assert len({e['tid'] for e in spans[1:4]})==3 and spans[0]['tid'] not in {e['tid'] for e in spans[1:4]}, "Failed tracks per pipe stage"
+    assert {e['args']['name'] for e in events if e['name']=='thread_name'}=={"SRR0","SRR1","SRR1 stage 1","SRR1 stage 2"}, "Failed tracks per objectid"
+    assert [e['args']['load'] for e in events if e['name']=='load']==[3.5], "Failed resource samples"
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:12:09 2026
+
+@author: usingh
+"""
+
+import os
+from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_utils as pu
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def get_last_record():
+    records=list(pu.read_log_records(pe.pyrpipeLoggerObject.log_path))
+    return records[-1]
+
+
+def test_command_timing():
+    st=pe.execute_command(['sleep','0.2'],quiet=True,objectid="test")
+    assert st, "Failed to execute command"
+    record=get_last_record()
+    assert isinstance(record['runtime'],float), "Runtime not saved as seconds"
+    assert 0.15<record['runtime']<5, "Failed sub-second runtime"
+    start=pu.parse_timestamp(record['starttime'])
+    end=pu.parse_timestamp(record['endtime'])
+    assert abs((end-start).total_seconds()-record['runtime'])<0.001, "Failed start and end time"
+
+
+def test_parse_old_format():
+    assert pu.parse_runtime("0:01:05")==65, "Failed old runtime"
+    assert pu.parse_runtime("2 days, 0:00:01")==172801, "Failed days runtime"
+    assert pu.parse_runtime(1.5)==1.5, "Failed new runtime"
+    assert pu.parse_timestamp("19-12-21 16:58:13").year==2019, "Failed old timestamp"
+    assert pu.parse_timestamp("2026-10-19T18:12:09.120000+00:00").microsecond==120000, "Failed ISO timestamp"
+
+
+def test_command_resources():
+    st=pe.execute_command(['python3','-c','x=bytearray(50*1024*1024); sum(range(3000000))'],quiet=True)
+    assert st, "Failed to execute command"
+    record=get_last_record()
+    assert record['cputime']>0, "Failed to log cpu time"
+    assert record['maxrss']>=50*1024*1024, "Failed to log peak memory"
+    st=pe.execute_command(['python3','-c','import sys; print("out"); sys.exit(3)'],quiet=True)
+    record=get_last_record()
+    assert not st and record['exitcode']==3 and record['stdout'].strip()=="out", "Failed exit code"
+
+
+def test_command_throughput():
+    reads="tests/test_files/euk_1000_rRNA.fa"
+    st=pe.execute_command(['python3','-c','print("1,000 reads; of these:")',reads],quiet=True)
+    assert st, "Failed to execute command"
+    record=get_last_record()
+    assert record['inputsize']==os.path.getsize(reads), "Failed to log input size"
+    assert record['reads']==1000, "Failed to log reads"
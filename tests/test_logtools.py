@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 11:48:26 2026
+
+@author: usingh
+"""
+
+import os
+import json
+import gzip
+from pyrpipe import pyrpipe_utils as pu
+from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import logtools
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def test_follow_log():
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    log_file=os.path.join(testVars.testDir,"follow_pyrpipe.log")
+    running={'cmd':"hisat2 -p 4",'starttime':"2026-10-20T10:00:00+00:00",'objectid':"SRR1",'commandname':"hisat2"}
+    done={**running,'exitcode':0,'runtime':10.0,'endtime':"2026-10-20T10:00:10+00:00"}
+    follower=logtools.LogFollower(log_file)
+    monitor=logtools.RunMonitor()
+    with open(log_file,"w") as f:
+        f.write("#START LOG\n#RUNNING "+json.dumps(running)+"\n")
+        #incomplete line
+        f.write(json.dumps(done)[:10])
+    monitor.update(follower.read_new())
+    assert len(monitor.running)==1 and monitor.num_commands==0, "Failed to follow running command"
+    with open(log_file,"a") as f:
+        f.write(json.dumps(done)[10:]+"\n")
+        f.write(json.dumps({**done,'cmd':"stringtie",'commandname':"stringtie",'exitcode':1})+"\n")
+    assert monitor.update(follower.read_new())==2, "Failed to read new lines only"
+    assert len(monitor.running)==0, "Failed to finish running command"
+    assert monitor.programs['hisat2']['total_runtime']==10 and monitor.num_failed==1, "Failed aggregates"
+    assert follower.read_new()==[], "Failed to skip old lines"
+    assert "hisat2" in monitor.to_text() and "stringtie" in monitor.to_html(), "Failed summary"
+    #read a large backlog over several calls
+    with open(log_file,"a") as f:
+        for i in range(50):
+            f.write(json.dumps({**done,'cmd':"stringtie "+str(i),'commandname':"stringtie"})+"\n")
+    follower=logtools.LogFollower(log_file,max_bytes=4096,chunk_size=100)
+    lines=follower.read_new()
+    assert not follower.at_end and 0<len(lines)<53 and follower.offset<=4096, "Failed to cap bytes read"
+    while not follower.at_end:
+        lines.extend(follower.read_new())
+    assert len(lines)==54 and json.loads(lines[-1])['cmd']=="stringtie 49", "Failed to read backlog"
+
+
+def test_running_record():
+    st=pe.execute_command(['python3','-c','pass'],quiet=True,objectid="SRR2")
+    assert st, "Failed to execute command"
+    with open(pe.pyrpipeLoggerObject.log_path) as f:
+        lines=f.read().splitlines()
+    monitor=logtools.RunMonitor()
+    monitor.update(lines)
+    assert "#RUNNING " in lines[-2] and len(monitor.running)==0, "Failed to log running command"
+
+
+def test_log_index():
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    log_file=os.path.join(testVars.testDir,"index_pyrpipe.log")
+    records=[{'cmd':"prog{} -i x".format(i%3),'exitcode':int(i%4==0),'runtime':1.0,'objectid':"SRR{}".format(i%5),
+              'commandname':"prog{}".format(i%3),'stdout':"out\t{}\n".format(i)} for i in range(20)]
+    with open(log_file,"w") as f:
+        f.write("#START LOG\n")
+        for r in records[:10]:
+            f.write(json.dumps(r)+"\n")
+    #index of an earlier run
+    if pu.check_files_exist(log_file+".idx"):
+        os.remove(log_file+".idx")
+    index=logtools.LogIndex(log_file)
+    assert index.update()==10, "Failed to index log"
+    assert index.update()==0, "Failed to skip indexed commands"
+    #append and extend the index
+    with open(log_file,"a") as f:
+        for r in records[10:]:
+            f.write(json.dumps(r)+"\n")
+        f.write(json.dumps(records[0])[:10])
+    assert index.update()==10, "Failed to extend index"
+    found=list(index.read_records(objectids=["SRR1","SRR2"]))
+    assert found==[r for r in records if r['objectid'] in ["SRR1","SRR2"]], "Failed to read records by objectid"
+    found=list(index.read_records(programs=["prog0"],status="fail"))
+    assert found==[r for r in records if r['commandname']=="prog0" and r['exitcode']!=0], "Failed to read records by program and status"
+    #replaced log is indexed again
+    with open(log_file,"w") as f:
+        f.write(json.dumps(records[3])+"\n")
+    assert index.update()==1 and list(logtools.LogIndex(log_file).read_records())==[records[3]], "Failed to rebuild index"
+    #replaced by a larger log
+    with open(log_file,"w") as f:
+        for r in records[5:]:
+            f.write(json.dumps(r)+"\n")
+    assert index.update()==15 and list(index.read_records())==records[5:], "Failed to rebuild index of larger log"
+
+
+def test_merge_logs():
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    logs=[]
+    #(start second, cmd, objectid, exitcode)
+    commands={"node1":[(3,"prog -i 3","SRR1",0),(1,"prog -i 1","SRR1",1),(5,"prog -i 1","SRR1",0),(6,"index","NA",0)],
+              "node2":[(2,"prog -i 2","SRR1",0),(4,"prog -i 0","SRR1",0),(7,"index","NA",0),(8,"prog -i 2","SRR1",0)]}
+    for host,host_commands in commands.items():
+        #node2 log is compressed
+        log_file=os.path.join(testVars.testDir,host+"_pyrpipe.log"+(".gz" if host=="node2" else ""))
+        with (gzip.open(log_file,"wt") if host=="node2" else open(log_file,"w")) as f:
+            f.write("#START LOG\n")
+            for t,cmd,objectid,exitcode in host_commands:
+                f.write(json.dumps({'cmd':cmd,'exitcode':exitcode,'runtime':1.0,'objectid':objectid,'commandname':cmd.split(" ")[0],
+                                    'starttime':"2026-10-20T10:00:0{}+00:00".format(t),'stdout':""})+"\n")
+        with open(os.path.join(testVars.testDir,host+"_pyrpipeENV.log"),"w") as f:
+            f.write("#START LOG\n"+json.dumps({'host':host,'session':host+"_run",'cpu':"8 logical CPU cores"})+"\n#PROGRAMS\n")
+            f.write(json.dumps({'name':"prog",'version':"1.0"})+"\n")
+        logs.append(log_file)
+    out_file=os.path.join(testVars.testDir,"merged_pyrpipe.log")
+    #failed prog -i 1 at 1 is retried at 5 on node1; successful repeats are kept
+    assert logtools.merge_logs(logs,out_file)==(7,1), "Failed to merge logs"
+    records=list(pu.read_log_records(out_file))
+    assert [r['starttime'][17:19] for r in records]==["02","03","04","05","06","07","08"], "Failed to sort merged log"
+    assert [r['host'] for r in records]==["node2","node1","node2","node1","node1","node2","node2"], "Failed to tag merged log"
+    assert records[3]['attempts']==2 and 'attempts' not in records[6], "Failed to count attempts"
+    sys_info,programs=pu.parse_env_log(logtools.get_env_log(out_file))
+    assert sys_info['cpu'].startswith("16 ") and "prog" in programs, "Failed to write merged ENV log"
+    assert logtools.merge_logs(logs,out_file,deduplicate=False)==(8,0), "Failed to keep retried commands"
+
+
+def test_merge_mixed_times():
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    logs=[]
+    for name,starttime in [("old","26-10-20 10:00:01"),("new","2026-10-20T10:00:02+02:00")]:
+        log_file=os.path.join(testVars.testDir,name+"_pyrpipe.log")
+        with open(log_file,"w") as f:
+            f.write(json.dumps({'cmd':"prog "+name,'exitcode':0,'runtime':1.0,'objectid':"SRR1",'starttime':starttime})+"\n")
+        logs.append(log_file)
+    out_file=os.path.join(testVars.testDir,"merged_pyrpipe.log")
+    logtools.merge_logs(logs,out_file)
+    starttimes=[pu.parse_timestamp(r['starttime']) for r in pu.read_log_records(out_file)]
+    assert all([t.utcoffset().total_seconds()==0 for t in starttimes]), "Failed to save start times in UTC"
+    assert starttimes==sorted(starttimes), "Failed to sort mixed start times"
@@ -10,6 +10,7 @@ from pyrpipe import mapping
 from pyrpipe import pyrpipe_utils as pu
 from testingEnvironment import testSpecs
 import os
+from types import SimpleNamespace
 
 testVars=testSpecs()
 
@@ -54,6 +55,42 @@ def test_star():
 
 
 
+def test_star_batch_alignment(monkeypatch):
+    #STAR is not run; commands are recorded and the alignment of SRR2 fails
+    commands=[]
+    def execute_command(cmd,**kwargs):
+        commands.append(cmd)
+        return "SRR2" not in " ".join(cmd)
+    monkeypatch.setattr(mapping.pe,"check_dependencies",lambda deps: True)
+    monkeypatch.setattr(mapping.pe,"execute_command",execute_command)
+    monkeypatch.setattr(mapping.Star,"check_index",lambda self,full_verify=False: True)
+    star=mapping.Star(star_index="")
+    star.star_index="starIndex"
+    samples=[SimpleNamespace(srr_accession=s,layout="SINGLE",localfastqPath=s+".fastq",location=testVars.testDir) for s in ["SRR1","SRR2","SRR3"]]
+    out_dir=os.path.join(testVars.testDir,"star_batch")
+    results=star.perform_batch_alignment(samples,out_dir=out_dir,quiet=True)
+    
+    modes=[c[c.index('--genomeLoad')+1] for c in commands]
+    assert modes==["LoadAndExit","LoadAndKeep","LoadAndKeep","LoadAndKeep","Remove"], "Failed genome load order"
+    assert results["SRR1"]==os.path.join(out_dir,"SRR1") and results["SRR2"]=="", "Failed batch results"
+    assert set(star.batch_runtimes['alignment'].keys())=={"SRR1","SRR2","SRR3"}, "Failed batch runtimes"
+    
+    #genome is removed when an alignment raises an error
+    def raise_error(cmd,**kwargs):
+        commands.append(cmd)
+        if "LoadAndKeep" in cmd:
+            raise OSError("alignment error")
+        return True
+    monkeypatch.setattr(mapping.pe,"execute_command",raise_error)
+    commands.clear()
+    try:
+        star.perform_batch_alignment(samples,out_dir=out_dir,quiet=True)
+        raised=False
+    except OSError:
+        raised=True
+    assert raised and commands[-1][commands[-1].index('--genomeLoad')+1]=="Remove", "Failed to remove genome after error"
+
+
 def test_bowtie():
     bt=mapping.Bowtie2(bowtie2_index="")
     assert bt.check_index()==False, "Failed bowtie2 check_index"
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:10:44 2026
+
+@author: usingh
+"""
+
+import os
+import json
+from pyrpipe import pyrpipe_utils as pu
+from pyrpipe import prediction
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def write_training_log(out_dir):
+    """Write a log where hisat2 runtime is 10s per GB on one thread and scales linearly with threads
+    """
+    if not pu.check_paths_exist(out_dir):
+        pu.mkdir(out_dir)
+    log_file=os.path.join(out_dir,"train_pyrpipe.log")
+    with open(log_file,"w") as f:
+        f.write("#START LOG\n")
+        for gb in [1,2,4,8]:
+            for threads in [1,2,4]:
+                record={'cmd':"hisat2 -p {}".format(threads),'exitcode':0,'runtime':10.0*gb/threads,'objectid':"SRR"+str(gb),
+                        'commandname':"hisat2",'inputsize':gb*10**9,'maxrss':10**9+gb*10**8}
+                f.write(json.dumps(record)+"\n")
+        #failed commands are ignored
+        f.write(json.dumps({'cmd':"hisat2 -p 1",'exitcode':1,'runtime':1000.0,'commandname':"hisat2",'inputsize':10**9})+"\n")
+    return log_file
+
+
+def test_runtime_model():
+    log_file=write_training_log(os.path.join(testVars.testDir,"prediction"))
+    model=prediction.RuntimeModel()
+    assert model.add_logs(log_file)==12, "Failed to read logs"
+    model.fit()
+    result=model.predict("hisat2",16*10**9,threads=8)
+    assert abs(result['runtime']-20)<1e-6, "Failed runtime prediction"
+    assert abs(result['maxrss']-(10**9+16*10**8))<1, "Failed memory prediction"
+    assert model.predict("STAR",10**9) is None, "Failed unknown program"
+    
+    model_file=os.path.join(testVars.testDir,"prediction","model.json")
+    model.save(model_file)
+    loaded=prediction.RuntimeModel()
+    loaded.load(model_file)
+    assert abs(loaded.predict("hisat2",10**9,threads=1)['runtime']-10)<1e-6, "Failed to load model"
+
+
+def test_makespan():
+    makespan,schedule=prediction.estimate_makespan([10,10,10,10,20],8,threads=4)
+    assert makespan==30, "Failed makespan"
+    assert schedule[4]==(0,20), "Failed longest job first"
+    assert prediction.estimate_makespan([10,10],1,threads=4)[0]==20, "Failed fewer cores than threads"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:10:22 2026
+
+@author: usingh
+"""
+
+import os
+import shutil
+from pyrpipe import pyrpipe_registry as reg
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def test_registry_reuse():
+    cache_dir=os.path.join(testVars.testDir,"index_cache")
+    shutil.rmtree(cache_dir,ignore_errors=True)
+    registry=reg.IndexRegistry(cache_dir)
+    builds=[]
+    def build(path):
+        builds.append(path)
+        with open(os.path.join(path,"index.idx"),"w") as f:
+            f.write("index")
+        return True
+    
+    index1=registry.get_or_build("test-build",[testVars.rRNAfa],{'-k':"31",'-p':"4"},build,ignore_args=['-p'])
+    assert index1 and len(builds)==1, "Failed to build index in registry"
+    #same inputs and different threads reuse the index
+    index2=registry.get_or_build("test-build",[testVars.rRNAfa],{'-k':"31",'-p':"8"},build,ignore_args=['-p'])
+    assert index2==index1 and len(builds)==1, "Failed to reuse index"
+    assert registry.lookup("test-build",[testVars.rRNAfa],{'-k':"31"})==index1, "Failed lookup"
+    #different parameters build a new index
+    index3=registry.get_or_build("test-build",[testVars.rRNAfa],{'-k':"25"},build)
+    assert index3!=index1 and len(builds)==2, "Failed to detect changed parameters"
+    
+    
+def test_registry_failed_build():
+    cache_dir=os.path.join(testVars.testDir,"index_cache")
+    registry=reg.IndexRegistry(cache_dir)
+    index=registry.get_or_build("test-fail",[testVars.rRNAfa],{},lambda path: False)
+    assert index=="", "Failed build returned an index"
+    assert registry.lookup("test-fail",[testVars.rRNAfa],{})=="", "Failed build registered"
+
+
+def test_registry_key_values():
+    registry=reg.IndexRegistry(os.path.join(testVars.testDir,"index_cache"))
+    #numbers and flags are keyed as strings
+    key=registry.get_key("test-build",[testVars.rRNAfa],{'-p':8,'--large-index':True,'--ss':["a","b"]})
+    assert key==registry.get_key("test-build",[testVars.rRNAfa],{'-p':"8",'--large-index':"True",'--ss':("a","b")}), "Failed key of non string arguments"
+    assert key!=registry.get_key("test-build",[testVars.rRNAfa],{'-p':8,'--large-index':False,'--ss':["a","b"]}), "Failed to detect changed flag"
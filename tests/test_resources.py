@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:02:45 2026
+
+@author: usingh
+"""
+
+import os
+import json
+from pyrpipe import pyrpipe_resources as pr
+from pyrpipe import pyrpipe_utils as pu
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def test_threads_allocation():
+    rm=pr.ResourceManager(total_cores=16,max_jobs=4)
+    #single job gets all cores
+    args,job=rm.acquire("hisat2",{},['-p'])
+    assert args['-p']=="16", "Failed to scale up single job"
+    rm.release(job)
+    assert rm.get_used_cores()==0, "Failed to release cores"
+    
+    #queued jobs share the cores
+    rm.set_queued_jobs(10)
+    jobs=[]
+    for i in range(4):
+        args,job=rm.acquire("hisat2",{},['-p'])
+        assert args['-p']=="4", "Failed to scale down with many jobs"
+        jobs.append(job)
+    assert rm.get_used_cores()==16, "Failed to count used cores"
+    
+    #no free cores left
+    args,job=rm.acquire("samtools",{},['-@'])
+    assert args['-@']=="1", "Failed to limit threads to free cores"
+    rm.release(job)
+    for job in jobs:
+        rm.release(job)
+    
+    
+def test_user_threads():
+    rm=pr.ResourceManager(total_cores=8)
+    args,job=rm.acquire("bowtie2",{"--threads":"6"},['-p','--threads'])
+    assert '-p' not in args, "Failed to keep user threads"
+    assert rm.get_used_cores()==6, "Failed to count user threads"
+    rm.release(job)
+    
+    rm.enabled=False
+    args,job=rm.acquire("STAR",{},['--runThreadN'])
+    assert job is None and '--runThreadN' not in args, "Failed to disable resource manager"
+    
+
+def test_shared_memory():
+    rm=pr.ResourceManager(total_cores=8,total_memory=100)
+    args,job1=rm.acquire("hisat2",{},['-p'],memory=60)
+    #private copy does not fit
+    assert rm.can_admit(memory=60)==False, "Failed memory admission"
+    rm.release(job1)
+    
+    #shared index is counted once
+    args,job1=rm.acquire("hisat2",{},['-p'],shared_memory=("index",60))
+    assert rm.can_admit(shared_memory=("index",60))==True, "Failed shared memory admission"
+    args,job2=rm.acquire("hisat2",{},['-p'],shared_memory=("index",60))
+    assert rm.get_used_memory()==60, "Failed to count shared memory"
+    rm.release(job1)
+    rm.release(job2)
+    assert rm.get_used_memory()==0, "Failed to release shared memory"
+    
+    
+def test_prewarm():
+    rm=pr.ResourceManager()
+    index_files=pu.get_hisatindex_files(testVars.hisat2index)
+    assert len(index_files)>0, "Failed to list hisat2 index files"
+    assert rm.prewarm(*index_files)==pu.get_total_size(*index_files), "Failed to read index files"
+    assert rm.prewarm(*index_files)==0, "Failed to prewarm only once"
+
+
+def test_threads_config():
+    config_file=os.path.join(testVars.testDir,"threads.json")
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    with open(config_file,"w") as f:
+        json.dump({"hisat2":{"threads":4}},f)
+    rm=pr.ResourceManager(total_cores=16,threads_config=config_file)
+    args,job=rm.acquire("hisat2",{},['-p'])
+    assert args['-p']=="4", "Failed to use default threads from config"
+    rm.release(job)
+    args,job=rm.acquire("STAR",{},['--runThreadN'])
+    assert args['--runThreadN']=="16", "Failed program without config"
+    rm.release(job)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 22:20:31 2026
+
+@author: usingh
+"""
+
+import os
+import json
+from pyrpipe import pyrpipe_engine as pe
+from pyrpipe import pyrpipe_resources as pr
+from pyrpipe import scaling
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def test_fit_amdahl():
+    threads=[1,2,4,8,16]
+    runtimes=[10+90/t for t in threads]
+    serial,parallel,fraction=scaling.fit_amdahl(threads,runtimes)
+    assert abs(serial-10)<1e-6 and abs(parallel-90)<1e-6, "Failed to fit Amdahl's law"
+    assert abs(fraction-0.9)<1e-9, "Failed parallel fraction"
+    assert scaling.get_thread_counts(12)==[1,2,4,8,12], "Failed thread counts"
+
+
+def test_scaling_benchmark():
+    def run_python(**kwargs):
+        return pe.execute_command(['python3','-c','pass','-p',kwargs['-p']],quiet=True)
+    sweep=scaling.ScalingBenchmark(run_python,"python3","-p",thread_counts=[1,2],out_dir=testVars.testDir)
+    results=sweep.run()
+    assert [r['threads'] for r in results]==[1,2], "Failed to run thread counts"
+    assert results[0]['runtime']>0 and results[0]['maxrss']>0, "Failed to read runtime from log"
+    
+    #recommendation from known runtimes, efficiency at 8 threads is 100/(10+90/8)/8=0.59
+    sweep.results=[]
+    for t in [1,2,4,8]:
+        sweep.add_result(t,10+90/t)
+    assert sweep.recommend()==4, "Failed to recommend threads"
+    report_file=sweep.write_report()
+    with open(report_file) as f:
+        assert len(f.read().splitlines())==5, "Failed to write report"
+    
+    config_file=os.path.join(testVars.testDir,"scaling_threads.json")
+    sweep.save_config(config_file)
+    assert pr.load_threads_config(config_file)=={"python3":4}, "Failed to save config"
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:21:37 2026
+
+@author: usingh
+"""
+
+import os
+import shutil
+import gzip
+import json
+from pyrpipe import pyrpipe_utils as pu
+from testingEnvironment import testSpecs
+
+testVars=testSpecs()
+
+
+def test_index_manifest():
+    index_dir=os.path.join(testVars.testDir,"manifest_index")
+    shutil.rmtree(index_dir,ignore_errors=True)
+    os.makedirs(index_dir)
+    index=os.path.join(index_dir,"athal")
+    for f in pu.get_hisatindex_files(testVars.hisat2index):
+        shutil.copy(f,index_dir)
+    
+    #incomplete build fails validation
+    pu.start_index_manifest(index)
+    assert not pu.check_hisatindex(index), "Failed to detect incomplete index"
+    
+    pu.write_index_manifest(index,pu.get_hisatindex_files(index))
+    assert pu.check_hisatindex(index), "Failed to validate index"
+    assert pu.check_hisatindex(index,full_verify=True), "Failed to verify index"
+    
+    #corrupt a file without changing its size
+    index_file=pu.get_hisatindex_files(index)[0]
+    with open(index_file,'r+b') as f:
+        first=f.read(1)
+        f.seek(0)
+        f.write(bytes([first[0]^0xFF]))
+    assert pu.check_hisatindex(index), "Failed size check"
+    assert not pu.check_hisatindex(index,full_verify=True), "Failed to detect corrupt index"
+    
+    #truncated file
+    with open(index_file,'r+b') as f:
+        f.truncate(1)
+    assert not pu.check_hisatindex(index), "Failed to detect truncated index"
+
+
+def test_read_compressed_log():
+    if not pu.check_paths_exist(testVars.testDir):
+        pu.mkdir(testVars.testDir)
+    log_file=os.path.join(testVars.testDir,"segment_pyrpipe.log.gz")
+    with gzip.open(log_file,"wt") as f:
+        f.write("#START LOG\n")
+        for i in range(3):
+            f.write(json.dumps({'cmd':"echo "+str(i),'exitcode':0})+"\n")
+    records=list(pu.read_log_records(log_file))
+    assert [r['cmd'] for r in records]==["echo 0","echo 1","echo 2"], "Failed to read compressed log"
+
+
+def test_env_snapshot():
+    store_dir=os.path.join(testVars.testDir,"env_snapshots")
+    if pu.check_paths_exist(store_dir):
+        shutil.rmtree(store_dir)
+    env={'now':"2026-10-19T10:00:00",'host':"node1",'session':"s1",'python':"Python 3",'os':"Linux",'cpu':"8 logical CPU cores"}
+    reference=pu.save_env_snapshot(env,store_dir)
+    assert set(reference.keys())=={'now','host','session','snapshot'}, "Failed to save snapshot reference"
+    #same environment in another session
+    other=pu.save_env_snapshot({**env,'now':"2026-10-20T10:00:00",'host':"node2",'session':"s2"},store_dir)
+    assert other['snapshot']==reference['snapshot'] and len(os.listdir(store_dir))==1, "Failed to deduplicate snapshot"
+    assert pu.save_env_snapshot({**env,'python':"Python 4"},store_dir)['snapshot']!=reference['snapshot'], "Failed to hash environment"
+    assert pu.resolve_env_snapshot(reference,store_dir)=={**env,'snapshot':reference['snapshot']}, "Failed to resolve snapshot"
+    assert pu.get_env_hash(env)==reference['snapshot'], "Failed to compare environments"
+    assert pu.save_env_snapshot(env,"")==env, "Failed to disable snapshots"
+    #snapshots saved next to the logs are found when the logs are moved
+    logs_dir=os.path.join(testVars.testDir,"moved_logs")
+    for d in [logs_dir,logs_dir+"_archived"]:
+        if pu.check_paths_exist(d):
+            shutil.rmtree(d)
+    pu.mkdir(logs_dir)
+    env_log=os.path.join(logs_dir,"s1_pyrpipeENV.log")
+    with open(env_log,"w") as f:
+        f.write("#START LOG\n"+json.dumps(pu.save_env_snapshot(env,pu.get_env_store_path(logs_dir)))+"\n")
+    shutil.move(logs_dir,logs_dir+"_archived")
+    sys_info,programs=pu.parse_env_log(os.path.join(logs_dir+"_archived","s1_pyrpipeENV.log"))
+    shutil.rmtree(logs_dir+"_archived")
+    assert sys_info['python']=="Python 3", "Failed to resolve snapshot next to the logs"